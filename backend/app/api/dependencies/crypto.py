@@ -14,16 +14,21 @@
 # limitations under the License.#
 import base64
 import datetime
+import hashlib
+import random
 
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 
-from app.core.config import EXPIRATION_MINUTES, SECRET_KEY
+from app.core.config import EXPIRATION_JITTER_MINUTES, EXPIRATION_MINUTES, SECRET_KEY
 from app.models.experiment_join import HivemindAccess
 
 
 PADDING = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH)
 HASH_ALGORITHM = hashes.SHA256()
+# Passes last at least this fraction of EXPIRATION_MINUTES whatever the configured jitter, so that they are never issued
+# already expired
+MAX_EXPIRATION_JITTER_FRACTION = 0.5
 
 
 def save_private_key(private_key):
@@ -53,11 +58,22 @@ def load_public_key(string_in_db):
     return public_key
 
 
-def create_hivemind_access(peer_public_key: bytes, auth_server_private_key: bytes, username: str):
+def get_expiration_time(current_time: datetime.datetime) -> datetime.datetime:
+    """Pick the expiration of a new pass, drawn uniformly in the last EXPIRATION_JITTER_MINUTES of its lifetime"""
+    max_jitter = min(max(EXPIRATION_JITTER_MINUTES, 0), EXPIRATION_MINUTES * MAX_EXPIRATION_JITTER_FRACTION)
+    jitter = random.uniform(0, max_jitter)
+    return current_time + datetime.timedelta(minutes=EXPIRATION_MINUTES - jitter)
+
+
+def peer_key_digest(peer_public_key: bytes) -> str:
+    """Short stable identifier of a peer public key, used in revocation lists"""
+    return hashlib.sha256(peer_public_key.strip()).hexdigest()
+
+
+def create_hivemind_access(peer_public_key: bytes, private_key, username: str):
     current_time = datetime.datetime.utcnow()
-    expiration_time = current_time + datetime.timedelta(minutes=EXPIRATION_MINUTES)
+    expiration_time = get_expiration_time(current_time)
 
-    private_key = load_private_key(auth_server_private_key)
     signature = private_key.sign(
         f"{username} {peer_public_key} {expiration_time}".encode(),
         PADDING,
@@ -65,7 +81,7 @@ def create_hivemind_access(peer_public_key: bytes, auth_server_private_key: byte
     )
     signature = base64.b64encode(signature)
 
-    hivemind_access = HivemindAccess(
+    hivemind_access = HivemindAccess.construct(
         username=username,
         peer_public_key=peer_public_key,
         expiration_time=expiration_time,
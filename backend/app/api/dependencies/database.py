@@ -12,21 +12,43 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.#
-from typing import Callable, Type
+from typing import Callable, Optional, Type
 
 from databases import Database
-from fastapi import Depends
+from fastapi import Depends, HTTPException
 from starlette.requests import Request
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
 
+from app.db.replica import ReplicaRouter
 from app.db.repositories.base import BaseRepository
+from app.db.tasks import get_connected_database
+from app.services.join_history import JoinHistoryBuffer
+from app.services.join_stats import JoinStatsAggregator
 
 
-def get_database(request: Request) -> Database:
-    return request.app.state._db
+async def get_database(request: Request) -> Database:
+    database = await get_connected_database(request.app)
+    if database is None:
+        raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE, detail="The database is unavailable.")
+    return database
+
+
+def get_replica_router(request: Request) -> Optional[ReplicaRouter]:
+    return getattr(request.app.state, "_db_router", None)
+
+
+def get_join_history(request: Request) -> Optional[JoinHistoryBuffer]:
+    return getattr(request.app.state, "_join_history", None)
+
+
+def get_join_stats(request: Request) -> Optional[JoinStatsAggregator]:
+    return getattr(request.app.state, "_join_stats", None)
 
 
 def get_repository(Repo_type: Type[BaseRepository]) -> Callable:
-    def get_repo(db: Database = Depends(get_database)) -> Type[BaseRepository]:
-        return Repo_type(db)
+    def get_repo(
+        db: Database = Depends(get_database), router: Optional[ReplicaRouter] = Depends(get_replica_router)
+    ) -> Type[BaseRepository]:
+        return Repo_type(db, router=router)
 
     return get_repo
@@ -0,0 +1,28 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from typing import Optional, Set
+
+
+def parse_etags(header: str) -> Set[str]:
+    """Entity tags listed by an If-None-Match or If-Match header value"""
+    return {candidate.strip() for candidate in header.split(",")} - {""}
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value designates the given entity tag"""
+    if not if_none_match:
+        return False
+    candidates = parse_etags(if_none_match)
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,40 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from fastapi import HTTPException
+from starlette.status import HTTP_401_UNAUTHORIZED
+
+from app.db.repositories.experiments import ExperimentsRepository
+from app.models.experiment import ExperimentPublic
+from app.services.authentication import MoonlandingUser, RepoRole
+
+
+async def get_administered_experiment(
+    id: int, experiments_repo: ExperimentsRepository, user: MoonlandingUser, managed: str
+) -> ExperimentPublic:
+    """Return the experiment if the user is an admin of its organization, `managed` naming what they want to manage"""
+    experiment = await experiments_repo.get_experiment_by_id(id=id)
+
+    if not experiment:
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail=f"You need to be an admin of the organization to manage the {managed} of the collaborative experiment for the model",
+        )
+
+    if experiment.organization_name not in [org.name for org in user.orgs if org.role_in_org == RepoRole.admin]:
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail=f"You need to be an admin of the organization {experiment.organization_name} to manage the {managed} of the collaborative experiment for the model {experiment.model_name}",
+        )
+    return experiment
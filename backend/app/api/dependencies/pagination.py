@@ -0,0 +1,51 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, List, Tuple
+
+from fastapi import HTTPException
+from starlette.status import HTTP_400_BAD_REQUEST
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Opaque pagination cursor holding the sort key of the last item of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str, types: Tuple[type, ...]) -> List[Any]:
+    """Values held by a cursor, which must be of the given types, as they are bound to queries as they are"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        # JSON booleans are ints to Python
+        or any(not isinstance(value, type_) or isinstance(value, bool) for value, type_ in zip(values, types))
+    ):
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    return values
+
+
+def decode_cursor_datetime(value: Any) -> datetime:
+    """Timestamp held by a cursor, in UTC when it has no offset like those read from SQLite"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
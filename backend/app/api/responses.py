@@ -0,0 +1,115 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+import functools
+import json
+from datetime import date, datetime
+from ipaddress import IPv4Address, IPv4Interface, IPv4Network, IPv6Address, IPv6Interface, IPv6Network
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+STRING_TYPES = (IPv4Address, IPv6Address, IPv4Interface, IPv6Interface, IPv4Network, IPv6Network)
+
+
+def encode_default(value: Any) -> Any:
+    """
+    Encoding of the values JSON has no type for, as FastAPI encodes them: models by their fields (which are already
+    valid), bytes as UTF-8 text, IP addresses as text
+    """
+    if isinstance(value, BaseModel):
+        return value.__dict__
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, STRING_TYPES):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        # Serializes datetimes natively, in the same ISO 8601 format as `isoformat`
+        return orjson.dumps(content, default=encode_default)
+    return json.dumps(content, default=encode_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendering models straight from their fields, with orjson when it is installed. Routes returning
+    one skip the validation of their result against their `response_model`, which must then already be an instance of
+    it, and its serialization through `jsonable_encoder`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class FastJSONRoute(APIRoute):
+    """
+    Route whose endpoint returning exactly an instance of its `response_model` is answered with a `FastJSONResponse`
+    of it: a result built from validated models is neither validated again, nor converted by `jsonable_encoder`.
+    Any other result, including instances of subclasses of the model, which may hold more fields than it exposes,
+    goes through the usual validation and serialization. Headers set on an injected `Response` are kept.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        response_model = kwargs.get("response_model")
+        filtered = any(
+            kwargs.get(option)
+            for option in (
+                "response_model_include",
+                "response_model_exclude",
+                "response_model_exclude_unset",
+                "response_model_exclude_defaults",
+                "response_model_exclude_none",
+            )
+        )
+        # Routes included in another router are created again from the endpoint already wrapped
+        wrapped = getattr(endpoint, "fast_json_route", False)
+        if response_model is not None and not filtered and not wrapped and asyncio.iscoroutinefunction(endpoint):
+            endpoint = self.fast_endpoint(endpoint, response_model, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def fast_endpoint(endpoint: Callable[..., Any], response_model: type, status_code: Any) -> Callable[..., Any]:
+        # `wraps` keeps the signature of the endpoint, which its dependencies are resolved from
+        @functools.wraps(endpoint)
+        async def fast_endpoint(*args: Any, **kwargs: Any) -> Any:
+            result = await endpoint(*args, **kwargs)
+            if type(result) is not response_model:
+                return result
+            response = FastJSONResponse(result, status_code=status_code or 200)
+            for value in kwargs.values():
+                if isinstance(value, Response):
+                    response.raw_headers.extend(
+                        (name, header) for name, header in value.raw_headers if name != b"content-length"
+                    )
+                    if value.status_code:
+                        response.status_code = value.status_code
+            return response
+
+        fast_endpoint.fast_json_route = True
+        return fast_endpoint
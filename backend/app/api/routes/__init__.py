@@ -14,12 +14,35 @@
 # limitations under the License.#
 from fastapi import APIRouter, Depends
 
+from app.api.routes.allowlist import router as allowlist_router
 from app.api.routes.experiments import router as experiments_router
-from app.services.authentication import authenticate
+from app.api.routes.join_stats import router as join_stats_router
+from app.api.routes.keys import router as keys_router
+from app.api.routes.monitoring import readiness_router
+from app.api.routes.monitoring import router as monitoring_router
+from app.api.routes.revocations import router as revocations_router
+from app.services.authentication import authenticate_monitoring, rate_limit_user
 
 
 router = APIRouter()
 
+# Authenticated routes are rate limited per token before authenticating, then per user
+
+router.include_router(
+    experiments_router, prefix="/experiments", tags=["experiments"], dependencies=[Depends(rate_limit_user)]
+)
+router.include_router(
+    revocations_router, prefix="/experiments", tags=["revocations"], dependencies=[Depends(rate_limit_user)]
+)
+router.include_router(
+    allowlist_router, prefix="/experiments", tags=["allowlist"], dependencies=[Depends(rate_limit_user)]
+)
+router.include_router(
+    join_stats_router, prefix="/experiments", tags=["join-stats"], dependencies=[Depends(rate_limit_user)]
+)
+# Public keys are public: verifiers fetch them without authenticating
+router.include_router(keys_router, prefix="/keys", tags=["keys"])
 router.include_router(
-    experiments_router, prefix="/experiments", tags=["experiments"], dependencies=[Depends(authenticate)]
+    monitoring_router, prefix="/monitoring", tags=["monitoring"], dependencies=[Depends(authenticate_monitoring)]
 )
+router.include_router(readiness_router, prefix="/monitoring", tags=["monitoring"])
@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from asyncpg.exceptions import DataError
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from starlette.status import HTTP_400_BAD_REQUEST
+
+from app.api.dependencies.database import get_repository
+from app.api.dependencies.experiments import get_administered_experiment
+from app.db.repositories.allowlist import USERNAME, AllowlistRepository
+from app.db.repositories.experiments import ExperimentsRepository
+from app.models.allowlist import AllowlistUploadMode, AllowlistUploadResult
+from app.services.authentication import MoonlandingUser, authenticate
+
+
+router = APIRouter()
+
+
+@router.put("/{id}/allowlist/", response_model=AllowlistUploadResult, name="allowlist:upload-allowlist")
+async def upload_allowlist(
+    request: Request,
+    id: int = Path(..., ge=1, title="The ID of the experiment whose allowlist is uploaded."),
+    mode: AllowlistUploadMode = Query(
+        AllowlistUploadMode.replace,
+        title="Whether the uploaded usernames replace the allowlist or are added to it.",
+    ),
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    allowlist_repo: AllowlistRepository = Depends(get_repository(AllowlistRepository)),
+    user: MoonlandingUser = Depends(authenticate),
+) -> AllowlistUploadResult:
+    """
+    Upload the allowlist of an experiment as a body of newline-separated usernames, which is streamed to the database
+    without being held in memory.
+    """
+    await get_administered_experiment(id, experiments_repo, user, managed="allowlist")
+
+    try:
+        added, removed = await allowlist_repo.upload_allowlist(
+            experiment_id=id, usernames=request.stream(), replace=mode == AllowlistUploadMode.replace
+        )
+    except DataError:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST, detail="The allowlist must contain one username per line."
+        )
+
+    snapshot = await allowlist_repo.get_allowlist_snapshot(experiment_id=id)
+    return AllowlistUploadResult(
+        experiment_id=id,
+        version=snapshot.version,
+        size=len(snapshot.members[USERNAME]),
+        added=added,
+        removed=removed,
+    )
@@ -12,28 +12,96 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.#
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
 from cryptography.hazmat.primitives.asymmetric import rsa
-from fastapi import APIRouter, Body, Depends, HTTPException, Path
-from starlette.status import HTTP_201_CREATED, HTTP_401_UNAUTHORIZED, HTTP_404_NOT_FOUND
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query, Response
+from starlette.status import (
+    HTTP_201_CREATED,
+    HTTP_304_NOT_MODIFIED,
+    HTTP_400_BAD_REQUEST,
+    HTTP_401_UNAUTHORIZED,
+    HTTP_404_NOT_FOUND,
+    HTTP_410_GONE,
+    HTTP_412_PRECONDITION_FAILED,
+)
 
 from app.api.dependencies import crypto
-from app.api.dependencies.database import get_repository
+from app.api.dependencies.database import get_join_history, get_join_stats, get_repository
+from app.api.dependencies.etag import etag_matches, parse_etags
+from app.api.dependencies.pagination import decode_cursor, decode_cursor_datetime, encode_cursor
+from app.api.responses import FastJSONRoute
+from app.core.config import (
+    EXPERIMENT_CHANGES_DELAY_SECONDS,
+    EXPERIMENT_TOMBSTONE_RETENTION_DAYS,
+    LIST_EXPERIMENTS_MAX_PAGE_SIZE,
+    LIST_EXPERIMENTS_PAGE_SIZE,
+    MAX_COORDINATOR_UPDATES,
+)
+from app.db.repositories.allowlist import AllowlistRepository
 from app.db.repositories.experiments import ExperimentsRepository
+from app.db.repositories.revocations import RevocationsRepository
 from app.models.experiment import (
+    CoordinatorsUpdate,
+    CoordinatorsUpdateResult,
+    ExperimentChanges,
     ExperimentCreate,
     ExperimentCreatePublic,
-    ExperimentInDB,
+    ExperimentJoinView,
     ExperimentPublic,
+    ExperimentsPage,
     ExperimentUpdate,
 )
 from app.models.experiment_join import ExperimentJoinInput, ExperimentJoinOutput
 from app.services.authentication import MoonlandingUser, RepoRole, authenticate
-
-
-router = APIRouter()
+from app.services.join_history import JoinHistoryBuffer
+from app.services.join_stats import JoinStatsAggregator
+from app.services.rate_limit import CREATE, JOIN, rate_limit_budget
+
+
+# Experiments are only ever built once, from the rows read or written, and serialized as they are
+router = APIRouter(route_class=FastJSONRoute)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def experiment_etag(experiment: ExperimentPublic) -> str:
+    """Strong entity tag of an experiment, which changes with every update as they all set `updated_at`"""
+    updated_at = experiment.updated_at
+    if updated_at.tzinfo is None:
+        # As read from SQLite
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return f'"{experiment.id}-{(updated_at - EPOCH) // timedelta(microseconds=1)}"'
+
+
+def if_match_updated_ats(if_match: Optional[str], id: int) -> Optional[List[datetime]]:
+    """
+    Times at which the experiment must have been last updated for an If-Match header value to designate it, or None
+    if any version of it does. Weak tags never match, nor do tags of other experiments.
+    """
+    if if_match is None:
+        return None
+    etags = parse_etags(if_match)
+    if "*" in etags:
+        return None
+    updated_ats = []
+    for etag in etags:
+        etag_id, _, microseconds = etag.strip('"').partition("-")
+        if etag.startswith('"') and etag_id == str(id) and microseconds.isdigit():
+            updated_ats.append(EPOCH + timedelta(microseconds=int(microseconds)))
+    return updated_ats
+
+
+def precondition_failed(experiment: ExperimentPublic) -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_412_PRECONDITION_FAILED,
+        detail=f"The collaborative experiment for the model {experiment.model_name} was changed since the version given by If-Match.",
+    )
 
 
 @router.post("/", response_model=ExperimentPublic, name="experiments:create-experiment", status_code=HTTP_201_CREATED)
+@rate_limit_budget(CREATE)
 async def create_new_experiment(
     new_experiment: ExperimentCreatePublic = Body(..., embed=True),
     experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
@@ -47,23 +115,11 @@ async def create_new_experiment(
             detail=f"You need to be an admin of the organization {new_experiment.organization_name} to create a collaborative experiment for the model {new_experiment.model_name}",
         )
 
-    experiment = await experiments_repo.get_experiment_by_organization_and_model_name(
-        organization_name=new_experiment.organization_name, model_name=new_experiment.model_name
-    )
-
-    if experiment is not None:
-        raise HTTPException(
-            status_code=HTTP_401_UNAUTHORIZED,
-            detail=f"An experiment already exist for the organization {new_experiment.organization_name} and the model {new_experiment.model_name}",
-        )
-
     private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
     public_key = private_key.public_key()
 
-    new_experiment = new_experiment.dict()
-
     new_experiment_item = ExperimentCreate(
-        **new_experiment,
+        **new_experiment.dict(),
         auth_server_private_key=crypto.save_private_key(private_key),
         auth_server_public_key=crypto.save_public_key(public_key),
     )
@@ -71,18 +127,21 @@ async def create_new_experiment(
         new_experiment=new_experiment_item, requesting_user=user
     )
 
-    created_experiment_item = await get_experiment_by_id(
-        id=created_experiment_item.id,
-        experiments_repo=experiments_repo,
-        user=user,
-    )
+    if created_experiment_item is None:
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail=f"An experiment already exist for the organization {new_experiment.organization_name} and the model {new_experiment.model_name}",
+        )
+
     return created_experiment_item
 
 
 @router.get("/", response_model=ExperimentPublic, name="experiments:get-experiment-by-organization-and-model-name")
 async def get_experiment_by_organization_and_model_name(
+    response: Response,
     organization_name: str,
     model_name: str,
+    if_none_match: Optional[str] = Header(None),
     experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
     user: MoonlandingUser = Depends(authenticate),
 ) -> ExperimentPublic:
@@ -102,13 +161,161 @@ async def get_experiment_by_organization_and_model_name(
             detail=f"You need to be an admin of the organization {experiment.organization_name} to get the collaborative experiment for the model {experiment.model_name}",
         )
 
-    experiment_public = ExperimentPublic(**experiment.dict())
-    return experiment_public
+    # Answered from the cached experiment, without serializing it
+    etag = experiment_etag(experiment)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return experiment
+
+
+@router.get("/list/", response_model=ExperimentsPage, name="experiments:list-experiments")
+async def list_experiments(
+    limit: int = Query(LIST_EXPERIMENTS_PAGE_SIZE, ge=1, le=LIST_EXPERIMENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    user: MoonlandingUser = Depends(authenticate),
+) -> ExperimentsPage:
+    after = tuple(decode_cursor(cursor, types=(str, str, int))) if cursor is not None else None
+
+    # One more experiment than asked for tells whether there is a next page
+    experiments = await experiments_repo.list_experiments_by_organizations(
+        organization_names=[org.name for org in user.orgs], after=after, limit=limit + 1
+    )
+
+    next_cursor = None
+    if len(experiments) > limit:
+        experiments = experiments[:limit]
+        last = experiments[-1]
+        next_cursor = encode_cursor([last.organization_name, last.model_name, last.id])
+
+    return ExperimentsPage.construct(experiments=experiments, next_cursor=next_cursor)
+
+
+@router.get("/search/", response_model=ExperimentsPage, name="experiments:search-experiments")
+async def search_experiments(
+    query: str = Query(..., min_length=3, max_length=100, title="Text searched in model and organization names."),
+    limit: int = Query(LIST_EXPERIMENTS_PAGE_SIZE, ge=1, le=LIST_EXPERIMENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    user: MoonlandingUser = Depends(authenticate),
+) -> ExperimentsPage:
+    """
+    Experiments of the user's organizations whose model or organization name contains the searched text (only
+    starts with it on SQLite), best matches of the model name first. Shorter texts would match too many experiments
+    for the trigram indexes to help.
+    """
+    after = None
+    if cursor is not None:
+        after = tuple(decode_cursor(cursor, types=(int, str, str, int)))
+
+    # One more experiment than asked for tells whether there is a next page
+    matches = await experiments_repo.search_experiments(
+        organization_names=[org.name for org in user.orgs], query=query, after=after, limit=limit + 1
+    )
+
+    next_cursor = None
+    if len(matches) > limit:
+        matches = matches[:limit]
+        rank, last = matches[-1]
+        next_cursor = encode_cursor([rank, last.model_name, last.organization_name, last.id])
+
+    return ExperimentsPage.construct(experiments=[experiment for _, experiment in matches], next_cursor=next_cursor)
+
+
+@router.get("/changes/", response_model=ExperimentChanges, name="experiments:list-experiment-changes")
+async def list_experiment_changes(
+    limit: int = Query(LIST_EXPERIMENTS_PAGE_SIZE, ge=1, le=LIST_EXPERIMENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    user: MoonlandingUser = Depends(authenticate),
+) -> ExperimentChanges:
+    """
+    Experiments of the user's organizations created or changed, and those deleted or moved out of them, since the
+    cursor of the previous sync. Without a cursor, all the experiments are listed as changed and no deletion is.
+    """
+    now = datetime.now(timezone.utc)
+    # In whole seconds, the resolution of the timestamps written by SQLite, so that the next sync resumes before any
+    # change of the second in which this one stops
+    until = (now - timedelta(seconds=EXPERIMENT_CHANGES_DELAY_SECONDS)).replace(microsecond=0)
+    if cursor is None:
+        experiments_after, tombstones_after = (datetime.min.replace(tzinfo=timezone.utc), 0), (until, 0)
+    else:
+        updated_at, experiment_id, deleted_at, tombstone_id = decode_cursor(cursor, types=(str, int, str, int))
+        experiments_after = (decode_cursor_datetime(updated_at), experiment_id)
+        tombstones_after = (decode_cursor_datetime(deleted_at), tombstone_id)
+        if tombstones_after[0] < now - timedelta(days=EXPERIMENT_TOMBSTONE_RETENTION_DAYS):
+            raise HTTPException(
+                status_code=HTTP_410_GONE, detail="The sync cursor expired, sync again from scratch without it."
+            )
+
+    # Both lists are positioned independently, one more row than asked for telling whether they go on. A list that
+    # was exhausted moves on to `until`, where the next sync resumes.
+    organization_names = [org.name for org in user.orgs]
+    experiments = await experiments_repo.list_experiment_changes(
+        organization_names=organization_names, after=experiments_after, until=until, limit=limit + 1
+    )
+    tombstones = await experiments_repo.list_experiment_tombstones(
+        organization_names=organization_names, after=tombstones_after, until=until, limit=limit + 1
+    )
+
+    has_more = len(experiments) > limit or len(tombstones) > limit
+    if len(experiments) > limit:
+        experiments = experiments[:limit]
+        experiments_after = (experiments[-1].updated_at, experiments[-1].id)
+    else:
+        experiments_after = (until, 0)
+    if len(tombstones) > limit:
+        tombstones = tombstones[:limit]
+        tombstones_after = (tombstones[-1][1].deleted_at, tombstones[-1][0])
+    else:
+        tombstones_after = (until, 0)
+
+    next_cursor = encode_cursor(
+        [experiments_after[0].isoformat(), experiments_after[1], tombstones_after[0].isoformat(), tombstones_after[1]]
+    )
+    return ExperimentChanges.construct(
+        experiments=experiments,
+        deleted=[tombstone for _, tombstone in tombstones],
+        next_cursor=next_cursor,
+        has_more=has_more,
+    )
+
+
+@router.put("/coordinators/", response_model=CoordinatorsUpdateResult, name="experiments:update-coordinators")
+async def update_coordinators(
+    coordinators_update: CoordinatorsUpdate = Body(..., embed=True),
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    user: MoonlandingUser = Depends(authenticate),
+) -> CoordinatorsUpdateResult:
+    """
+    Set the coordinators of several experiments at once, or move all the experiments of a coordinator to another one.
+    Only the experiments of the organizations the user is an admin of can be updated.
+    """
+    organization_names = [org.name for org in user.orgs if org.role_in_org == RepoRole.admin]
+    if coordinators_update.move is not None:
+        experiments = await experiments_repo.move_coordinator(
+            move=coordinators_update.move, organization_names=organization_names
+        )
+        return CoordinatorsUpdateResult.construct(experiments=experiments)
+
+    if len(coordinators_update.experiments) > MAX_COORDINATOR_UPDATES:
+        raise HTTPException(
+            status_code=HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_COORDINATOR_UPDATES} experiments can be updated at once.",
+        )
+    experiments = await experiments_repo.update_coordinators(
+        coordinators=coordinators_update.experiments, organization_names=organization_names
+    )
+    return CoordinatorsUpdateResult.construct(experiments=experiments)
 
 
 @router.get("/{id}/", response_model=ExperimentPublic, name="experiments:get-experiment-by-id")
 async def get_experiment_by_id(
+    response: Response,
     id: int,
+    if_none_match: Optional[str] = Header(None),
     experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
     user: MoonlandingUser = Depends(authenticate),
 ) -> ExperimentPublic:
@@ -127,14 +334,21 @@ async def get_experiment_by_id(
             detail=f"You need to be an admin of the organization {experiment.organization_name} to get the collaborative experiment for the model {experiment.model_name}",
         )
 
-    experiment_public = ExperimentPublic(**experiment.dict())
-    return experiment_public
+    # Answered from the cached experiment, without serializing it
+    etag = experiment_etag(experiment)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return experiment
 
 
 @router.put("/{id}/", response_model=ExperimentPublic, name="experiments:update-experiment-by-id")
 async def update_experiment_by_id(
+    response: Response,
     id: int = Path(..., ge=1, title="The ID of the experiment to update."),
     experiment_update: ExperimentUpdate = Body(..., embed=True),
+    if_match: Optional[str] = Header(None),
     experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
     user: MoonlandingUser = Depends(authenticate),
 ) -> ExperimentPublic:
@@ -152,35 +366,46 @@ async def update_experiment_by_id(
             detail=f"You need to be an admin of the organization {experiment.organization_name} to update the collaborative experiment for the model {experiment.model_name}",
         )
 
-    if not experiment:
-        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="No experiment found with that id.")
+    if experiment_update.organization_name is not None and experiment_update.organization_name not in [
+        org.name for org in user.orgs if org.role_in_org == RepoRole.admin
+    ]:
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail=f"You need to be an admin of the organization {experiment_update.organization_name} to move the collaborative experiment for the model {experiment.model_name} to it",
+        )
 
-    updated_public_experiment = await update_experiment(experiment, experiment_update, user, experiments_repo)
+    updated_public_experiment = await update_experiment(
+        experiment, experiment_update, user, experiments_repo, if_updated_at=if_match_updated_ats(if_match, id)
+    )
+    response.headers["ETag"] = experiment_etag(updated_public_experiment)
     return updated_public_experiment
 
 
 async def update_experiment(
-    experiment: ExperimentInDB,
+    experiment: ExperimentPublic,
     experiment_update: ExperimentUpdate,
     user: MoonlandingUser,
     experiments_repo: ExperimentsRepository,
+    if_updated_at: Optional[List[datetime]] = None,
 ):
-    experiment_update = ExperimentUpdate(**experiment_update.dict(exclude_unset=True))
-    experiment = await experiments_repo.update_experiment_by_id(
-        id_exp=experiment.id, experiment_update=experiment_update
+    # The precondition is checked by the update itself, against the experiment as it is in the database
+    if if_updated_at == []:
+        raise precondition_failed(experiment)
+    updated_experiment = await experiments_repo.update_experiment_by_id(
+        id_exp=experiment.id, experiment_update=experiment_update, if_updated_at=if_updated_at
     )
+    if not updated_experiment:
+        if if_updated_at is not None:
+            raise precondition_failed(experiment)
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="No experiment found with that id.")
 
-    updated_public_experiment = await get_experiment_by_id(
-        id=experiment.id,
-        experiments_repo=experiments_repo,
-        user=user,
-    )
-    return updated_public_experiment
+    return updated_experiment
 
 
 @router.delete("/{id}/", response_model=ExperimentPublic, name="experiments:delete-experiment-by-id")
 async def delete_experiment_by_id(
     id: int = Path(..., ge=1, title="The ID of the experiment to delete."),
+    if_match: Optional[str] = Header(None),
     experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
     user: MoonlandingUser = Depends(authenticate),
 ) -> ExperimentPublic:
@@ -198,22 +423,30 @@ async def delete_experiment_by_id(
             detail=f"You need to be an admin of the organization {experiment.organization_name} to delete the collaborative experiment for the model {experiment.model_name}",
         )
 
-    deleted_public_experiment = await delete_experiment(experiment, user, experiments_repo)
+    deleted_public_experiment = await delete_experiment(
+        experiment, user, experiments_repo, if_updated_at=if_match_updated_ats(if_match, id)
+    )
     return deleted_public_experiment
 
 
 async def delete_experiment(
-    experiment: ExperimentInDB, user: MoonlandingUser, experiments_repo: ExperimentsRepository
+    experiment: ExperimentPublic,
+    user: MoonlandingUser,
+    experiments_repo: ExperimentsRepository,
+    if_updated_at: Optional[List[datetime]] = None,
 ):
-    deleted_id = await experiments_repo.delete_experiment_by_id(id=experiment.id)
-    if not deleted_id:
+    if if_updated_at == []:
+        raise precondition_failed(experiment)
+    deleted_experiment = await experiments_repo.delete_experiment_by_id(id=experiment.id, if_updated_at=if_updated_at)
+    if not deleted_experiment:
+        if if_updated_at is not None:
+            raise precondition_failed(experiment)
         raise HTTPException(
             status_code=HTTP_404_NOT_FOUND,
             detail=f"No experiment found with the id {experiment.id} for the collaborative experiment of the model {experiment.model_name} of the organization {experiment.organization_name}.",
         )
 
-    deleted_exp = ExperimentPublic(**experiment.dict())
-    return deleted_exp
+    return deleted_experiment
 
 
 @router.put(
@@ -221,14 +454,19 @@ async def delete_experiment(
     response_model=ExperimentJoinOutput,
     name="experiments:join-experiment-by-organization-and-model-name",
 )
+@rate_limit_budget(JOIN)
 async def join_experiment_by_organization_and_model_name(
     organization_name: str,
     model_name: str,
     experiment_join_input: ExperimentJoinInput = Body(..., embed=True),
     experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    revocations_repo: RevocationsRepository = Depends(get_repository(RevocationsRepository)),
+    allowlist_repo: AllowlistRepository = Depends(get_repository(AllowlistRepository)),
+    join_history: Optional[JoinHistoryBuffer] = Depends(get_join_history),
+    join_stats: Optional[JoinStatsAggregator] = Depends(get_join_stats),
     user: MoonlandingUser = Depends(authenticate),
 ) -> ExperimentJoinOutput:
-    experiment = await experiments_repo.get_experiment_by_organization_and_model_name(
+    experiment = await experiments_repo.get_experiment_join_view_by_organization_and_model_name(
         organization_name=organization_name, model_name=model_name
     )
 
@@ -238,24 +476,27 @@ async def join_experiment_by_organization_and_model_name(
             detail="You need to be at least a reader of the organization to join the collaborative experiment for the model",
         )
 
-    if experiment.organization_name not in [org.name for org in user.orgs]:
-        raise HTTPException(
-            status_code=HTTP_401_UNAUTHORIZED,
-            detail="Access to the experiment denied.",
-        )
+    await ensure_can_join(experiment, user, allowlist_repo)
 
-    exp_pass = await join_experiment(experiment, user, experiment_join_input)
+    exp_pass = await join_experiment(
+        experiment, user, experiment_join_input, experiments_repo, revocations_repo, join_history, join_stats
+    )
     return exp_pass
 
 
 @router.put("/join/{id}/", response_model=ExperimentJoinOutput, name="experiments:join-experiment-by-id")
+@rate_limit_budget(JOIN)
 async def join_experiment_by_id(
     id: int = Path(..., ge=1, title="The ID of the experiment the user wants to join."),
     experiment_join_input: ExperimentJoinInput = Body(..., embed=True),
     experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    revocations_repo: RevocationsRepository = Depends(get_repository(RevocationsRepository)),
+    allowlist_repo: AllowlistRepository = Depends(get_repository(AllowlistRepository)),
+    join_history: Optional[JoinHistoryBuffer] = Depends(get_join_history),
+    join_stats: Optional[JoinStatsAggregator] = Depends(get_join_stats),
     user: MoonlandingUser = Depends(authenticate),
 ) -> ExperimentJoinOutput:
-    experiment = await experiments_repo.get_experiment_by_id(id=id)
+    experiment = await experiments_repo.get_experiment_join_view_by_id(id=id)
 
     if not experiment:
         raise HTTPException(
@@ -263,26 +504,68 @@ async def join_experiment_by_id(
             detail="You need to be at least a reader of the organization to join the collaborative experiment for the model",
         )
 
-    if experiment.organization_name not in [org.name for org in user.orgs]:
+    await ensure_can_join(experiment, user, allowlist_repo)
+
+    exp_pass = await join_experiment(
+        experiment, user, experiment_join_input, experiments_repo, revocations_repo, join_history, join_stats
+    )
+    return exp_pass
+
+
+async def ensure_can_join(
+    experiment: ExperimentJoinView, user: MoonlandingUser, allowlist_repo: AllowlistRepository
+) -> None:
+    """Members of the organization of the experiment can join it, as well as the users on its allowlist"""
+    if experiment.organization_name in [org.name for org in user.orgs]:
+        return
+    if not await allowlist_repo.is_allowed(experiment_id=experiment.id, username=user.username):
         raise HTTPException(
             status_code=HTTP_401_UNAUTHORIZED,
             detail="Access to the experiment denied.",
         )
 
-    exp_pass = await join_experiment(experiment, user, experiment_join_input)
-    return exp_pass
-
 
 async def join_experiment(
-    experiment: ExperimentInDB, user: MoonlandingUser, experiment_join_input: ExperimentJoinInput
+    experiment: ExperimentJoinView,
+    user: MoonlandingUser,
+    experiment_join_input: ExperimentJoinInput,
+    experiments_repo: ExperimentsRepository,
+    revocations_repo: RevocationsRepository,
+    join_history: Optional[JoinHistoryBuffer] = None,
+    join_stats: Optional[JoinStatsAggregator] = None,
 ):
     if not experiment:
         raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="No experiment found with that id.")
 
+    peer_key_digest = None
+    if experiment_join_input.peer_public_key is not None:
+        peer_key_digest = crypto.peer_key_digest(experiment_join_input.peer_public_key)
+    if await revocations_repo.is_revoked(
+        experiment_id=experiment.id, username=user.username, peer_key_digest=peer_key_digest
+    ):
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail="Access to the experiment has been revoked.",
+        )
+
+    private_key = await experiments_repo.get_experiment_private_key(experiment=experiment)
+    if private_key is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="No experiment found with that id.")
+
     hivemind_access = crypto.create_hivemind_access(
         peer_public_key=experiment_join_input.peer_public_key,
-        auth_server_private_key=experiment.auth_server_private_key,
+        private_key=private_key,
         username=user.username,
     )
-    exp_pass = ExperimentJoinOutput(**experiment.dict(), hivemind_access=hivemind_access)
-    return exp_pass
+    if join_history is not None:
+        join_history.record(experiment_id=experiment.id, username=user.username, peer_key_digest=peer_key_digest)
+    if join_stats is not None:
+        # Peers are told apart by their key, or by their user when they join without one
+        join_stats.record(experiment_id=experiment.id, peer=peer_key_digest or f"user:{user.username}")
+
+    return ExperimentJoinOutput.construct(
+        coordinator_ip=experiment.coordinator_ip,
+        coordinator_port=experiment.coordinator_port,
+        hivemind_access=hivemind_access,
+        auth_server_public_key=experiment.auth_server_public_key,
+    )
@@ -0,0 +1,67 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from starlette.status import HTTP_404_NOT_FOUND
+
+from app.api.dependencies.database import get_join_stats, get_repository
+from app.api.dependencies.experiments import get_administered_experiment
+from app.core.config import JOIN_STATS_RETENTION_DAYS
+from app.core.metrics import HyperLogLog
+from app.db.repositories.experiments import ExperimentsRepository
+from app.db.repositories.join_stats import JoinStatsRepository
+from app.models.join_stats import ExperimentJoinStats, JoinStatsWindow
+from app.services.authentication import MoonlandingUser, authenticate
+from app.services.join_stats import JoinStatsAggregator, minute_of
+
+
+router = APIRouter()
+
+
+@router.get("/{id}/join-stats/", response_model=ExperimentJoinStats, name="join-stats:get-experiment-join-stats")
+async def get_experiment_join_stats(
+    id: int = Path(..., ge=1, title="The ID of the experiment whose joins are counted."),
+    minutes: int = Query(60, ge=1, le=JOIN_STATS_RETENTION_DAYS * 24 * 60, title="The number of minutes counted."),
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    join_stats_repo: JoinStatsRepository = Depends(get_repository(JoinStatsRepository)),
+    join_stats: Optional[JoinStatsAggregator] = Depends(get_join_stats),
+    user: MoonlandingUser = Depends(authenticate),
+) -> ExperimentJoinStats:
+    """
+    Joins to an experiment per minute over the last `minutes` minutes, including the current one, combining the
+    counters written by all the workers with the ones this worker has not written yet
+    """
+    await get_administered_experiment(id, experiments_repo, user, managed="join statistics")
+    if join_stats is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="The join counters are disabled.")
+
+    since = minute_of(datetime.datetime.now(datetime.timezone.utc)) - datetime.timedelta(minutes=minutes - 1)
+    rows = await join_stats_repo.list_join_stats(experiment_id=id, since=since)
+    merged = join_stats.merge(id, since, rows)
+
+    total = HyperLogLog()
+    windows = []
+    for minute, (joins, peers) in sorted(merged.items()):
+        total.merge(peers)
+        windows.append(JoinStatsWindow(minute=minute, joins=joins, unique_peers=peers.count()))
+    return ExperimentJoinStats(
+        experiment_id=id,
+        since=since,
+        joins=sum(window.joins for window in windows),
+        unique_peers=total.count(),
+        windows=windows,
+    )
@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Response
+from starlette.status import HTTP_304_NOT_MODIFIED, HTTP_404_NOT_FOUND
+
+from app.api.dependencies.database import get_repository
+from app.api.dependencies.etag import etag_matches
+from app.core.config import KEY_SET_MAX_AGE_SECONDS, ORGANIZATION_KEY_SET_MAX_AGE_SECONDS
+from app.db.repositories.experiments import ExperimentsRepository
+from app.models.keys import KeySet
+from app.services.keys import KeySetDocument, get_experiment_key_set, get_organization_key_set
+
+
+router = APIRouter()
+
+
+def key_set_response(document: KeySetDocument, if_none_match: Optional[str], max_age: int) -> Response:
+    headers = {"ETag": document.etag, "Cache-Control": f"public, max-age={max_age}"}
+    if etag_matches(if_none_match, document.etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=document.body, media_type="application/json", headers=headers)
+
+
+@router.get("/experiments/{id}/", response_model=KeySet, name="keys:get-experiment-key-set")
+async def get_experiment_key_set_by_id(
+    id: int = Path(..., ge=1, title="The ID of the experiment whose passes are verified."),
+    if_none_match: Optional[str] = Header(None),
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+) -> Response:
+    """
+    Public key verifying the passes to an experiment, as a JSON Web Key Set. Verifiers need no account: the key set is
+    public, and rendered once per key so that it is served from memory.
+    """
+    experiment = await experiments_repo.get_experiment_join_view_by_id(id=id)
+    if not experiment:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="No experiment found with that id.")
+
+    document = get_experiment_key_set(experiment.id, experiment.key_id, experiment.auth_server_public_key)
+    return key_set_response(document, if_none_match, KEY_SET_MAX_AGE_SECONDS)
+
+
+@router.get("/organizations/{organization_name}/", response_model=KeySet, name="keys:get-organization-key-set")
+async def get_organization_key_set_by_name(
+    organization_name: str = Path(..., title="The organization whose experiments passes are verified."),
+    if_none_match: Optional[str] = Header(None),
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+) -> Response:
+    """Public keys verifying the passes to all the experiments of an organization, as a JSON Web Key Set"""
+    document = await get_organization_key_set(organization_name, experiments_repo)
+    return key_set_response(document, if_none_match, ORGANIZATION_KEY_SET_MAX_AGE_SECONDS)
@@ -0,0 +1,73 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.status import HTTP_404_NOT_FOUND, HTTP_503_SERVICE_UNAVAILABLE
+
+from app.core.config import READINESS_TIMEOUT_SECONDS
+from app.db.instrumentation import query_stats
+from app.db.pool import DB_CONNECTION_ERRORS, expire_connections, get_pool
+from app.db.tasks import get_connected_database
+from app.models.monitoring import JoinHistoryStats, JoinStatsAggregatorStats, PoolStats, QueryStats, Readiness
+
+
+router = APIRouter()
+# Load balancers check the readiness of workers without credentials
+readiness_router = APIRouter()
+
+
+@router.get("/pool/", response_model=PoolStats, name="monitoring:get-pool-stats")
+async def get_pool_stats(request: Request) -> PoolStats:
+    database = getattr(request.app.state, "_db", None)
+    pool = get_pool(database) if database is not None else None
+    if pool is None:
+        raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE, detail="The database is not connected.")
+    return PoolStats(**pool.stats())
+
+
+@router.get("/queries/", response_model=QueryStats, name="monitoring:get-query-stats")
+async def get_query_stats() -> QueryStats:
+    return QueryStats(**query_stats.stats())
+
+
+@router.get("/join-history/", response_model=JoinHistoryStats, name="monitoring:get-join-history-stats")
+async def get_join_history_stats(request: Request) -> JoinHistoryStats:
+    join_history = getattr(request.app.state, "_join_history", None)
+    if join_history is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="The join history is disabled.")
+    return JoinHistoryStats(**join_history.stats())
+
+
+@router.get("/join-stats/", response_model=JoinStatsAggregatorStats, name="monitoring:get-join-stats-aggregator-stats")
+async def get_join_stats_aggregator_stats(request: Request) -> JoinStatsAggregatorStats:
+    join_stats = getattr(request.app.state, "_join_stats", None)
+    if join_stats is None:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="The join counters are disabled.")
+    return JoinStatsAggregatorStats(**join_stats.stats())
+
+
+@readiness_router.get("/ready/", response_model=Readiness, name="monitoring:get-readiness")
+async def get_readiness(request: Request) -> Readiness:
+    """Whether this worker can serve requests, for load balancers to only route requests to workers that can"""
+    database = await get_connected_database(request.app)
+    if database is None:
+        raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE, detail="The database is unavailable.")
+    try:
+        await asyncio.wait_for(database.fetch_val(query="SELECT 1;"), timeout=READINESS_TIMEOUT_SECONDS)
+    except (asyncio.TimeoutError, *DB_CONNECTION_ERRORS):
+        await expire_connections(database)
+        raise HTTPException(status_code=HTTP_503_SERVICE_UNAVAILABLE, detail="The database is unavailable.")
+    return Readiness(ready=True)
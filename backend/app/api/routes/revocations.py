@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from typing import List, Optional
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query, Response
+from starlette.status import HTTP_304_NOT_MODIFIED, HTTP_401_UNAUTHORIZED
+
+from app.api.dependencies import crypto
+from app.api.dependencies.database import get_repository
+from app.api.dependencies.etag import etag_matches
+from app.api.dependencies.experiments import get_administered_experiment
+from app.db.repositories.experiments import ExperimentsRepository
+from app.db.repositories.revocations import RevocationsRepository
+from app.models.revocation import RevocationList, RevocationUpdate
+from app.services.authentication import MoonlandingUser, authenticate
+
+
+router = APIRouter()
+
+
+def revocation_list_etag(experiment_id: int, since_version: Optional[int], version: int) -> str:
+    return f'"{experiment_id}-{since_version or 0}-{version}"'
+
+
+def get_peer_key_digests(revocation_update: RevocationUpdate) -> List[str]:
+    return revocation_update.peer_key_digests + [
+        crypto.peer_key_digest(peer_public_key) for peer_public_key in revocation_update.peer_public_keys
+    ]
+
+
+@router.post("/{id}/revocations/", response_model=RevocationList, name="revocations:revoke")
+async def revoke(
+    id: int = Path(..., ge=1, title="The ID of the experiment to revoke users or peer keys from."),
+    revocation_update: RevocationUpdate = Body(..., embed=True),
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    revocations_repo: RevocationsRepository = Depends(get_repository(RevocationsRepository)),
+    user: MoonlandingUser = Depends(authenticate),
+) -> RevocationList:
+    await get_administered_experiment(id, experiments_repo, user, managed="revocations")
+
+    await revocations_repo.revoke(
+        experiment_id=id,
+        usernames=revocation_update.usernames,
+        peer_key_digests=get_peer_key_digests(revocation_update),
+    )
+    snapshot = await revocations_repo.get_revocation_snapshot(experiment_id=id)
+    return await revocations_repo.get_revocation_list(experiment_id=id, snapshot=snapshot)
+
+
+@router.post("/{id}/revocations/lift/", response_model=RevocationList, name="revocations:lift-revocations")
+async def lift_revocations(
+    id: int = Path(..., ge=1, title="The ID of the experiment to restore users or peer keys to."),
+    revocation_update: RevocationUpdate = Body(..., embed=True),
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    revocations_repo: RevocationsRepository = Depends(get_repository(RevocationsRepository)),
+    user: MoonlandingUser = Depends(authenticate),
+) -> RevocationList:
+    await get_administered_experiment(id, experiments_repo, user, managed="revocations")
+
+    await revocations_repo.lift_revocations(
+        experiment_id=id,
+        usernames=revocation_update.usernames,
+        peer_key_digests=get_peer_key_digests(revocation_update),
+    )
+    snapshot = await revocations_repo.get_revocation_snapshot(experiment_id=id)
+    return await revocations_repo.get_revocation_list(experiment_id=id, snapshot=snapshot)
+
+
+@router.get("/{id}/revocations/", response_model=RevocationList, name="revocations:get-revocation-list")
+async def get_revocation_list(
+    response: Response,
+    id: int = Path(..., ge=1, title="The ID of the experiment whose revocation list is requested."),
+    since_version: Optional[int] = Query(None, ge=0, title="Only return the changes made after this version."),
+    if_none_match: Optional[str] = Header(None),
+    experiments_repo: ExperimentsRepository = Depends(get_repository(ExperimentsRepository)),
+    revocations_repo: RevocationsRepository = Depends(get_repository(RevocationsRepository)),
+    user: MoonlandingUser = Depends(authenticate),
+) -> RevocationList:
+    experiment = await experiments_repo.get_experiment_by_id(id=id)
+
+    if not experiment or experiment.organization_name not in [org.name for org in user.orgs]:
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail="You need to be at least a reader of the organization to get the revocation list of the collaborative experiment for the model",
+        )
+
+    snapshot = await revocations_repo.get_revocation_snapshot(experiment_id=id)
+    if since_version is not None and since_version > snapshot.version:
+        # The peer may have been served by another worker whose cache was more recent
+        snapshot = await revocations_repo.get_revocation_snapshot(experiment_id=id, refresh=True)
+
+    etag = revocation_list_etag(id, since_version, snapshot.version)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return await revocations_repo.get_revocation_list(experiment_id=id, snapshot=snapshot, since_version=since_version)
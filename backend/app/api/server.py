@@ -12,11 +12,16 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.#
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
 
 from app.api.routes import router as api_router
 from app.core import config, tasks
+from app.db.pool import DB_CONNECTION_ERRORS, expire_connections
 
 
 def get_application():
@@ -33,6 +38,23 @@ def get_application():
     app.add_event_handler("shutdown", tasks.create_stop_app_handler(app))
 
     app.include_router(api_router, prefix="/api")
+
+    # Raised when no database connection frees up in time: the request can be retried once the load goes down
+    @app.exception_handler(asyncio.TimeoutError)
+    async def timeout_error_handler(request: Request, exc: asyncio.TimeoutError) -> JSONResponse:
+        return JSONResponse(status_code=HTTP_503_SERVICE_UNAVAILABLE, content={"detail": "The server is overloaded."})
+
+    # Replace all the connections of the pool, which were opened to a database that may no longer exist, before the
+    # next requests use them
+    async def database_connection_error_handler(request: Request, exc: Exception) -> JSONResponse:
+        await expire_connections(getattr(request.app.state, "_db", None))
+        return JSONResponse(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE, content={"detail": "The database is unavailable."}
+        )
+
+    for error in DB_CONNECTION_ERRORS:
+        app.add_exception_handler(error, database_connection_error_handler)
+
     return app
 
 
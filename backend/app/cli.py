@@ -0,0 +1,240 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+"""
+Administration commands, run from the backend directory against the database configured as for the app:
+
+    python -m app.cli export experiments.ndjson
+    python -m app.cli import experiments.csv
+
+Experiments are streamed with Postgres COPY in both directions. Their key pairs are exported as stored, so private keys
+stay encrypted with the SECRET_KEY of the environment they come from, which the importing environment must share.
+Imported experiments are updated at the time of the import, so that clients syncing their changes see them.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any, AsyncIterator, BinaryIO, Optional
+
+from databases import Database
+
+from app.core.config import DATABASE_URL
+
+
+FORMATS = ("ndjson", "csv")
+EXPORTED_COLUMNS = (
+    "organization_name",
+    "model_name",
+    "creator",
+    "coordinator_ip",
+    "coordinator_port",
+    "auth_server_public_key",
+    "auth_server_private_key",
+    "created_at",
+    "updated_at",
+)
+# Lines of NDJSON go through COPY as CSV with a single column whose delimiter and quote never appear in JSON text, so
+# that they are neither split nor quoted
+RAW_LINES_COPY_OPTIONS = {"format": "csv", "delimiter": "\x02", "quote": "\x01"}
+
+EXPORT_QUERY = f"""
+    SELECT {", ".join(EXPORTED_COLUMNS)}
+    FROM experiments
+    ORDER BY id
+"""
+EXPORT_NDJSON_QUERY = f"""
+    SELECT row_to_json(exported)
+    FROM ({EXPORT_QUERY}) AS exported
+"""
+CREATE_CSV_STAGING_TABLE_QUERY = f"""
+    CREATE TEMPORARY TABLE experiments_import
+    ON COMMIT DROP
+    AS SELECT {", ".join(EXPORTED_COLUMNS)}
+    FROM experiments
+    WITH NO DATA;
+"""
+CREATE_NDJSON_STAGING_TABLE_QUERY = """
+    CREATE TEMPORARY TABLE experiments_import_lines (line JSONB NOT NULL)
+    ON COMMIT DROP;
+"""
+# The changes listed since a time before the import include the imported experiments: they are updated when inserted,
+# once the file has been copied rather than at the start of the transaction, which may be older than the changes delay
+IMPORTED_VALUES = tuple(
+    "statement_timestamp()" if column == "updated_at" else f"imported.{column}" for column in EXPORTED_COLUMNS
+)
+# Experiments that already exist for an organization and model name are kept as they are
+INSERT_IMPORTED_CSV_QUERY = f"""
+    INSERT INTO experiments ({", ".join(EXPORTED_COLUMNS)})
+    SELECT {", ".join(IMPORTED_VALUES)}
+    FROM experiments_import AS imported
+    ON CONFLICT (organization_name, model_name) DO NOTHING;
+"""
+INSERT_IMPORTED_NDJSON_QUERY = f"""
+    INSERT INTO experiments ({", ".join(EXPORTED_COLUMNS)})
+    SELECT {", ".join(IMPORTED_VALUES)}
+    FROM experiments_import_lines, jsonb_populate_record(NULL::experiments, line) AS imported
+    ON CONFLICT (organization_name, model_name) DO NOTHING;
+"""
+CHUNK_SIZE = 2 ** 19
+
+
+class Progress:
+    """
+    Periodically report on stderr how many bytes went through, and how many rows when they can be counted
+    """
+
+    def __init__(self, action: str, total_bytes: Optional[int] = None, interval: float = 2.0) -> None:
+        self.action = action
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.bytes = 0
+        self.rows = 0
+        self.started_at = self.reported_at = time.monotonic()
+
+    def update(self, data: bytes, count_rows: bool = True) -> None:
+        self.bytes += len(data)
+        if count_rows:
+            self.rows += data.count(b"\n")
+        if time.monotonic() - self.reported_at >= self.interval:
+            self.report()
+
+    def report(self, done: bool = False) -> None:
+        self.reported_at = time.monotonic()
+        elapsed = max(self.reported_at - self.started_at, 1e-9)
+        message = f"{self.action}: {self.bytes / 2 ** 20:.1f} MiB"
+        if self.total_bytes:
+            message += f" ({100 * self.bytes / self.total_bytes:.0f}%)"
+        if self.rows:
+            message += f", {self.rows} rows ({self.rows / elapsed:.0f} rows/s)"
+        print(message + (", done" if done else ""), file=sys.stderr)
+
+
+async def read_chunks(file: BinaryIO, progress: Progress) -> AsyncIterator[bytes]:
+    """Feed COPY ... FROM STDIN with a file, reporting progress"""
+    while True:
+        data = file.read(CHUNK_SIZE)
+        if not data:
+            return
+        progress.update(data)
+        yield data
+
+
+def guess_format(path: str, format: Optional[str]) -> str:
+    format = format or os.path.splitext(path)[1].lstrip(".").lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}, pass one of {', '.join(FORMATS)} with --format")
+    return format
+
+
+async def export_experiments(db: Database, path: str, format: Optional[str] = None) -> int:
+    """Stream all experiments to a file, and return how many were exported"""
+    format = guess_format(path, format)
+    progress = Progress(f"Exporting to {path}")
+
+    with open(path, "wb") as file:
+
+        async def write(data: bytes) -> None:
+            file.write(data)
+            progress.update(data)
+
+        async with db.connection() as connection:
+            if format == "csv":
+                await connection.raw_connection.copy_from_query(EXPORT_QUERY, output=write, format="csv", header=True)
+            else:
+                await connection.raw_connection.copy_from_query(
+                    EXPORT_NDJSON_QUERY, output=write, **RAW_LINES_COPY_OPTIONS
+                )
+
+    if format == "csv":
+        # Header line
+        progress.rows -= 1
+    progress.report(done=True)
+    return progress.rows
+
+
+async def import_experiments(db: Database, path: str, format: Optional[str] = None) -> int:
+    """
+    Stream experiments from a file, in a single transaction, and return how many were inserted. Experiments that
+    already exist are skipped.
+    """
+    format = guess_format(path, format)
+    progress = Progress(f"Importing from {path}", total_bytes=os.path.getsize(path))
+
+    with open(path, "rb") as file:
+        async with db.connection() as connection, connection.transaction():
+            raw_connection = connection.raw_connection
+            if format == "csv":
+                # Header line
+                progress.rows -= 1
+                await raw_connection.execute(CREATE_CSV_STAGING_TABLE_QUERY)
+                await raw_connection.copy_to_table(
+                    "experiments_import", source=read_chunks(file, progress), format="csv", header=True
+                )
+                status = await raw_connection.execute(INSERT_IMPORTED_CSV_QUERY)
+            else:
+                await raw_connection.execute(CREATE_NDJSON_STAGING_TABLE_QUERY)
+                await raw_connection.copy_to_table(
+                    "experiments_import_lines",
+                    source=read_chunks(file, progress),
+                    columns=["line"],
+                    **RAW_LINES_COPY_OPTIONS,
+                )
+                status = await raw_connection.execute(INSERT_IMPORTED_NDJSON_QUERY)
+
+    progress.report(done=True)
+    # Status of the form "INSERT 0 <rows>"
+    return int(status.split()[-1])
+
+
+async def main(args: Any) -> None:
+    if DATABASE_URL.dialect == "sqlite":
+        # A copy of the SQLite database file is already an export of it
+        raise ValueError("Importing and exporting experiments requires PostgreSQL.")
+    url = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else str(DATABASE_URL)
+    db = Database(url, min_size=1, max_size=1)
+    await db.connect()
+    try:
+        if args.command == "export":
+            count = await export_experiments(db, args.path, args.format)
+            print(f"Exported {count} experiments to {args.path}", file=sys.stderr)
+        else:
+            count = await import_experiments(db, args.path, args.format)
+            print(f"Imported {count} new experiments from {args.path}", file=sys.stderr)
+    finally:
+        await db.disconnect()
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command, help in (
+        ("export", "export all experiments to a file"),
+        ("import", "import the experiments of a file, skipping those that already exist"),
+    ):
+        command_parser = commands.add_parser(command, help=help)
+        command_parser.add_argument("path")
+        command_parser.add_argument("--format", choices=FORMATS, help="guessed from the file extension by default")
+    return parser
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    try:
+        asyncio.run(main(args))
+    except ValueError as e:
+        get_parser().error(str(e))
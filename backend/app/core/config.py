@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.#
 from databases import DatabaseURL
-from starlette.config import Config
+from starlette.config import Config, undefined
 from starlette.datastructures import Secret
 
 
@@ -23,16 +23,135 @@ VERSION = "1.0.0"
 API_PREFIX = "/api"
 
 SECRET_KEY = config("SECRET_KEY", cast=Secret)
+# Bearer token of the operators allowed to read the monitoring endpoints, which are all refused while it is unset,
+# except the readiness check of load balancers
+MONITORING_TOKEN = config("MONITORING_TOKEN", cast=Secret, default="")
 
-POSTGRES_USER = config("POSTGRES_USER", cast=str)
-POSTGRES_PASSWORD = config("POSTGRES_PASSWORD", cast=Secret)
+# "postgresql", or "sqlite" for single-node deployments storing everything in one file (in WAL mode) next to the app.
+# Features relying on PostgreSQL (revocation and allowlist updates, join history, cross-worker cache eviction, read
+# replicas and the admin CLI) are unavailable on SQLite.
+DATABASE_BACKEND = config("DATABASE_BACKEND", cast=str, default="postgresql")
+SQLITE = DATABASE_BACKEND == "sqlite"
+SQLITE_PATH = config("SQLITE_PATH", cast=str, default="collaborative_training_auth.db")
+SQLITE_BUSY_TIMEOUT_SECONDS = config("SQLITE_BUSY_TIMEOUT_SECONDS", cast=float, default=5)
+
+POSTGRES_USER = config("POSTGRES_USER", cast=str, default="" if SQLITE else undefined)
+POSTGRES_PASSWORD = config("POSTGRES_PASSWORD", cast=Secret, default="" if SQLITE else undefined)
 POSTGRES_SERVER = config("POSTGRES_SERVER", cast=str, default="db")
 POSTGRES_PORT = config("POSTGRES_PORT", cast=str, default="5432")
-POSTGRES_DB = config("POSTGRES_DB", cast=str)
+POSTGRES_DB = config("POSTGRES_DB", cast=str, default="" if SQLITE else undefined)
 DATABASE_URL = config(
     "DATABASE_URL",
     cast=DatabaseURL,
-    default=f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}",
+    default=f"sqlite:///{SQLITE_PATH}"
+    if SQLITE
+    else f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}",
 )
 
 EXPIRATION_MINUTES = 60 * 6
+# Passes expire up to this many minutes early so that peers which joined together don't all renew at once. The jitter
+# is capped to half of EXPIRATION_MINUTES.
+EXPIRATION_JITTER_MINUTES = config("EXPIRATION_JITTER_MINUTES", cast=float, default=30)
+
+# Revocation lists are cached per experiment and brought up to date at most once per refresh interval
+REVOCATION_CACHE_SIZE = config("REVOCATION_CACHE_SIZE", cast=int, default=10000)
+REVOCATION_REFRESH_SECONDS = config("REVOCATION_REFRESH_SECONDS", cast=float, default=5)
+
+# Experiments are cached in each worker, lookups of experiments that do not exist for a shorter time
+EXPERIMENT_CACHE_SIZE = config("EXPERIMENT_CACHE_SIZE", cast=int, default=10000)
+EXPERIMENT_CACHE_TTL_SECONDS = config("EXPERIMENT_CACHE_TTL_SECONDS", cast=float, default=60)
+EXPERIMENT_CACHE_NEGATIVE_TTL_SECONDS = config("EXPERIMENT_CACHE_NEGATIVE_TTL_SECONDS", cast=float, default=5)
+# Decrypted private keys are cached for a limited time, and evicted as soon as their experiment is deleted or changed
+SIGNING_KEY_CACHE_SIZE = config("SIGNING_KEY_CACHE_SIZE", cast=int, default=10000)
+SIGNING_KEY_CACHE_TTL_SECONDS = config("SIGNING_KEY_CACHE_TTL_SECONDS", cast=float, default=10 * 60)
+
+# Requests per minute each token and each user can make to each kind of route, counted before the token is checked
+# with the Hub, in token buckets holding up to a minute of requests. The buckets are kept by each worker, or in the
+# database to be shared by all of them.
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", cast=bool, default=True)
+RATE_LIMIT_BACKEND = config("RATE_LIMIT_BACKEND", cast=str, default="memory")
+RATE_LIMIT_CACHE_SIZE = config("RATE_LIMIT_CACHE_SIZE", cast=int, default=100000)
+RATE_LIMIT_JOIN_PER_MINUTE = config("RATE_LIMIT_JOIN_PER_MINUTE", cast=int, default=60)
+RATE_LIMIT_CREATE_PER_MINUTE = config("RATE_LIMIT_CREATE_PER_MINUTE", cast=int, default=10)
+RATE_LIMIT_READ_PER_MINUTE = config("RATE_LIMIT_READ_PER_MINUTE", cast=int, default=600)
+RATE_LIMIT_WRITE_PER_MINUTE = config("RATE_LIMIT_WRITE_PER_MINUTE", cast=int, default=120)
+
+# The public key sets served to verifiers are rendered once per key and cached, those of organizations for as long as
+# experiments are. Clients and CDNs may cache them for the max-ages: the key of an experiment never changes, while
+# organizations gain and lose experiments.
+KEY_SET_CACHE_SIZE = config("KEY_SET_CACHE_SIZE", cast=int, default=10000)
+KEY_SET_MAX_AGE_SECONDS = config("KEY_SET_MAX_AGE_SECONDS", cast=int, default=24 * 60 * 60)
+ORGANIZATION_KEY_SET_MAX_AGE_SECONDS = config("ORGANIZATION_KEY_SET_MAX_AGE_SECONDS", cast=int, default=5 * 60)
+
+LIST_EXPERIMENTS_PAGE_SIZE = config("LIST_EXPERIMENTS_PAGE_SIZE", cast=int, default=50)
+LIST_EXPERIMENTS_MAX_PAGE_SIZE = config("LIST_EXPERIMENTS_MAX_PAGE_SIZE", cast=int, default=500)
+# Experiments whose coordinator a single bulk update can list
+MAX_COORDINATOR_UPDATES = config("MAX_COORDINATOR_UPDATES", cast=int, default=1000)
+# The changes endpoint only returns the changes older than the delay, so that a transaction which commits after a
+# later one cannot be missed by a client already past it. Deletions are kept for the retention period, past which
+# cursors expire.
+EXPERIMENT_CHANGES_DELAY_SECONDS = config("EXPERIMENT_CHANGES_DELAY_SECONDS", cast=float, default=5)
+EXPERIMENT_TOMBSTONE_RETENTION_DAYS = config("EXPERIMENT_TOMBSTONE_RETENTION_DAYS", cast=int, default=30)
+# Tombstones past retention are deleted by a background task on this interval
+EXPERIMENT_TOMBSTONE_PURGE_INTERVAL_SECONDS = config(
+    "EXPERIMENT_TOMBSTONE_PURGE_INTERVAL_SECONDS", cast=float, default=60 * 60
+)
+
+# Connection pool of each worker. Connections idle for longer than the lifetime are closed and reopened on demand.
+DB_POOL_MIN_SIZE = config("DB_POOL_MIN_SIZE", cast=int, default=2)
+DB_POOL_MAX_SIZE = config("DB_POOL_MAX_SIZE", cast=int, default=10)
+DB_POOL_ACQUIRE_TIMEOUT_SECONDS = config("DB_POOL_ACQUIRE_TIMEOUT_SECONDS", cast=float, default=10)
+DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS = config(
+    "DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS", cast=float, default=300
+)
+DB_STATEMENT_TIMEOUT_MS = config("DB_STATEMENT_TIMEOUT_MS", cast=int, default=30000)
+# asyncpg keeps this many prepared statements per connection. PgBouncer in transaction pooling mode cannot route a
+# prepared statement back to the server connection that prepared it, so they are disabled behind it.
+DB_PGBOUNCER_TRANSACTION_POOLING = config("DB_PGBOUNCER_TRANSACTION_POOLING", cast=bool, default=False)
+DB_STATEMENT_CACHE_SIZE = (
+    0 if DB_PGBOUNCER_TRANSACTION_POOLING else config("DB_STATEMENT_CACHE_SIZE", cast=int, default=100)
+)
+
+# Optional streaming replica serving experiment reads while its lag stays under REPLICA_MAX_LAG_SECONDS, measured at
+# most every REPLICA_CHECK_INTERVAL_SECONDS. A worker reads from the primary for REPLICA_MAX_LAG_SECONDS after a write.
+DATABASE_REPLICA_URL = config("DATABASE_REPLICA_URL", cast=str, default="") or None
+REPLICA_MAX_LAG_SECONDS = config("REPLICA_MAX_LAG_SECONDS", cast=float, default=5)
+REPLICA_CHECK_INTERVAL_SECONDS = config("REPLICA_CHECK_INTERVAL_SECONDS", cast=float, default=2)
+
+# Each worker listens for the changes made to experiments by the others to evict them from its cache. The connection
+# is checked every heartbeat, and reopened with exponential backoff when lost.
+EXPERIMENT_CHANGES_LISTENER = config("EXPERIMENT_CHANGES_LISTENER", cast=bool, default=True)
+LISTENER_HEARTBEAT_SECONDS = config("LISTENER_HEARTBEAT_SECONDS", cast=float, default=5)
+LISTENER_MAX_BACKOFF_SECONDS = config("LISTENER_MAX_BACKOFF_SECONDS", cast=float, default=60)
+
+# At startup, connecting to the database is retried with exponential backoff until the deadline. Past it, the app
+# starts anyway and connects on the first request, at most once per retry interval.
+DB_CONNECT_DEADLINE_SECONDS = config("DB_CONNECT_DEADLINE_SECONDS", cast=float, default=30)
+DB_CONNECT_MAX_BACKOFF_SECONDS = config("DB_CONNECT_MAX_BACKOFF_SECONDS", cast=float, default=5)
+DB_CONNECT_RETRY_INTERVAL_SECONDS = config("DB_CONNECT_RETRY_INTERVAL_SECONDS", cast=float, default=1)
+READINESS_TIMEOUT_SECONDS = config("READINESS_TIMEOUT_SECONDS", cast=float, default=2)
+
+# Joins are recorded in a bounded in-memory queue, flushed to the database by batches of up to JOIN_HISTORY_BATCH_SIZE
+# rows at least every JOIN_HISTORY_FLUSH_INTERVAL_SECONDS. Joins are dropped, not delayed, when the queue is full.
+JOIN_HISTORY_ENABLED = config("JOIN_HISTORY_ENABLED", cast=bool, default=True)
+JOIN_HISTORY_QUEUE_SIZE = config("JOIN_HISTORY_QUEUE_SIZE", cast=int, default=100000)
+JOIN_HISTORY_BATCH_SIZE = config("JOIN_HISTORY_BATCH_SIZE", cast=int, default=1000)
+JOIN_HISTORY_FLUSH_INTERVAL_SECONDS = config("JOIN_HISTORY_FLUSH_INTERVAL_SECONDS", cast=float, default=1)
+JOIN_HISTORY_RETENTION_DAYS = config("JOIN_HISTORY_RETENTION_DAYS", cast=int, default=90)
+
+# Joins are also counted in memory per experiment and minute, with an estimate of the distinct peers, and the counts
+# are written to a rollup table every JOIN_STATS_FLUSH_INTERVAL_SECONDS
+JOIN_STATS_ENABLED = config("JOIN_STATS_ENABLED", cast=bool, default=True)
+JOIN_STATS_FLUSH_INTERVAL_SECONDS = config("JOIN_STATS_FLUSH_INTERVAL_SECONDS", cast=float, default=10)
+JOIN_STATS_RETENTION_DAYS = config("JOIN_STATS_RETENTION_DAYS", cast=int, default=30)
+
+# Allowlists are cached per experiment and brought up to date at most once per refresh interval
+ALLOWLIST_CACHE_SIZE = config("ALLOWLIST_CACHE_SIZE", cast=int, default=1000)
+ALLOWLIST_REFRESH_SECONDS = config("ALLOWLIST_REFRESH_SECONDS", cast=float, default=5)
+
+# Queries slower than the threshold are logged with their secret parameters redacted (a threshold of 0 disables it).
+# The SLOW_QUERY_SAMPLES slowest ones are kept for the monitoring endpoint without their parameters, along with the
+# EXPLAIN ANALYZE output of the read-only ones if SLOW_QUERY_EXPLAIN is set, which runs them a second time.
+SLOW_QUERY_THRESHOLD_MS = config("SLOW_QUERY_THRESHOLD_MS", cast=float, default=100)
+SLOW_QUERY_SAMPLES = config("SLOW_QUERY_SAMPLES", cast=int, default=20)
+SLOW_QUERY_EXPLAIN = config("SLOW_QUERY_EXPLAIN", cast=bool, default=False)
@@ -16,18 +16,40 @@ from typing import Callable
 
 from fastapi import FastAPI
 
-from app.db.tasks import close_db_connection, connect_to_db
+from app.db.tasks import (
+    close_db_connection,
+    connect_to_db,
+    start_experiment_changes_listener,
+    start_join_history,
+    start_join_stats,
+    start_rate_limiter,
+    start_tombstone_purger,
+    stop_experiment_changes_listener,
+    stop_join_history,
+    stop_join_stats,
+    stop_tombstone_purger,
+)
 
 
 def create_start_app_handler(app: FastAPI) -> Callable:
     async def start_app() -> None:
         await connect_to_db(app)
+        await start_experiment_changes_listener(app)
+        await start_join_history(app)
+        await start_join_stats(app)
+        await start_tombstone_purger(app)
+        start_rate_limiter(app)
 
     return start_app
 
 
 def create_stop_app_handler(app: FastAPI) -> Callable:
     async def stop_app() -> None:
+        await stop_experiment_changes_listener(app)
+        # Writes the joins still queued and the last join counters, before the database is closed
+        await stop_join_history(app)
+        await stop_join_stats(app)
+        await stop_tombstone_purger(app)
         await close_db_connection(app)
 
     return stop_app
@@ -0,0 +1,270 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+
+# (kind, value, is_member, seq) as stored in a versioned membership table
+SetChange = Tuple[str, str, bool, int]
+
+
+class SetSnapshot:
+    """
+    Members of a versioned set, grouped by kind, as of the change with sequence number `version`
+    """
+
+    __slots__ = ("members", "version", "refreshed_at")
+
+    def __init__(self) -> None:
+        self.members: Dict[str, Set[str]] = defaultdict(set)
+        self.version = 0
+        self.refreshed_at = float("-inf")
+
+    def apply(self, changes: Iterable[SetChange]) -> None:
+        for kind, value, is_member, seq in changes:
+            if seq <= self.version:
+                continue
+            if is_member:
+                self.members[kind].add(value)
+            else:
+                self.members[kind].discard(value)
+            self.version = seq
+
+    def contains(self, kind: str, value: str) -> bool:
+        return value in self.members.get(kind, ())
+
+
+class IncrementalSetCache:
+    """
+    Bounded in-process cache of versioned sets (one per key), refreshed by fetching only the changes that happened
+    since the version already held, at most once every `refresh_interval` seconds.
+    """
+
+    def __init__(self, maxsize: int, refresh_interval: float) -> None:
+        self.maxsize = maxsize
+        self.refresh_interval = refresh_interval
+        self._snapshots: "OrderedDict[Hashable, SetSnapshot]" = OrderedDict()
+
+    async def get(self, key: Hashable, fetch_changes: Callable[[int], Awaitable[Iterable[SetChange]]]) -> SetSnapshot:
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            snapshot = self._snapshots[key] = SetSnapshot()
+            if len(self._snapshots) > self.maxsize:
+                self._snapshots.popitem(last=False)
+        else:
+            self._snapshots.move_to_end(key)
+
+        now = time.monotonic()
+        if now - snapshot.refreshed_at >= self.refresh_interval:
+            snapshot.apply(await fetch_changes(snapshot.version))
+            snapshot.refreshed_at = now
+        return snapshot
+
+    def invalidate(self, key: Hashable) -> None:
+        """Force the next `get` of this key to fetch the latest changes"""
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            snapshot.refreshed_at = float("-inf")
+
+    def discard(self, key: Hashable) -> None:
+        self._snapshots.pop(key, None)
+
+    def clear(self) -> None:
+        self._snapshots.clear()
+
+
+class ExperimentCache:
+    """
+    Bounded LRU cache of experiments indexed both by id and by (organization_name, model_name). Each experiment can be
+    cached under several views (projections of its row), which are all evicted together. Lookups that found no
+    experiment are cached as well, for `negative_ttl` seconds, so that repeated requests for experiments that do not
+    exist stay cheap.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float, views: Tuple[str, ...]) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.views = views
+        # key -> (expiration time, experiment or None)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # Bumped by every invalidation so that a read which started before a write does not cache what it read
+        self.generation = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def id_key(view: str, id: int) -> Hashable:
+        return (view, "id", id)
+
+    @staticmethod
+    def name_key(view: str, organization_name: str, model_name: str) -> Hashable:
+        return (view, "name", organization_name, model_name)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return whether the key is cached, and the cached experiment (None if known not to exist)"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._pop(key)
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        if entry[1] is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, entry[1]
+
+    def set(self, key: Hashable, experiment: Any, generation: int) -> None:
+        """Cache the result of a lookup of `key` that started when the cache was at `generation`"""
+        if generation != self.generation:
+            return
+        if experiment is None:
+            self._put(key, None, self.negative_ttl)
+            return
+        view = key[0]
+        self._put(self.id_key(view, experiment.id), experiment, self.ttl)
+        self._put(self.name_key(view, experiment.organization_name, experiment.model_name), experiment, self.ttl)
+
+    def _put(self, key: Hashable, experiment: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, experiment)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: Hashable) -> None:
+        # An experiment is always cached under both its keys or under none of them, which lets it be invalidated
+        # knowing only one of them
+        _, experiment = self._entries.pop(key, (None, None))
+        if experiment is not None:
+            view = key[0]
+            self._entries.pop(self.id_key(view, experiment.id), None)
+            self._entries.pop(self.name_key(view, experiment.organization_name, experiment.model_name), None)
+
+    def invalidate(
+        self, id: Optional[int] = None, organization_name: Optional[str] = None, model_name: Optional[str] = None
+    ) -> None:
+        """Evict an experiment under all its keys and views, given its id and/or its (organization_name, model_name)"""
+        self.generation += 1
+        for view in self.views:
+            if id is not None:
+                self._pop(self.id_key(view, id))
+            if organization_name is not None and model_name is not None:
+                self._pop(self.name_key(view, organization_name, model_name))
+
+    def invalidate_ids(self, ids: Iterable[int]) -> None:
+        """Evict several experiments at once under all their keys and views, given their ids"""
+        self.generation += 1
+        for id in ids:
+            for view in self.views:
+                self._pop(self.id_key(view, id))
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.negative_hits + self.misses
+        return (self.hits + self.negative_hits) / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+        }
+
+
+class LRUCache:
+    """
+    Minimal bounded mapping evicting the least recently used key
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Any:
+        return self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class SigningKeyCache:
+    """
+    Bounded LRU cache of the decrypted private keys of experiments by key id, each kept for at most `ttl` seconds, and
+    evicted as well when its experiment is deleted or changed
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key id -> (expiration time, experiment id, private key)
+        self._entries: "OrderedDict[str, Tuple[float, int, Any]]" = OrderedDict()
+        # experiment id -> key id
+        self._key_ids: Dict[int, str] = {}
+
+    def get(self, key_id: str) -> Any:
+        entry = self._entries.get(key_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._pop(key_id)
+            return None
+        self._entries.move_to_end(key_id)
+        return entry[2]
+
+    def set(self, key_id: str, experiment_id: int, private_key: Any) -> None:
+        self.discard(experiment_id)
+        if key_id in self._entries:
+            self._pop(key_id)
+        self._entries[key_id] = (time.monotonic() + self.ttl, experiment_id, private_key)
+        self._key_ids[experiment_id] = key_id
+        while len(self._entries) > self.maxsize:
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, key_id: str) -> None:
+        _, experiment_id, _ = self._entries.pop(key_id)
+        if self._key_ids.get(experiment_id) == key_id:
+            del self._key_ids[experiment_id]
+
+    def discard(self, experiment_id: int) -> None:
+        key_id = self._key_ids.get(experiment_id)
+        if key_id is not None:
+            self._pop(key_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._key_ids.clear()
@@ -0,0 +1,245 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import heapq
+import importlib
+import inspect
+import itertools
+import json
+import logging
+import pkgutil
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
+
+from databases import Database
+
+from app.core.config import SLOW_QUERY_EXPLAIN, SLOW_QUERY_SAMPLES, SLOW_QUERY_THRESHOLD_MS
+from app.core.metrics import Histogram
+from app.db.sqlite import is_sqlite
+
+
+logger = logging.getLogger(__name__)
+
+UNNAMED_QUERY = "unnamed"
+# Parameters whose name contains one of these are never logged nor reported
+SECRET_PARAMETER_PATTERN = re.compile(r"key|secret|password|token|access", re.IGNORECASE)
+REDACTED = "<redacted>"
+MAX_LOGGED_ITEMS = 10
+# Running a query again under EXPLAIN ANALYZE must have no side effect
+READ_ONLY_QUERY_PATTERN = re.compile(r"^\s*SELECT\b", re.IGNORECASE)
+LOCKING_CLAUSE_PATTERN = re.compile(r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|SHARE|KEY\s+SHARE)\b", re.IGNORECASE)
+
+_query_names: Optional[Dict[str, str]] = None
+
+
+def query_name(query: Any) -> str:
+    """
+    Name of a query after the constant of the repository module defining it, for instance
+    `experiments.get_experiment_by_id` for `GET_EXPERIMENT_BY_ID_QUERY` of `app.db.repositories.experiments`
+    """
+    global _query_names
+    if _query_names is None:
+        # Collected on first use, as the repositories are imported after this module
+        import app.db.repositories as repositories
+
+        _query_names = {}
+        for module_info in pkgutil.iter_modules(repositories.__path__):
+            module = importlib.import_module(f"{repositories.__name__}.{module_info.name}")
+            source = inspect.getsource(module)
+            for constant, value in vars(module).items():
+                # Queries imported from another repository are named after the one defining them
+                if (
+                    constant.endswith("_QUERY")
+                    and isinstance(value, str)
+                    and re.search(rf"^{constant} = ", source, re.MULTILINE)
+                ):
+                    _query_names[value] = f"{module_info.name}.{constant[: -len('_QUERY')].lower()}"
+    return _query_names.get(query, UNNAMED_QUERY) if isinstance(query, str) else UNNAMED_QUERY
+
+
+def redact(values: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    """Parameters of a query that are safe to log: secrets and binary values are redacted, long lists truncated"""
+    redacted: Dict[str, Any] = {}
+    for name, value in (values or {}).items():
+        if SECRET_PARAMETER_PATTERN.search(name) or isinstance(value, (bytes, bytearray, memoryview)):
+            redacted[name] = REDACTED
+        elif isinstance(value, (list, tuple)) and len(value) > MAX_LOGGED_ITEMS:
+            redacted[name] = [*value[:MAX_LOGGED_ITEMS], f"... ({len(value)} items)"]
+        elif value is None or isinstance(value, (bool, int, float, str)):
+            redacted[name] = value
+        else:
+            redacted[name] = str(value)
+    return redacted
+
+
+def is_read_only(query: Any) -> bool:
+    return (
+        isinstance(query, str)
+        and READ_ONLY_QUERY_PATTERN.match(query) is not None
+        and LOCKING_CLAUSE_PATTERN.search(query) is None
+    )
+
+
+class QueryMetrics:
+    __slots__ = ("latency", "calls", "errors", "rows", "slow")
+
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.slow = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "slow": self.slow,
+            "latency_seconds": self.latency.snapshot(),
+        }
+
+
+class QueryStats:
+    """
+    Latency and row counts of the queries, by name, and samples of the slowest ones
+    """
+
+    def __init__(self, slow_threshold: float, max_samples: int, explain: bool) -> None:
+        self.slow_threshold = slow_threshold
+        self.max_samples = max_samples
+        self.explain = explain
+        self.queries: Dict[str, QueryMetrics] = {}
+        # Min-heap of (duration, tie-breaker, sample), so that the fastest sample is the first to go
+        self._samples: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._sample_ids = itertools.count()
+
+    async def observe(
+        self,
+        db: Database,
+        query: Any,
+        values: Optional[Mapping[str, Any]],
+        duration: float,
+        rows: Optional[int],
+        failed: bool = False,
+    ) -> None:
+        name = query_name(query)
+        metrics = self.queries.get(name)
+        if metrics is None:
+            metrics = self.queries[name] = QueryMetrics()
+        metrics.latency.observe(duration)
+        metrics.calls += 1
+        metrics.rows += rows or 0
+        metrics.errors += failed
+
+        if not self.slow_threshold or duration < self.slow_threshold:
+            return
+        metrics.slow += 1
+        redacted = redact(values)
+        logger.warning(f"Slow query {name} took {duration * 1000:.1f} ms with parameters {redacted}")
+
+        if len(self._samples) >= self.max_samples and duration <= self._samples[0][0]:
+            return
+        sample = {
+            "name": name,
+            "duration_seconds": duration,
+            "observed_at": datetime.now(timezone.utc),
+            "plan": None,
+        }
+        entry = (duration, next(self._sample_ids), sample)
+        if len(self._samples) < self.max_samples:
+            heapq.heappush(self._samples, entry)
+        else:
+            heapq.heapreplace(self._samples, entry)
+        if self.explain and not failed and is_read_only(query) and not is_sqlite(db):
+            sample["plan"] = await self._explain(db, query, values)
+
+    async def _explain(self, db: Database, query: str, values: Optional[Mapping[str, Any]]) -> Optional[Any]:
+        try:
+            # Bypasses the instrumentation, which would otherwise observe the EXPLAIN itself
+            plan = await Database.fetch_val(
+                db, query="EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, values=values
+            )
+        except Exception as e:
+            logger.warning(f"Could not explain the slow query {query_name(query)}: {e!r}")
+            return None
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    def slow_samples(self) -> List[Dict[str, Any]]:
+        return [sample for _, _, sample in sorted(self._samples, key=lambda entry: entry[0], reverse=True)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queries": {name: metrics.snapshot() for name, metrics in sorted(self.queries.items())},
+            "slow_samples": self.slow_samples(),
+        }
+
+    def reset(self) -> None:
+        self.queries.clear()
+        self._samples.clear()
+
+
+# Shared by the primary and the replica
+query_stats = QueryStats(
+    slow_threshold=SLOW_QUERY_THRESHOLD_MS / 1000, max_samples=SLOW_QUERY_SAMPLES, explain=SLOW_QUERY_EXPLAIN
+)
+
+
+def count_row(result: Any) -> int:
+    return 0 if result is None else 1
+
+
+class InstrumentedDatabase(Database):
+    """
+    Database recording the latency and row count of every query in `query_stats`. Queries run with `execute` count no
+    rows, as the asyncpg backend of `databases` does not report them.
+    """
+
+    def __init__(self, url: str, *, query_stats: QueryStats = query_stats, **options: Any) -> None:
+        super().__init__(url, **options)
+        self.query_stats = query_stats
+
+    async def _timed(
+        self,
+        method: Callable[..., Awaitable[Any]],
+        query: Any,
+        values: Optional[Mapping[str, Any]],
+        count_rows: Optional[Callable[[Any], int]],
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await method(query=query, values=values)
+        except Exception:
+            await self.query_stats.observe(self, query, values, time.perf_counter() - start, None, failed=True)
+            raise
+        rows = count_rows(result) if count_rows is not None else None
+        await self.query_stats.observe(self, query, values, time.perf_counter() - start, rows)
+        return result
+
+    async def fetch_all(self, query: Any, values: Optional[Mapping[str, Any]] = None) -> List[Any]:
+        return await self._timed(super().fetch_all, query, values, count_rows=len)
+
+    async def fetch_one(self, query: Any, values: Optional[Mapping[str, Any]] = None) -> Optional[Any]:
+        return await self._timed(super().fetch_one, query, values, count_rows=count_row)
+
+    async def fetch_val(self, query: Any, values: Optional[Mapping[str, Any]] = None, column: Any = 0) -> Any:
+        async def fetch_val(query: Any, values: Optional[Mapping[str, Any]]) -> Any:
+            return await super(InstrumentedDatabase, self).fetch_val(query=query, values=values, column=column)
+
+        return await self._timed(fetch_val, query, values, count_rows=count_row)
+
+    async def execute(self, query: Any, values: Optional[Mapping[str, Any]] = None) -> Any:
+        return await self._timed(super().execute, query, values, count_rows=None)
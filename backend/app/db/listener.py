@@ -0,0 +1,130 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+import datetime
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import asyncpg
+
+from app.db.prepared import compile_query
+from app.db.replica import ReplicaRouter
+from app.db.repositories.experiments import ExperimentsRepository
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "experiment_changes"
+LIST_EXPERIMENTS_CHANGED_SINCE_QUERY = """
+    SELECT id, organization_name, model_name
+    FROM experiments
+    WHERE updated_at >= :since;
+"""
+LIST_EXPERIMENTS_DELETED_SINCE_QUERY = """
+    SELECT experiment_id AS id, organization_name, model_name
+    FROM experiment_tombstones
+    WHERE deleted_at >= :since;
+"""
+HEARTBEAT_QUERY = "SELECT now();"
+# updated_at is the start time of the writing transaction, which may commit after a heartbeat that follows it
+CATCH_UP_MARGIN = datetime.timedelta(minutes=1)
+
+
+def evict_experiment(change: Dict[str, Any], router: Optional[ReplicaRouter] = None) -> None:
+    """
+    Evict a changed experiment from the cache of this worker, under its current and previous names. The worker then
+    reads from the primary until the replica has replayed the change, so that the cache is not filled again with the
+    experiment as it was before.
+    """
+    if router is not None:
+        router.record_write()
+    cache = ExperimentsRepository.cache
+    cache.invalidate(id=change["id"], organization_name=change["organization_name"], model_name=change["model_name"])
+    ExperimentsRepository.signing_keys.discard(change["id"])
+    if change.get("previous_organization_name") is not None:
+        cache.invalidate(
+            organization_name=change["previous_organization_name"], model_name=change["previous_model_name"]
+        )
+
+
+class ExperimentChangesListener:
+    """
+    Keep a connection listening for the changes of experiments, and evict them from the cache of this worker. After
+    losing the connection, evict the experiments updated meanwhile, and those deleted or moved to another organization
+    meanwhile as recorded by their tombstones.
+    """
+
+    def __init__(
+        self, dsn: str, heartbeat_interval: float, max_backoff: float, router: Optional[ReplicaRouter] = None
+    ) -> None:
+        self.dsn = dsn
+        self.router = router
+        self.heartbeat_interval = heartbeat_interval
+        self.max_backoff = max_backoff
+        # Database time of the last heartbeat, before which all changes have been seen
+        self.synced_at: Optional[datetime.datetime] = None
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notification(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        evict_experiment(json.loads(payload), self.router)
+
+    async def catch_up(self, connection: asyncpg.Connection, since: datetime.datetime) -> int:
+        changes = []
+        for query in (LIST_EXPERIMENTS_CHANGED_SINCE_QUERY, LIST_EXPERIMENTS_DELETED_SINCE_QUERY):
+            sql, _ = compile_query(query)
+            changes.extend(await connection.fetch(sql, since))
+        for change in changes:
+            evict_experiment(dict(change), self.router)
+        return len(changes)
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(CHANNEL, self._on_notification)
+                if self.synced_at is not None:
+                    evicted = await self.catch_up(connection, self.synced_at - CATCH_UP_MARGIN)
+                    logger.info(f"Listening to experiment changes again, evicted {evicted} changed meanwhile")
+                self.connected = True
+                backoff = 1.0
+                while True:
+                    self.synced_at = await connection.fetchval(HEARTBEAT_QUERY)
+                    await asyncio.sleep(self.heartbeat_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Lost the connection listening to experiment changes, retrying in {backoff}s: {e}")
+            finally:
+                self.connected = False
+                if connection is not None:
+                    connection.terminate()
+            await asyncio.sleep(backoff)
+            backoff = min(2 * backoff, self.max_backoff)
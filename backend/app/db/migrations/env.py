@@ -48,7 +48,11 @@ def run_migrations_online() -> None:
     DB_URL = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else str(DATABASE_URL)
 
     # handle testing config for migrations
-    if os.environ.get("TESTING"):
+    if os.environ.get("TESTING") and DATABASE_URL.dialect == "sqlite":
+        # start from a fresh database file, along with its write-ahead log
+        for suffix in ("", "-wal", "-shm"):
+            pathlib.Path(f"{DATABASE_URL.database}_test{suffix}").unlink(missing_ok=True)
+    elif os.environ.get("TESTING"):
         # connect to primary db
         default_engine = create_engine(str(DATABASE_URL), isolation_level="AUTOCOMMIT")
         # drop testing db if it exists and create a fresh one
@@ -70,10 +70,16 @@ def create_collaborators_table() -> None:
 
 
 def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     op.drop_column("whitelist", "peer_public_key")
     create_collaborators_table()
 
 
 def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     op.add_column("whitelist", sa.Column("peer_public_key", sa.Text))
     op.drop_table("collaborators")
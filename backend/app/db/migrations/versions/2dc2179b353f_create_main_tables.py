@@ -121,6 +121,9 @@ def create_users_table() -> None:
 
 
 def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     create_updated_at_trigger()
     create_experiments_table()
     create_whitelist_table()
@@ -128,6 +131,9 @@ def upgrade() -> None:
 
 
 def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     op.drop_table("users")
     op.drop_table("experiments")
     op.drop_table("whitelist")
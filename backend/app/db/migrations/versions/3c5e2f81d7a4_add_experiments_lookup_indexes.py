@@ -0,0 +1,76 @@
+"""add experiments lookup indexes
+Revision ID: 3c5e2f81d7a4
+Revises: aefb9c67ee6e
+Create Date: 2026-10-18 11:02:17.804125
+
+Experiments sharing an organization and model name, which nothing prevented before, must be deleted or renamed first:
+the upgrade lists them and stops otherwise.
+"""
+from collections import defaultdict
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic
+revision = "3c5e2f81d7a4"
+down_revision = "aefb9c67ee6e"
+branch_labels = None
+depends_on = None
+
+LIST_DUPLICATE_EXPERIMENTS_QUERY = """
+    SELECT organization_name, model_name, id
+    FROM experiments
+    WHERE EXISTS (
+        SELECT 1
+        FROM experiments AS other
+        WHERE other.organization_name = experiments.organization_name
+        AND other.model_name = experiments.model_name
+        AND other.id <> experiments.id
+    )
+    ORDER BY organization_name, model_name, id;
+"""
+# Duplicates listed in the error message at most
+MAX_LISTED_DUPLICATES = 20
+
+
+def check_no_duplicate_experiments() -> None:
+    """Refuse to upgrade while experiments share an organization and model name, which the constraint would reject"""
+    ids = defaultdict(list)
+    for organization_name, model_name, id in op.get_bind().execute(sa.text(LIST_DUPLICATE_EXPERIMENTS_QUERY)):
+        ids[(organization_name, model_name)].append(str(id))
+    if not ids:
+        return
+    listed = [
+        f"{organization_name}/{model_name} (ids {', '.join(experiment_ids)})"
+        for (organization_name, model_name), experiment_ids in list(ids.items())[:MAX_LISTED_DUPLICATES]
+    ]
+    if len(ids) > MAX_LISTED_DUPLICATES:
+        listed.append(f"and {len(ids) - MAX_LISTED_DUPLICATES} more")
+    raise RuntimeError(
+        f"{len(ids)} organization and model names are shared by several experiments, which must be unique: "
+        f"{'; '.join(listed)}. Delete or rename all but one experiment of each, then upgrade again."
+    )
+
+
+def upgrade() -> None:
+    # Serves lookups by (organization_name, model_name), the listing ordered by the same columns, and lets concurrent
+    # creations of the same experiment conflict. It makes the single-column index on organization_name redundant.
+    check_no_duplicate_experiments()
+    if op.get_bind().dialect.name == "sqlite":
+        # SQLite cannot add constraints to existing tables, but a unique index serves the same purposes
+        op.create_index("uix_1", "experiments", ["organization_name", "model_name"], unique=True)
+    else:
+        op.create_unique_constraint("uix_1", "experiments", ["organization_name", "model_name"])
+    op.drop_index("ix_experiments_organization_name", table_name="experiments")
+    # Serves reads of the experiments changed since a given point in time
+    op.create_index("ix_experiments_updated_at_id", "experiments", ["updated_at", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_experiments_updated_at_id", table_name="experiments")
+    op.create_index("ix_experiments_organization_name", "experiments", ["organization_name"], unique=False)
+    if op.get_bind().dialect.name == "sqlite":
+        op.drop_index("uix_1", table_name="experiments")
+    else:
+        op.drop_constraint("uix_1", "experiments", type_="unique")
@@ -0,0 +1,66 @@
+"""notify experiment changes
+Revision ID: 5d0c7b3e9a12
+Revises: 3c5e2f81d7a4
+Create Date: 2026-10-18 14:37:52.119604
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic
+revision = "5d0c7b3e9a12"
+down_revision = "3c5e2f81d7a4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # SQLite has no notifications, a single worker serves SQLite databases
+        return
+    # Workers listen on this channel to evict the experiments changed by other workers from their caches. Updates also
+    # carry the previous names, under which the experiment may be cached too.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_experiment_change()
+            RETURNS TRIGGER AS
+        $$
+        DECLARE
+            changed experiments;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := OLD;
+            ELSE
+                changed := NEW;
+            END IF;
+            PERFORM pg_notify(
+                'experiment_changes',
+                json_build_object(
+                    'id', changed.id,
+                    'organization_name', changed.organization_name,
+                    'model_name', changed.model_name,
+                    'previous_organization_name', CASE WHEN TG_OP = 'UPDATE' THEN OLD.organization_name END,
+                    'previous_model_name', CASE WHEN TG_OP = 'UPDATE' THEN OLD.model_name END
+                )::text
+            );
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER notify_experiments_change
+            AFTER INSERT OR UPDATE OR DELETE
+            ON experiments
+            FOR EACH ROW
+        EXECUTE PROCEDURE notify_experiment_change();
+        """
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # SQLite has no notifications, a single worker serves SQLite databases
+        return
+    op.execute("DROP TRIGGER notify_experiments_change ON experiments")
+    op.execute("DROP FUNCTION notify_experiment_change")
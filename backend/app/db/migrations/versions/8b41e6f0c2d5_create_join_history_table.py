@@ -0,0 +1,48 @@
+"""create join history table
+Revision ID: 8b41e6f0c2d5
+Revises: 5d0c7b3e9a12
+Create Date: 2026-10-19 09:24:06.318772
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic
+revision = "8b41e6f0c2d5"
+down_revision = "5d0c7b3e9a12"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Partitioned by day of join, so that history past its retention is dropped a partition at a time. The app creates
+    # the partitions of the coming days; the default partition only catches joins if it did not.
+    # No foreign key to experiments: the history of an experiment outlives it.
+    if op.get_bind().dialect.name == "sqlite":
+        # Not partitioned: the join history is not recorded on SQLite, the table only keeps the schemas alike
+        op.create_table(
+            "join_history",
+            sa.Column("experiment_id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.Text(), nullable=False),
+            sa.Column("peer_key_digest", sa.Text(), nullable=True),
+            sa.Column("joined_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        )
+        op.create_index("ix_join_history_experiment_id_joined_at", "join_history", ["experiment_id", "joined_at"])
+        return
+
+    op.execute(
+        """
+        CREATE TABLE join_history (
+            experiment_id INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            peer_key_digest TEXT,
+            joined_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        ) PARTITION BY RANGE (joined_at);
+        """
+    )
+    op.execute("CREATE TABLE join_history_default PARTITION OF join_history DEFAULT;")
+    op.create_index("ix_join_history_experiment_id_joined_at", "join_history", ["experiment_id", "joined_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("join_history")
@@ -7,6 +7,8 @@ import sqlalchemy as sa
 import sqlalchemy_utils
 from alembic import op
 
+from app.db.sqlite import updated_at_trigger
+
 
 # revision identifiers, used by Alembic
 revision = "97659da4900e"
@@ -31,7 +33,9 @@ def create_updated_at_trigger() -> None:
 
 
 def upgrade() -> None:
-    create_updated_at_trigger()
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    if not sqlite:
+        create_updated_at_trigger()
     # ### commands auto generated by Alembic - please adjust! ###
     op.create_table(
         "experiments",
@@ -43,21 +47,24 @@ def upgrade() -> None:
         sa.Column("coordinator_port", sa.Integer(), nullable=True),
         sa.Column("auth_server_public_key", sa.LargeBinary(), nullable=True),
         sa.Column("auth_server_private_key", sa.LargeBinary(), nullable=True),
-        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
-        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
         sa.PrimaryKeyConstraint("id"),
     )
     op.create_index(op.f("ix_experiments_model_name"), "experiments", ["model_name"], unique=False)
     op.create_index(op.f("ix_experiments_organization_name"), "experiments", ["organization_name"], unique=False)
-    op.execute(
-        """
-        CREATE TRIGGER update_experiments_modtime
-            BEFORE UPDATE
-            ON experiments
-            FOR EACH ROW
-        EXECUTE PROCEDURE update_updated_at_column();
-        """
-    )
+    if sqlite:
+        op.execute(updated_at_trigger("experiments"))
+    else:
+        op.execute(
+            """
+            CREATE TRIGGER update_experiments_modtime
+                BEFORE UPDATE
+                ON experiments
+                FOR EACH ROW
+            EXECUTE PROCEDURE update_updated_at_column();
+            """
+        )
     # ### end Alembic commands ###
 
 
@@ -67,5 +74,6 @@ def downgrade() -> None:
     op.drop_index(op.f("ix_experiments_model_name"), table_name="experiments")
     op.drop_index(op.f("ix_experiments_creator"), table_name="experiments")
     op.drop_table("experiments")
-    op.execute("DROP FUNCTION update_updated_at_column")
+    if op.get_bind().dialect.name != "sqlite":
+        op.execute("DROP FUNCTION update_updated_at_column")
     # ### end Alembic commands ###
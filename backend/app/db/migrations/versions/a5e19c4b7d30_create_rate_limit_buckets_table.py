@@ -0,0 +1,37 @@
+"""create rate limit buckets table
+Revision ID: a5e19c4b7d30
+Revises: f1d6b8e3a072
+Create Date: 2026-10-19 22:41:08.512904
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic
+revision = "a5e19c4b7d30"
+down_revision = "f1d6b8e3a072"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Token buckets shared by the workers when rate limits are kept in the database. They only matter for a few
+    # minutes, so PostgreSQL does not write them to the WAL, and loses them on a crash.
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    op.create_table(
+        "rate_limit_buckets",
+        sa.Column("key", sa.Text(), nullable=False),
+        sa.Column("tokens", sa.Float(), nullable=False),
+        sa.Column("rate", sa.Float(), nullable=False),
+        sa.Column("capacity", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+        prefixes=[] if sqlite else ["UNLOGGED"],
+    )
+    # Serves the purge of the buckets left idle
+    op.create_index("ix_rate_limit_buckets_updated_at", "rate_limit_buckets", ["updated_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_rate_limit_buckets_updated_at", table_name="rate_limit_buckets")
+    op.drop_table("rate_limit_buckets")
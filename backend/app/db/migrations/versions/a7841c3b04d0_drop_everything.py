@@ -16,6 +16,9 @@ depends_on = None
 
 
 def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     # ### commands auto generated by Alembic - please adjust! ###
     op.drop_index("ix_users_username", table_name="users")
     op.drop_table("users")
@@ -29,6 +32,9 @@ def upgrade() -> None:
 
 
 def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     # ### commands auto generated by Alembic - please adjust! ###
     op.create_table(
         "collaborators",
@@ -30,10 +30,16 @@ depends_on = None
 
 
 def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     op.add_column("experiments", sa.Column("coordinator_ip", IPAddressType))
     op.add_column("experiments", sa.Column("coordinator_port", sa.Integer))
 
 
 def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     op.drop_column("experiments", "coordinator_ip")
     op.drop_column("experiments", "coordinator_port")
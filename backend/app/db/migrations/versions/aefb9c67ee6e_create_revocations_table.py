@@ -0,0 +1,61 @@
+"""create revocations table
+Revision ID: aefb9c67ee6e
+Revises: 97659da4900e
+Create Date: 2026-10-18 09:12:41.530217
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.db.sqlite import updated_at_trigger
+
+
+# revision identifiers, used by Alembic
+revision = "aefb9c67ee6e"
+down_revision = "97659da4900e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Every revocation or lift takes a new value of this sequence, so that coordinators can fetch the changes
+    # that happened after the version they already hold
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    if not sqlite:
+        op.execute("CREATE SEQUENCE revocations_seq")
+    op.create_table(
+        "revocations",
+        sa.Column("experiment_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.Text(), nullable=False),
+        sa.Column("value", sa.Text(), nullable=False),
+        sa.Column("revoked", sa.Boolean(), server_default=sa.text("true"), nullable=False),
+        sa.Column(
+            "seq",
+            sa.BigInteger(),
+            server_default=sa.text("0" if sqlite else "nextval('revocations_seq')"),
+            nullable=False,
+        ),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(["experiment_id"], ["experiments.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("experiment_id", "kind", "value"),
+    )
+    op.create_index("ix_revocations_experiment_id_seq", "revocations", ["experiment_id", "seq"], unique=False)
+    if sqlite:
+        op.execute(updated_at_trigger("revocations"))
+    else:
+        op.execute(
+            """
+            CREATE TRIGGER update_revocations_modtime
+                BEFORE UPDATE
+                ON revocations
+                FOR EACH ROW
+            EXECUTE PROCEDURE update_updated_at_column();
+            """
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_revocations_experiment_id_seq", table_name="revocations")
+    op.drop_table("revocations")
+    if op.get_bind().dialect.name != "sqlite":
+        op.execute("DROP SEQUENCE revocations_seq")
@@ -29,12 +29,18 @@ depends_on = None
 
 
 def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     op.add_column("whitelist", sa.Column("peer_public_key", sa.Text))
     op.add_column("experiments", sa.Column("auth_server_public_key", sa.LargeBinary))
     op.add_column("experiments", sa.Column("auth_server_private_key", sa.LargeBinary))
 
 
 def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # a7841c3b04d0 drops all the tables of the revisions up to it, SQLite databases start from its empty schema
+        return
     op.drop_column("whitelist", "peer_public_key")
     op.drop_column("experiments", "auth_server_public_key")
     op.drop_column("experiments", "auth_server_private_key")
@@ -0,0 +1,60 @@
+"""create allowlist table
+Revision ID: c29f4d7a8e61
+Revises: 8b41e6f0c2d5
+Create Date: 2026-10-19 11:48:33.902517
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.db.sqlite import updated_at_trigger
+
+
+# revision identifiers, used by Alembic
+revision = "c29f4d7a8e61"
+down_revision = "8b41e6f0c2d5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Every addition to or removal from an allowlist takes a new value of this sequence, so that workers can fetch the
+    # changes that happened after the version of the allowlist they cache
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    if not sqlite:
+        op.execute("CREATE SEQUENCE allowlist_seq")
+    op.create_table(
+        "allowlist",
+        sa.Column("experiment_id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.Text(), nullable=False),
+        sa.Column("allowed", sa.Boolean(), server_default=sa.text("true"), nullable=False),
+        sa.Column(
+            "seq",
+            sa.BigInteger(),
+            server_default=sa.text("0" if sqlite else "nextval('allowlist_seq')"),
+            nullable=False,
+        ),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(["experiment_id"], ["experiments.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("experiment_id", "username"),
+    )
+    op.create_index("ix_allowlist_experiment_id_seq", "allowlist", ["experiment_id", "seq"], unique=False)
+    if sqlite:
+        op.execute(updated_at_trigger("allowlist"))
+    else:
+        op.execute(
+            """
+            CREATE TRIGGER update_allowlist_modtime
+                BEFORE UPDATE
+                ON allowlist
+                FOR EACH ROW
+            EXECUTE PROCEDURE update_updated_at_column();
+            """
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_allowlist_experiment_id_seq", table_name="allowlist")
+    op.drop_table("allowlist")
+    if op.get_bind().dialect.name != "sqlite":
+        op.execute("DROP SEQUENCE allowlist_seq")
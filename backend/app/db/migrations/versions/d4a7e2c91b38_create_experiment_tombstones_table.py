@@ -0,0 +1,96 @@
+"""create experiment tombstones table
+Revision ID: d4a7e2c91b38
+Revises: c29f4d7a8e61
+Create Date: 2026-10-19 14:05:12.480319
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic
+revision = "d4a7e2c91b38"
+down_revision = "c29f4d7a8e61"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # An experiment leaves a tombstone in an organization when it is deleted or moved to another one, so that clients
+    # syncing the experiments of the organization learn that it is gone
+    op.create_table(
+        "experiment_tombstones",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("experiment_id", sa.Integer(), nullable=False),
+        sa.Column("organization_name", sa.Text(), nullable=False),
+        sa.Column("model_name", sa.Text(), nullable=False),
+        sa.Column("deleted_at", sa.TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_experiment_tombstones_deleted_at_id", "experiment_tombstones", ["deleted_at", "id"], unique=False
+    )
+
+    if op.get_bind().dialect.name == "sqlite":
+        for trigger, event in (
+            ("record_experiments_deletion", "DELETE"),
+            ("record_experiments_move", "UPDATE OF organization_name"),
+        ):
+            op.execute(
+                f"""
+                CREATE TRIGGER {trigger}
+                    AFTER {event}
+                    ON experiments
+                    FOR EACH ROW
+                    {"WHEN OLD.organization_name <> NEW.organization_name" if event != "DELETE" else ""}
+                BEGIN
+                    INSERT INTO experiment_tombstones (experiment_id, organization_name, model_name)
+                    VALUES (OLD.id, OLD.organization_name, OLD.model_name);
+                END;
+                """
+            )
+        return
+
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION record_experiment_tombstone()
+            RETURNS TRIGGER AS
+        $$
+        BEGIN
+            INSERT INTO experiment_tombstones (experiment_id, organization_name, model_name)
+            VALUES (OLD.id, OLD.organization_name, OLD.model_name);
+            RETURN NULL;
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER record_experiments_deletion
+            AFTER DELETE
+            ON experiments
+            FOR EACH ROW
+        EXECUTE PROCEDURE record_experiment_tombstone();
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER record_experiments_move
+            AFTER UPDATE OF organization_name
+            ON experiments
+            FOR EACH ROW
+            WHEN (OLD.organization_name IS DISTINCT FROM NEW.organization_name)
+        EXECUTE PROCEDURE record_experiment_tombstone();
+        """
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TRIGGER record_experiments_move")
+        op.execute("DROP TRIGGER record_experiments_deletion")
+    else:
+        op.execute("DROP TRIGGER record_experiments_move ON experiments")
+        op.execute("DROP TRIGGER record_experiments_deletion ON experiments")
+        op.execute("DROP FUNCTION record_experiment_tombstone")
+    op.drop_index("ix_experiment_tombstones_deleted_at_id", table_name="experiment_tombstones")
+    op.drop_table("experiment_tombstones")
@@ -0,0 +1,51 @@
+"""add experiments search indexes
+Revision ID: e7c3f1a95d24
+Revises: d4a7e2c91b38
+Create Date: 2026-10-19 16:41:08.215930
+"""
+import logging
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic
+revision = "e7c3f1a95d24"
+down_revision = "d4a7e2c91b38"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.migration")
+
+SEARCHED_COLUMNS = ("model_name", "organization_name")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        # Without trigrams, searches only match prefixes, which these indexes serve case-insensitively
+        for column in SEARCHED_COLUMNS:
+            op.create_index(f"ix_experiments_lower_{column}", "experiments", [sa.text(f"lower({column})")])
+        return
+
+    # Trigram indexes serve substring and prefix matches of any case. pg_trgm ships with the contrib modules of
+    # PostgreSQL: without them, searches still work, filtered by organization first.
+    if not bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar():
+        logger.warning("pg_trgm is not available, experiments searches will not be served by trigram indexes")
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in SEARCHED_COLUMNS:
+        op.create_index(
+            f"ix_experiments_{column}_trgm",
+            "experiments",
+            [column],
+            postgresql_using="gin",
+            postgresql_ops={column: "gin_trgm_ops"},
+        )
+
+
+def downgrade() -> None:
+    index_name = "ix_experiments_lower_{}" if op.get_bind().dialect.name == "sqlite" else "ix_experiments_{}_trgm"
+    for column in SEARCHED_COLUMNS:
+        # The trigram indexes may not have been created
+        op.execute(f"DROP INDEX IF EXISTS {index_name.format(column)}")
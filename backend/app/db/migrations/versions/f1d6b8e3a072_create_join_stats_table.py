@@ -0,0 +1,36 @@
+"""create join stats table
+Revision ID: f1d6b8e3a072
+Revises: e7c3f1a95d24
+Create Date: 2026-10-19 19:27:44.061385
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic
+revision = "f1d6b8e3a072"
+down_revision = "e7c3f1a95d24"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Joins of each experiment per minute, counted by each worker separately so that each one overwrites its own rows
+    # with its running totals. peers holds the registers of a HyperLogLog of the peers that joined.
+    op.create_table(
+        "join_stats",
+        sa.Column("experiment_id", sa.Integer(), nullable=False),
+        sa.Column("minute", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("worker_id", sa.Text(), nullable=False),
+        sa.Column("joins", sa.BigInteger(), nullable=False),
+        sa.Column("peers", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(["experiment_id"], ["experiments.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("experiment_id", "minute", "worker_id"),
+    )
+    # Serves the purge of the rollups past retention
+    op.create_index("ix_join_stats_minute", "join_stats", ["minute"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_join_stats_minute", table_name="join_stats")
+    op.drop_table("join_stats")
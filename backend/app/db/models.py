@@ -1,6 +1,22 @@
 from typing import Tuple
 
-from sqlalchemy import TIMESTAMP, Column, Integer, LargeBinary, MetaData, Table, Text, UniqueConstraint, func
+from sqlalchemy import (
+    TIMESTAMP,
+    BigInteger,
+    Boolean,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    MetaData,
+    Sequence,
+    Table,
+    Text,
+    UniqueConstraint,
+    func,
+)
 from sqlalchemy_utils import IPAddressType
 
 
@@ -30,7 +46,7 @@ experiments_table = Table(
     "experiments",
     metadata,
     Column("id", Integer, primary_key=True),
-    Column("organization_name", Text, nullable=False, index=True),
+    Column("organization_name", Text, nullable=False),
     Column("model_name", Text, nullable=False, index=True),
     Column("creator", Text, nullable=False, index=True),
     Column("coordinator_ip", IPAddressType),
@@ -39,4 +55,90 @@ experiments_table = Table(
     Column("auth_server_private_key", LargeBinary),
     *timestamps(),
     UniqueConstraint("organization_name", "model_name", name="uix_1"),
+    Index("ix_experiments_updated_at_id", "updated_at", "id"),
+    # Created when pg_trgm is available
+    Index(
+        "ix_experiments_model_name_trgm",
+        "model_name",
+        postgresql_using="gin",
+        postgresql_ops={"model_name": "gin_trgm_ops"},
+    ),
+    Index(
+        "ix_experiments_organization_name_trgm",
+        "organization_name",
+        postgresql_using="gin",
+        postgresql_ops={"organization_name": "gin_trgm_ops"},
+    ),
+)
+
+experiment_tombstones_table = Table(
+    "experiment_tombstones",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("experiment_id", Integer, nullable=False),
+    Column("organization_name", Text, nullable=False),
+    Column("model_name", Text, nullable=False),
+    Column("deleted_at", TIMESTAMP(timezone=True), server_default=func.now(), nullable=False),
+    Index("ix_experiment_tombstones_deleted_at_id", "deleted_at", "id"),
+)
+
+
+revocations_seq = Sequence("revocations_seq", metadata=metadata)
+
+revocations_table = Table(
+    "revocations",
+    metadata,
+    Column("experiment_id", Integer, ForeignKey("experiments.id", ondelete="CASCADE"), primary_key=True),
+    Column("kind", Text, primary_key=True),
+    Column("value", Text, primary_key=True),
+    Column("revoked", Boolean, server_default="true", nullable=False),
+    Column("seq", BigInteger, revocations_seq, server_default=revocations_seq.next_value(), nullable=False),
+    *timestamps(),
+    Index("ix_revocations_experiment_id_seq", "experiment_id", "seq"),
+)
+
+allowlist_seq = Sequence("allowlist_seq", metadata=metadata)
+
+allowlist_table = Table(
+    "allowlist",
+    metadata,
+    Column("experiment_id", Integer, ForeignKey("experiments.id", ondelete="CASCADE"), primary_key=True),
+    Column("username", Text, primary_key=True),
+    Column("allowed", Boolean, server_default="true", nullable=False),
+    Column("seq", BigInteger, allowlist_seq, server_default=allowlist_seq.next_value(), nullable=False),
+    *timestamps(),
+    Index("ix_allowlist_experiment_id_seq", "experiment_id", "seq"),
+)
+
+join_history_table = Table(
+    "join_history",
+    metadata,
+    Column("experiment_id", Integer, nullable=False),
+    Column("username", Text, nullable=False),
+    Column("peer_key_digest", Text),
+    Column("joined_at", TIMESTAMP(timezone=True), server_default=func.now(), nullable=False),
+    Index("ix_join_history_experiment_id_joined_at", "experiment_id", "joined_at"),
+    postgresql_partition_by="RANGE (joined_at)",
+)
+
+join_stats_table = Table(
+    "join_stats",
+    metadata,
+    Column("experiment_id", Integer, ForeignKey("experiments.id", ondelete="CASCADE"), primary_key=True),
+    Column("minute", TIMESTAMP(timezone=True), primary_key=True),
+    Column("worker_id", Text, primary_key=True),
+    Column("joins", BigInteger, nullable=False),
+    Column("peers", LargeBinary, nullable=False),
+    Index("ix_join_stats_minute", "minute"),
+)
+
+rate_limit_buckets_table = Table(
+    "rate_limit_buckets",
+    metadata,
+    Column("key", Text, primary_key=True),
+    Column("tokens", Float, nullable=False),
+    Column("rate", Float, nullable=False),
+    Column("capacity", Float, nullable=False),
+    Column("updated_at", TIMESTAMP(timezone=True), nullable=False),
+    Index("ix_rate_limit_buckets_updated_at", "updated_at"),
 )
@@ -0,0 +1,91 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+import asyncpg
+from databases import Database
+
+from app.core.metrics import Histogram
+
+
+# Raised when the database goes away, for instance when it restarts or fails over
+DB_CONNECTION_ERRORS = (
+    asyncpg.PostgresConnectionError,
+    asyncpg.exceptions.OperatorInterventionError,
+    ConnectionError,
+)
+
+
+class InstrumentedPool:
+    """
+    Proxy of an asyncpg pool applying a timeout to connection acquisitions and recording how long they wait
+    """
+
+    def __init__(self, pool: Any, acquire_timeout: Optional[float]) -> None:
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.acquire_wait = Histogram()
+        self.waiters = 0
+        self.acquire_timeouts = 0
+
+    async def acquire(self, *, timeout: Optional[float] = None) -> Any:
+        self.waiters += 1
+        start = time.perf_counter()
+        try:
+            return await self._pool.acquire(timeout=self.acquire_timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self.acquire_timeouts += 1
+            raise
+        finally:
+            self.waiters -= 1
+            self.acquire_wait.observe(time.perf_counter() - start)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+    def stats(self) -> Dict[str, Any]:
+        size, idle = self._pool.get_size(), self._pool.get_idle_size()
+        return {
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiters": self.waiters,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait_seconds": self.acquire_wait.snapshot(),
+        }
+
+
+def instrument_pool(database: Database, acquire_timeout: Optional[float]) -> InstrumentedPool:
+    """Wrap the pool of a connected database, through which all its connections are acquired"""
+    backend = database._backend
+    if not isinstance(backend._pool, InstrumentedPool):
+        backend._pool = InstrumentedPool(backend._pool, acquire_timeout=acquire_timeout)
+    return backend._pool
+
+
+def get_pool(database: Database) -> Optional[InstrumentedPool]:
+    pool = getattr(database._backend, "_pool", None)
+    return pool if isinstance(pool, InstrumentedPool) else None
+
+
+async def expire_connections(database: Optional[Database]) -> None:
+    """Replace all the connections of the pool before they are used again, e.g. when the database has restarted"""
+    pool = get_pool(database) if database is not None else None
+    if pool is not None:
+        await pool.expire_connections()
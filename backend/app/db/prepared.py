@@ -0,0 +1,69 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from databases import Database
+
+from app.db.sqlite import is_sqlite
+
+
+# Named parameters of the repositories' queries, but not the `::type` casts of Postgres
+PARAMETER_PATTERN = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+@lru_cache(maxsize=None)
+def compile_query(query: str) -> Tuple[str, Tuple[str, ...]]:
+    """Translate a query with `:name` parameters to asyncpg's `$n` ones, and the names of the parameters in order"""
+    names: List[str] = []
+
+    def replace(match: "re.Match[str]") -> str:
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    return PARAMETER_PATTERN.sub(replace, query), tuple(names)
+
+
+async def fetch_one_prepared(db: Database, query: str, values: Dict[str, Any]) -> Optional[Any]:
+    """
+    Run a hot query directly on the asyncpg connection, which prepares it once per connection (unless its statement
+    cache is disabled), and return the asyncpg record. This skips building and compiling a SQLAlchemy statement and
+    wrapping the record on every call. Runs within the current transaction, if any, and is recorded in the query stats
+    of instrumented databases. On SQLite, this is a plain `fetch_one`.
+    """
+    if is_sqlite(db):
+        # sqlite3 caches the statements it prepares on its own
+        return await db.fetch_one(query=query, values=values)
+
+    sql, names = compile_query(query)
+    args = [values[name] for name in names]
+    query_stats = getattr(db, "query_stats", None)
+    start = time.perf_counter()
+    async with db.connection() as connection:
+        # Queries on a connection shared by concurrent tasks must not interleave
+        async with connection._query_lock:
+            try:
+                record = await connection.raw_connection.fetchrow(sql, *args)
+            except Exception:
+                if query_stats is not None:
+                    await query_stats.observe(db, query, values, time.perf_counter() - start, None, failed=True)
+                raise
+    if query_stats is not None:
+        await query_stats.observe(db, query, values, time.perf_counter() - start, 0 if record is None else 1)
+    return record
@@ -0,0 +1,127 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from databases import Database
+
+from app.db.pool import DB_CONNECTION_ERRORS
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Replay lag of a standby, counted as zero when it has replayed all it received (an idle primary does not advance the
+# replay timestamp) or when the database is not a standby at all
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag_seconds;
+"""
+
+
+class ReplicaRouter:
+    """
+    Pick the database serving reads: the replica while it is reachable and lags less than `max_lag` seconds behind,
+    the primary otherwise. After a write, this worker reads from the primary for `max_lag` seconds so that clients read
+    their own writes. Reads failing on the replica are retried on the primary. A replica that could not be connected to
+    is connected to on demand, at most once every `retry_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        primary: Database,
+        replica: Optional[Database],
+        max_lag: float,
+        check_interval: float,
+        connect_replica: Optional[Callable[[], Awaitable[Database]]] = None,
+        retry_interval: float = 1,
+    ) -> None:
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.connect_replica = connect_replica
+        self.retry_interval = retry_interval
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.checked_at = float("-inf")
+        self.primary_until = float("-inf")
+        self.connect_failed_at = float("-inf")
+        self._check_lock = asyncio.Lock()
+        self._connect_lock = asyncio.Lock()
+
+    def record_write(self) -> None:
+        self.primary_until = time.monotonic() + self.max_lag
+
+    async def connect(self) -> None:
+        """Connect to the replica unless connected already, or unless the last attempt failed too recently"""
+        if self.replica is not None or self.connect_replica is None:
+            return
+        if time.monotonic() - self.connect_failed_at < self.retry_interval or self._connect_lock.locked():
+            return
+        async with self._connect_lock:
+            try:
+                self.replica = await self.connect_replica()
+            except Exception as e:
+                logger.warning(f"Reading from the primary, could not connect to the replica: {e}")
+                self.connect_failed_at = time.monotonic()
+                return
+        # Measure the lag of the new replica before reading from it
+        self.checked_at = float("-inf")
+
+    async def check(self) -> None:
+        try:
+            self.lag = float(await self.replica.fetch_val(query=REPLICA_LAG_QUERY))
+            self.healthy = self.lag <= self.max_lag
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"Reading from the primary, the replica is unreachable: {e}")
+            self.lag = None
+            self.healthy = False
+        self.checked_at = time.monotonic()
+
+    async def read_db(self) -> Database:
+        now = time.monotonic()
+        if now < self.primary_until:
+            return self.primary
+        if self.replica is None:
+            await self.connect()
+            if self.replica is None:
+                return self.primary
+        # A single request per worker measures the lag, the others use the last measure meanwhile
+        if now - self.checked_at >= self.check_interval and not self._check_lock.locked():
+            async with self._check_lock:
+                await self.check()
+        return self.replica if self.healthy else self.primary
+
+    async def read(self, query: Callable[[Database], Awaitable[T]]) -> T:
+        """Run a read on the database serving reads, and again on the primary if the replica fails meanwhile"""
+        database = await self.read_db()
+        if database is self.primary:
+            return await query(database)
+        try:
+            return await query(database)
+        except (*DB_CONNECTION_ERRORS, OSError) as e:
+            # Until the next check finds it reachable again
+            logger.warning(f"Reading from the primary, the replica is unreachable: {e}")
+            self.lag = None
+            self.healthy = False
+            self.checked_at = time.monotonic()
+            return await query(self.primary)
@@ -0,0 +1,119 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from functools import partial
+from typing import AsyncIterable, List, Tuple
+
+from app.core.config import ALLOWLIST_CACHE_SIZE, ALLOWLIST_REFRESH_SECONDS
+from app.db.cache import IncrementalSetCache, SetChange, SetSnapshot
+from app.db.prepared import compile_query
+from app.db.repositories.base import BaseRepository
+from app.db.repositories.revocations import LOCK_EXPERIMENT_QUERY
+
+
+USERNAME = "username"
+
+CREATE_UPLOAD_TABLE_QUERY = """
+    CREATE TEMPORARY TABLE allowlist_upload (username TEXT)
+    ON COMMIT DROP;
+"""
+ALLOW_UPLOADED_USERNAMES_QUERY = """
+    INSERT INTO allowlist (experiment_id, username)
+    SELECT DISTINCT CAST(:experiment_id AS INTEGER), btrim(username)
+    FROM allowlist_upload
+    WHERE btrim(username) <> ''
+    ON CONFLICT (experiment_id, username) DO UPDATE
+    SET allowed = true,
+        seq     = nextval('allowlist_seq')
+    WHERE allowlist.allowed = false;
+"""
+DISALLOW_OTHER_USERNAMES_QUERY = """
+    UPDATE allowlist
+    SET allowed = false,
+        seq     = nextval('allowlist_seq')
+    WHERE experiment_id = :experiment_id
+    AND allowed
+    AND NOT EXISTS (
+        SELECT 1
+        FROM allowlist_upload
+        WHERE btrim(allowlist_upload.username) = allowlist.username
+    );
+"""
+LIST_ALLOWLIST_CHANGES_QUERY = """
+    SELECT username, allowed, seq
+    FROM allowlist
+    WHERE experiment_id = :experiment_id
+    AND seq > :since_version
+    ORDER BY seq;
+"""
+
+
+def affected_rows(status: str) -> int:
+    # Status of the form "INSERT 0 <rows>" or "UPDATE <rows>"
+    return int(status.split()[-1])
+
+
+class AllowlistRepository(BaseRepository):
+    """
+    All database actions associated with the allowlists of experiments
+    """
+
+    cache = IncrementalSetCache(maxsize=ALLOWLIST_CACHE_SIZE, refresh_interval=ALLOWLIST_REFRESH_SECONDS)
+
+    async def upload_allowlist(
+        self, *, experiment_id: int, usernames: AsyncIterable[bytes], replace: bool
+    ) -> Tuple[int, int]:
+        """
+        Add the usernames of a stream of lines to the allowlist, and remove the others from it if `replace`. The lines
+        are streamed to the database with COPY. Return how many usernames were added and removed.
+        """
+        self.require_postgresql("Allowlist uploads")
+        async with self.db.connection() as connection, connection.transaction():
+            raw_connection = connection.raw_connection
+            await raw_connection.execute(CREATE_UPLOAD_TABLE_QUERY)
+            await raw_connection.copy_to_table(
+                "allowlist_upload", source=usernames, columns=["username"], format="csv"
+            )
+            # Writers of the same experiment take turns, so that its sequence numbers are committed in increasing order.
+            # The lock is taken once the upload is received, so that slow clients don't block the other writers.
+            await raw_connection.execute(compile_query(LOCK_EXPERIMENT_QUERY)[0], experiment_id)
+            removed = 0
+            if replace:
+                removed = affected_rows(
+                    await raw_connection.execute(compile_query(DISALLOW_OTHER_USERNAMES_QUERY)[0], experiment_id)
+                )
+            added = affected_rows(
+                await raw_connection.execute(compile_query(ALLOW_UPLOADED_USERNAMES_QUERY)[0], experiment_id)
+            )
+        self.cache.invalidate(experiment_id)
+        return added, removed
+
+    async def list_allowlist_changes(self, *, experiment_id: int, since_version: int) -> List[SetChange]:
+        records = await self.db.fetch_all(
+            query=LIST_ALLOWLIST_CHANGES_QUERY,
+            values={"experiment_id": experiment_id, "since_version": since_version},
+        )
+        return [(USERNAME, record["username"], record["allowed"], record["seq"]) for record in records]
+
+    async def get_allowlist_snapshot(self, *, experiment_id: int, refresh: bool = False) -> SetSnapshot:
+        if refresh:
+            self.cache.invalidate(experiment_id)
+        return await self.cache.get(experiment_id, partial(self._fetch_changes, experiment_id))
+
+    async def _fetch_changes(self, experiment_id: int, since_version: int) -> List[SetChange]:
+        return await self.list_allowlist_changes(experiment_id=experiment_id, since_version=since_version)
+
+    async def is_allowed(self, *, experiment_id: int, username: str) -> bool:
+        snapshot = await self.get_allowlist_snapshot(experiment_id=experiment_id)
+        return snapshot.contains(USERNAME, username)
@@ -12,9 +12,38 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.#
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional, Union
+
 from databases import Database
+from fastapi import HTTPException
+from starlette.status import HTTP_501_NOT_IMPLEMENTED
+
+from app.db.replica import ReplicaRouter
+from app.db.sqlite import is_sqlite, sqlite_timestamp
 
 
 class BaseRepository:
-    def __init__(self, db: Database) -> None:
+    def __init__(self, db: Database, router: Optional[ReplicaRouter] = None) -> None:
         self.db = db
+        self.router = router
+
+    async def get_read_db(self) -> Database:
+        """Database serving reads that may lag slightly behind the writes of other workers"""
+        return await self.router.read_db() if self.router is not None else self.db
+
+    async def read(self, query: Callable[[Database], Awaitable[Any]]) -> Any:
+        """Run a read that may lag slightly behind the writes of other workers, retried on the primary if need be"""
+        return await self.router.read(query) if self.router is not None else await query(self.db)
+
+    def require_postgresql(self, feature: str) -> None:
+        if is_sqlite(self.db):
+            raise HTTPException(status_code=HTTP_501_NOT_IMPLEMENTED, detail=f"{feature} require PostgreSQL.")
+
+    def timestamp(self, value: datetime) -> Union[datetime, str]:
+        """Timestamp to bind in a query, as text on SQLite"""
+        return sqlite_timestamp(value) if is_sqlite(self.db) else value
+
+    def record_write(self) -> None:
+        if self.router is not None:
+            self.router.record_write()
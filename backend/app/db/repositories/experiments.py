@@ -12,54 +12,301 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.#
+import json
+import logging
+from datetime import datetime, timezone
 from ipaddress import IPv4Address, IPv6Address
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple, Type
 
+from databases import Database
 from fastapi import HTTPException
-from starlette.status import HTTP_400_BAD_REQUEST
+from starlette.status import HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED
 
+from app.api.dependencies.crypto import load_private_key
+from app.core.config import (
+    EXPERIMENT_CACHE_NEGATIVE_TTL_SECONDS,
+    EXPERIMENT_CACHE_SIZE,
+    EXPERIMENT_CACHE_TTL_SECONDS,
+    SIGNING_KEY_CACHE_SIZE,
+    SIGNING_KEY_CACHE_TTL_SECONDS,
+)
+from app.db.cache import ExperimentCache, SigningKeyCache
+from app.db.prepared import fetch_one_prepared
 from app.db.repositories.base import BaseRepository
-from app.models.experiment import ExperimentCreate, ExperimentInDB, ExperimentUpdate
+from app.db.sqlite import is_sqlite
+from app.models.core import CoreModel
+from app.models.experiment import (
+    CoordinatorMove,
+    ExperimentCoordinator,
+    ExperimentCreate,
+    ExperimentJoinView,
+    ExperimentPublic,
+    ExperimentSigningKey,
+    ExperimentTombstone,
+    ExperimentUpdate,
+)
 from app.services.authentication import MoonlandingUser
 
 
-COLUMNS = "id, organization_name, model_name, creator, coordinator_ip, coordinator_port, auth_server_public_key, auth_server_private_key, created_at, updated_at"
+logger = logging.getLogger(__name__)
+
+# Reads select one of three projections of an experiment: the public view answers GET, list and update requests,
+# the join view adds the public key needed to answer joins, and the signing view with the private key is only
+# read when signing a pass. Only the private key decrypted from it is cached, apart from the other two views.
 CREATE_EXPERIMENT_QUERY = """
     INSERT INTO experiments (organization_name, model_name, creator, coordinator_ip, coordinator_port, auth_server_public_key, auth_server_private_key)
     VALUES (:organization_name, :model_name, :creator, :coordinator_ip, :coordinator_port, :auth_server_public_key, :auth_server_private_key)
-    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, auth_server_public_key, auth_server_private_key, created_at, updated_at;
+    ON CONFLICT (organization_name, model_name) DO NOTHING
+    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at;
 """
 GET_EXPERIMENT_BY_ID_QUERY = """
-    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, auth_server_public_key, auth_server_private_key, created_at, updated_at
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at
     FROM experiments
     WHERE id = :id;
 """
 GET_EXPERIMENT_BY_ORGANIZATON_AND_MODEL_NAME_QUERY = """
-    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, auth_server_public_key, auth_server_private_key, created_at, updated_at
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at
     FROM experiments
     WHERE model_name = :model_name
     AND organization_name = :organization_name;
 """
-LIST_ALL_USER_EXPERIMENTS_QUERY = """
-    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, auth_server_public_key, auth_server_private_key, created_at, updated_at
+GET_EXPERIMENT_JOIN_VIEW_BY_ID_QUERY = """
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, auth_server_public_key, created_at, updated_at
+    FROM experiments
+    WHERE id = :id;
+"""
+GET_EXPERIMENT_JOIN_VIEW_BY_ORGANIZATON_AND_MODEL_NAME_QUERY = """
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, auth_server_public_key, created_at, updated_at
+    FROM experiments
+    WHERE model_name = :model_name
+    AND organization_name = :organization_name;
+"""
+LIST_EXPERIMENT_PUBLIC_KEYS_BY_ORGANIZATION_QUERY = """
+    SELECT id, auth_server_public_key
+    FROM experiments
+    WHERE organization_name = :organization_name
+    AND auth_server_public_key IS NOT NULL
+    ORDER BY id;
+"""
+GET_EXPERIMENT_SIGNING_KEY_BY_ID_QUERY = """
+    SELECT id, auth_server_public_key, auth_server_private_key
+    FROM experiments
+    WHERE id = :id;
+"""
+LIST_EXPERIMENTS_BY_ORGANIZATIONS_QUERY = """
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at
     FROM experiments
-    WHERE creator = :creator;
+    WHERE organization_name = ANY(:organization_names)
+    AND (organization_name, model_name, id) > (:after_organization_name, :after_model_name, :after_id)
+    ORDER BY organization_name, model_name, id
+    LIMIT :limit;
 """
+# SQLite has no arrays, the organization names are passed to it as a JSON array
+SQLITE_LIST_EXPERIMENTS_BY_ORGANIZATIONS_QUERY = """
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at
+    FROM experiments
+    WHERE organization_name IN (SELECT value FROM json_each(:organization_names))
+    AND (organization_name, model_name, id) > (:after_organization_name, :after_model_name, :after_id)
+    ORDER BY organization_name, model_name, id
+    LIMIT :limit;
+"""
+# Experiments of the organizations whose model or organization name contains the searched text, ranked by how well
+# their model name matches it: exactly, by prefix, anywhere, or not at all, then sorted by name. The trigram indexes
+# serve the case-insensitive pattern matches.
+SEARCH_EXPERIMENTS_QUERY = """
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at, rank
+    FROM (
+        SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at,
+            CASE
+                WHEN lower(model_name) = :query THEN 0
+                WHEN model_name ILIKE :prefix THEN 1
+                WHEN model_name ILIKE :contains THEN 2
+                ELSE 3
+            END AS rank
+        FROM experiments
+        WHERE organization_name = ANY(:organization_names)
+        AND (model_name ILIKE :contains OR organization_name ILIKE :contains)
+    ) AS matches
+    WHERE (rank, model_name, organization_name, id) > (:after_rank, :after_model_name, :after_organization_name, :after_id)
+    ORDER BY rank, model_name, organization_name, id
+    LIMIT :limit;
+"""
+# SQLite only matches prefixes, as a range of the lowercase names served by indexes on them. It binds each occurrence
+# of a parameter separately, which the params CTE avoids.
+SQLITE_SEARCH_EXPERIMENTS_QUERY = """
+    WITH params AS (SELECT :query AS query, :query_end AS query_end),
+    organizations AS (SELECT value AS name FROM json_each(:organization_names))
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at, rank
+    FROM (
+        SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at,
+            CASE
+                WHEN lower(model_name) = query THEN 0
+                WHEN lower(model_name) >= query AND lower(model_name) < query_end THEN 1
+                ELSE 3
+            END AS rank
+        FROM experiments, params
+        WHERE organization_name IN (SELECT name FROM organizations)
+        AND (
+            (lower(model_name) >= query AND lower(model_name) < query_end)
+            OR (lower(organization_name) >= query AND lower(organization_name) < query_end)
+        )
+    ) AS matches
+    WHERE (rank, model_name, organization_name, id) > (:after_rank, :after_model_name, :after_organization_name, :after_id)
+    ORDER BY rank, model_name, organization_name, id
+    LIMIT :limit;
+"""
+# Also sets updated_at, which the trigger of PostgreSQL would, because the triggers of SQLite run after RETURNING
+# Unless `check_updated_at` is false, only updates the experiment if it was last updated at one of `updated_ats`
 UPDATE_EXPERIMENT_BY_ID_QUERY = """
     UPDATE experiments
-    SET organization_name = :organization_name,
-        model_name        = :model_name,
-        coordinator_ip    = :coordinator_ip,
-        coordinator_port  = :coordinator_port,
-        creator           = :creator
+    SET organization_name = CASE WHEN :set_organization_name THEN :organization_name ELSE organization_name END,
+        model_name        = CASE WHEN :set_model_name THEN :model_name ELSE model_name END,
+        coordinator_ip    = CASE WHEN :set_coordinator_ip THEN :coordinator_ip ELSE coordinator_ip END,
+        coordinator_port  = CASE WHEN :set_coordinator_port THEN :coordinator_port ELSE coordinator_port END,
+        updated_at        = :updated_at
+    WHERE id = :id
+    AND (NOT :check_updated_at OR updated_at = ANY(CAST(:updated_ats AS TIMESTAMPTZ[])))
+    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at;
+"""
+SQLITE_UPDATE_EXPERIMENT_BY_ID_QUERY = """
+    UPDATE experiments
+    SET organization_name = CASE WHEN :set_organization_name THEN :organization_name ELSE organization_name END,
+        model_name        = CASE WHEN :set_model_name THEN :model_name ELSE model_name END,
+        coordinator_ip    = CASE WHEN :set_coordinator_ip THEN :coordinator_ip ELSE coordinator_ip END,
+        coordinator_port  = CASE WHEN :set_coordinator_port THEN :coordinator_port ELSE coordinator_port END,
+        updated_at        = :updated_at
     WHERE id = :id
-    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, auth_server_public_key, auth_server_private_key, created_at, updated_at;
+    AND (NOT :check_updated_at OR updated_at IN (SELECT value FROM json_each(:updated_ats)))
+    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at;
+"""
+# New coordinators of several experiments, each one given by the same position in the arrays, applied to those of
+# the organizations only
+UPDATE_COORDINATORS_QUERY = """
+    UPDATE experiments
+    SET coordinator_ip   = coordinators.coordinator_ip,
+        coordinator_port = coordinators.coordinator_port,
+        updated_at       = :updated_at
+    FROM unnest(
+        CAST(:ids AS INTEGER[]), CAST(:coordinator_ips AS TEXT[]), CAST(:coordinator_ports AS INTEGER[])
+    ) AS coordinators (id, coordinator_ip, coordinator_port)
+    WHERE experiments.id = coordinators.id
+    AND experiments.organization_name = ANY(:organization_names)
+    RETURNING experiments.id, experiments.organization_name, experiments.model_name, experiments.creator,
+        experiments.coordinator_ip, experiments.coordinator_port, experiments.created_at, experiments.updated_at;
+"""
+# The coordinators are passed to SQLite as a JSON array of [id, coordinator_ip, coordinator_port] arrays
+SQLITE_UPDATE_COORDINATORS_QUERY = """
+    UPDATE experiments
+    SET coordinator_ip   = coordinators.coordinator_ip,
+        coordinator_port = coordinators.coordinator_port,
+        updated_at       = :updated_at
+    FROM (
+        SELECT json_extract(value, '$[0]') AS id,
+            json_extract(value, '$[1]') AS coordinator_ip,
+            json_extract(value, '$[2]') AS coordinator_port
+        FROM json_each(:coordinators)
+    ) AS coordinators
+    WHERE experiments.id = coordinators.id
+    AND experiments.organization_name IN (SELECT value FROM json_each(:organization_names))
+    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at;
+"""
+MOVE_COORDINATOR_QUERY = """
+    UPDATE experiments
+    SET coordinator_ip   = :new_coordinator_ip,
+        coordinator_port = :new_coordinator_port,
+        updated_at       = :updated_at
+    WHERE organization_name = ANY(:organization_names)
+    AND coordinator_ip = :coordinator_ip
+    AND coordinator_port = :coordinator_port
+    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at;
+"""
+SQLITE_MOVE_COORDINATOR_QUERY = """
+    UPDATE experiments
+    SET coordinator_ip   = :new_coordinator_ip,
+        coordinator_port = :new_coordinator_port,
+        updated_at       = :updated_at
+    WHERE organization_name IN (SELECT value FROM json_each(:organization_names))
+    AND coordinator_ip = :coordinator_ip
+    AND coordinator_port = :coordinator_port
+    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at;
 """
 DELETE_EXPERIMENT_BY_ID_QUERY = """
     DELETE FROM experiments
     WHERE id = :id
-    RETURNING id;
+    AND (NOT :check_updated_at OR updated_at = ANY(CAST(:updated_ats AS TIMESTAMPTZ[])))
+    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at;
+"""
+SQLITE_DELETE_EXPERIMENT_BY_ID_QUERY = """
+    DELETE FROM experiments
+    WHERE id = :id
+    AND (NOT :check_updated_at OR updated_at IN (SELECT value FROM json_each(:updated_ats)))
+    RETURNING id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at;
+"""
+# Experiments changed, and gone from the organizations, since a position in the order of updated_at (or deleted_at)
+# and id, which the indexes on these columns serve. A tombstone is left out while the experiment is back in one of the
+# organizations, under which it is listed as changed.
+LIST_EXPERIMENT_CHANGES_QUERY = """
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at
+    FROM experiments
+    WHERE organization_name = ANY(:organization_names)
+    AND (updated_at, id) > (:after_updated_at, :after_id)
+    AND updated_at < :until
+    ORDER BY updated_at, id
+    LIMIT :limit;
+"""
+SQLITE_LIST_EXPERIMENT_CHANGES_QUERY = """
+    SELECT id, organization_name, model_name, creator, coordinator_ip, coordinator_port, created_at, updated_at
+    FROM experiments
+    WHERE organization_name IN (SELECT value FROM json_each(:organization_names))
+    AND (updated_at, id) > (:after_updated_at, :after_id)
+    AND updated_at < :until
+    ORDER BY updated_at, id
+    LIMIT :limit;
+"""
+LIST_EXPERIMENT_TOMBSTONES_QUERY = """
+    SELECT id AS tombstone_id, experiment_id AS id, organization_name, model_name, deleted_at
+    FROM experiment_tombstones
+    WHERE organization_name = ANY(:organization_names)
+    AND (deleted_at, id) > (:after_deleted_at, :after_id)
+    AND deleted_at < :until
+    AND NOT EXISTS (
+        SELECT 1
+        FROM experiments
+        WHERE experiments.id = experiment_tombstones.experiment_id
+        AND experiments.organization_name = ANY(:organization_names)
+    )
+    ORDER BY deleted_at, id
+    LIMIT :limit;
 """
+SQLITE_LIST_EXPERIMENT_TOMBSTONES_QUERY = """
+    WITH organizations AS (SELECT value AS name FROM json_each(:organization_names))
+    SELECT id AS tombstone_id, experiment_id AS id, organization_name, model_name, deleted_at
+    FROM experiment_tombstones
+    WHERE organization_name IN (SELECT name FROM organizations)
+    AND (deleted_at, id) > (:after_deleted_at, :after_id)
+    AND deleted_at < :until
+    AND NOT EXISTS (
+        SELECT 1
+        FROM experiments
+        WHERE experiments.id = experiment_tombstones.experiment_id
+        AND experiments.organization_name IN (SELECT name FROM organizations)
+    )
+    ORDER BY deleted_at, id
+    LIMIT :limit;
+"""
+PURGE_EXPERIMENT_TOMBSTONES_QUERY = """
+    DELETE FROM experiment_tombstones
+    WHERE deleted_at < :before;
+"""
+UPDATABLE_COLUMNS = ("organization_name", "model_name", "coordinator_ip", "coordinator_port")
+
+PUBLIC_VIEW = "public"
+JOIN_VIEW = "join"
+
+
+def escape_like(value: str) -> str:
+    """Escape the wildcards of LIKE patterns, with the default escape character of PostgreSQL"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
 class ExperimentsRepository(BaseRepository):
@@ -67,9 +314,19 @@ class ExperimentsRepository(BaseRepository):
     All database actions associated with the Experiment resource
     """
 
+    cache = ExperimentCache(
+        maxsize=EXPERIMENT_CACHE_SIZE,
+        ttl=EXPERIMENT_CACHE_TTL_SECONDS,
+        negative_ttl=EXPERIMENT_CACHE_NEGATIVE_TTL_SECONDS,
+        views=(PUBLIC_VIEW, JOIN_VIEW),
+    )
+    # key id -> decrypted private key. Decrypting and parsing a private key costs far more than signing with it.
+    signing_keys = SigningKeyCache(maxsize=SIGNING_KEY_CACHE_SIZE, ttl=SIGNING_KEY_CACHE_TTL_SECONDS)
+
     async def create_experiment(
         self, *, new_experiment: ExperimentCreate, requesting_user: MoonlandingUser
-    ) -> ExperimentInDB:
+    ) -> Optional[ExperimentPublic]:
+        """Insert the experiment unless one already exists for its organization and model, in which case return None"""
         new_experiment_table = {**new_experiment.dict(), "creator": requesting_user.username}
         if "coordinator_ip" in new_experiment_table.keys() and (
             isinstance(new_experiment_table["coordinator_ip"], IPv4Address)
@@ -78,62 +335,339 @@ class ExperimentsRepository(BaseRepository):
             new_experiment_table["coordinator_ip"] = str(new_experiment_table["coordinator_ip"])
 
         experiment = await self.db.fetch_one(query=CREATE_EXPERIMENT_QUERY, values=new_experiment_table)
-        return ExperimentInDB(**experiment)
+        self.record_write()
+        if not experiment:
+            return None
+
+        experiment = ExperimentPublic(**experiment)
+        # Forget that this experiment did not exist
+        self.cache.invalidate(
+            id=experiment.id, organization_name=experiment.organization_name, model_name=experiment.model_name
+        )
+        return experiment
+
+    async def _get_cached_experiment(self, key, query: str, values: dict, model: Type[CoreModel]):
+        cached, experiment = self.cache.get(key)
+        if cached:
+            return experiment
+
+        generation = self.cache.generation
+        experiment = await self.read(lambda db: fetch_one_prepared(db, query, values))
+        experiment = model(**experiment) if experiment else None
+        self.cache.set(key, experiment, generation)
+        return experiment
 
     async def get_experiment_by_organization_and_model_name(
         self, *, organization_name: str, model_name: str
-    ) -> ExperimentInDB:
-        experiment = await self.db.fetch_one(
-            query=GET_EXPERIMENT_BY_ORGANIZATON_AND_MODEL_NAME_QUERY,
-            values={"organization_name": organization_name, "model_name": model_name},
+    ) -> Optional[ExperimentPublic]:
+        return await self._get_cached_experiment(
+            self.cache.name_key(PUBLIC_VIEW, organization_name, model_name),
+            GET_EXPERIMENT_BY_ORGANIZATON_AND_MODEL_NAME_QUERY,
+            {"organization_name": organization_name, "model_name": model_name},
+            ExperimentPublic,
         )
-        if not experiment:
-            return None
 
-        return ExperimentInDB(**experiment)
+    async def get_experiment_by_id(self, *, id: int) -> Optional[ExperimentPublic]:
+        return await self._get_cached_experiment(
+            self.cache.id_key(PUBLIC_VIEW, id), GET_EXPERIMENT_BY_ID_QUERY, {"id": id}, ExperimentPublic
+        )
 
-    async def get_experiment_by_id(self, *, id: int) -> ExperimentInDB:
-        experiment = await self.db.fetch_one(query=GET_EXPERIMENT_BY_ID_QUERY, values={"id": id})
-        if not experiment:
-            return None
+    async def get_experiment_join_view_by_organization_and_model_name(
+        self, *, organization_name: str, model_name: str
+    ) -> Optional[ExperimentJoinView]:
+        return await self._get_cached_experiment(
+            self.cache.name_key(JOIN_VIEW, organization_name, model_name),
+            GET_EXPERIMENT_JOIN_VIEW_BY_ORGANIZATON_AND_MODEL_NAME_QUERY,
+            {"organization_name": organization_name, "model_name": model_name},
+            ExperimentJoinView,
+        )
 
-        return ExperimentInDB(**experiment)
+    async def get_experiment_join_view_by_id(self, *, id: int) -> Optional[ExperimentJoinView]:
+        return await self._get_cached_experiment(
+            self.cache.id_key(JOIN_VIEW, id), GET_EXPERIMENT_JOIN_VIEW_BY_ID_QUERY, {"id": id}, ExperimentJoinView
+        )
+
+    async def get_experiment_private_key(self, *, experiment: ExperimentJoinView) -> Optional[Any]:
+        """
+        Private key matching the public key of the join view. Return None if the experiment no longer has this key
+        pair, in which case the join view was stale.
+        """
+        private_key = self.signing_keys.get(experiment.key_id)
+        if private_key is not None:
+            return private_key
 
-    async def list_all_user_experiments(self, requesting_user: MoonlandingUser) -> List[ExperimentInDB]:
-        experiment_records = await self.db.fetch_all(
-            query=LIST_ALL_USER_EXPERIMENTS_QUERY, values={"creator": requesting_user.username}
+        signing_key = await self.read(
+            lambda db: fetch_one_prepared(db, GET_EXPERIMENT_SIGNING_KEY_BY_ID_QUERY, {"id": experiment.id})
         )
-        return [ExperimentInDB(**exp) for exp in experiment_records]
+        if not signing_key:
+            self.cache.invalidate(id=experiment.id)
+            return None
 
-    async def update_experiment_by_id(self, *, id_exp: int, experiment_update: ExperimentUpdate) -> ExperimentInDB:
-        experiment = await self.get_experiment_by_id(id=id_exp)
-        if not experiment:
+        signing_key = ExperimentSigningKey(**signing_key)
+        if signing_key.key_id != experiment.key_id:
+            self.cache.invalidate(id=experiment.id)
             return None
-        experiment_update_params = experiment.copy(update=experiment_update.dict(exclude_unset=True))
-        values = {
-            **experiment_update_params.dict(
-                exclude={
-                    "auth_server_public_key",
-                    "auth_server_private_key",
-                    "created_at",
-                    "updated_at",
-                }
+
+        private_key = load_private_key(signing_key.auth_server_private_key)
+        self.signing_keys.set(signing_key.key_id, experiment.id, private_key)
+        return private_key
+
+    async def list_experiment_public_keys(self, *, organization_name: str) -> List[Tuple[int, bytes]]:
+        """Ids and public keys of the experiments of an organization"""
+        records = await self.read(
+            lambda db: db.fetch_all(
+                query=LIST_EXPERIMENT_PUBLIC_KEYS_BY_ORGANIZATION_QUERY,
+                values={"organization_name": organization_name},
             )
+        )
+        return [(record["id"], bytes(record["auth_server_public_key"])) for record in records]
+
+    async def list_experiments_by_organizations(
+        self, *, organization_names: List[str], after: Optional[Tuple[str, str, int]] = None, limit: int
+    ) -> List[ExperimentPublic]:
+        """
+        Experiments of the organizations sorted by (organization_name, model_name, id), starting right after the
+        `after` sort key
+        """
+        after_organization_name, after_model_name, after_id = after or ("", "", 0)
+        query, organization_names = self._by_organizations(
+            self.db,
+            LIST_EXPERIMENTS_BY_ORGANIZATIONS_QUERY,
+            SQLITE_LIST_EXPERIMENTS_BY_ORGANIZATIONS_QUERY,
+            organization_names,
+        )
+        values = {
+            "organization_names": organization_names,
+            "after_organization_name": after_organization_name,
+            "after_model_name": after_model_name,
+            "after_id": after_id,
+            "limit": limit,
         }
-        if "coordinator_ip" in values.keys() and (
-            isinstance(values["coordinator_ip"], IPv4Address) or isinstance(values["coordinator_ip"], IPv6Address)
-        ):
+        experiment_records = await self.read(lambda db: db.fetch_all(query=query, values=values))
+        return [ExperimentPublic(**exp) for exp in experiment_records]
+
+    async def search_experiments(
+        self,
+        *,
+        organization_names: List[str],
+        query: str,
+        after: Optional[Tuple[int, str, str, int]] = None,
+        limit: int,
+    ) -> List[Tuple[int, ExperimentPublic]]:
+        """
+        Experiments of the organizations matching the searched text, with their rank, sorted by (rank, model_name,
+        organization_name, id) starting right after the `after` sort key
+        """
+        after_rank, after_model_name, after_organization_name, after_id = after or (-1, "", "", 0)
+        query = query.lower()
+        sql, organization_names = self._by_organizations(
+            self.db, SEARCH_EXPERIMENTS_QUERY, SQLITE_SEARCH_EXPERIMENTS_QUERY, organization_names
+        )
+        values = {
+            "organization_names": organization_names,
+            "query": query,
+            "after_rank": after_rank,
+            "after_model_name": after_model_name,
+            "after_organization_name": after_organization_name,
+            "after_id": after_id,
+            "limit": limit,
+        }
+        if is_sqlite(self.db):
+            # The smallest string greater than every string starting with the query
+            values["query_end"] = query[:-1] + chr(ord(query[-1]) + 1)
+        else:
+            values["prefix"] = escape_like(query) + "%"
+            values["contains"] = "%" + escape_like(query) + "%"
+        records = await self.read(lambda db: db.fetch_all(query=sql, values=values))
+        return [(record["rank"], ExperimentPublic(**record)) for record in records]
+
+    @staticmethod
+    def _by_organizations(
+        db: Database, query: str, sqlite_query: str, organization_names: List[str]
+    ) -> Tuple[str, Any]:
+        """The query filtering on a list of organizations for the dialect of `db`, and the list to bind"""
+        if is_sqlite(db):
+            return sqlite_query, json.dumps(organization_names)
+        return query, organization_names
+
+    async def list_experiment_changes(
+        self, *, organization_names: List[str], after: Tuple[datetime, int], until: datetime, limit: int
+    ) -> List[ExperimentPublic]:
+        """
+        Experiments of the organizations updated before `until`, in the order of (updated_at, id) starting right after
+        `after`. Read from the primary, as a replica could still miss changes made before `until`.
+        """
+        query, organization_names = self._by_organizations(
+            self.db, LIST_EXPERIMENT_CHANGES_QUERY, SQLITE_LIST_EXPERIMENT_CHANGES_QUERY, organization_names
+        )
+        records = await self.db.fetch_all(
+            query=query,
+            values={
+                "organization_names": organization_names,
+                "after_updated_at": self.timestamp(after[0]),
+                "after_id": after[1],
+                "until": self.timestamp(until),
+                "limit": limit,
+            },
+        )
+        return [ExperimentPublic(**record) for record in records]
+
+    async def list_experiment_tombstones(
+        self, *, organization_names: List[str], after: Tuple[datetime, int], until: datetime, limit: int
+    ) -> List[Tuple[int, ExperimentTombstone]]:
+        """
+        Experiments gone from the organizations before `until`, with the ids of their tombstones, in the order of
+        (deleted_at, tombstone id) starting right after `after`
+        """
+        query, organization_names = self._by_organizations(
+            self.db, LIST_EXPERIMENT_TOMBSTONES_QUERY, SQLITE_LIST_EXPERIMENT_TOMBSTONES_QUERY, organization_names
+        )
+        records = await self.db.fetch_all(
+            query=query,
+            values={
+                "organization_names": organization_names,
+                "after_deleted_at": self.timestamp(after[0]),
+                "after_id": after[1],
+                "until": self.timestamp(until),
+                "limit": limit,
+            },
+        )
+        return [(record["tombstone_id"], ExperimentTombstone(**record)) for record in records]
+
+    def _if_updated_at(
+        self, query: str, sqlite_query: str, updated_ats: Optional[List[datetime]]
+    ) -> Tuple[str, Dict[str, Any]]:
+        """The query for the dialect, and the values restricting it to the experiment last updated at `updated_ats`"""
+        if updated_ats is None:
+            updated_ats = []
+            check_updated_at = False
+        else:
+            check_updated_at = True
+        if is_sqlite(self.db):
+            return sqlite_query, {
+                "check_updated_at": check_updated_at,
+                "updated_ats": json.dumps([self.timestamp(updated_at) for updated_at in updated_ats]),
+            }
+        return query, {"check_updated_at": check_updated_at, "updated_ats": updated_ats}
+
+    async def update_experiment_by_id(
+        self, *, id_exp: int, experiment_update: ExperimentUpdate, if_updated_at: Optional[List[datetime]] = None
+    ) -> Optional[ExperimentPublic]:
+        """
+        Apply the fields set in `experiment_update`, leaving the others untouched. With `if_updated_at`, only update
+        the experiment if it was last updated at one of these times, and return None otherwise.
+        """
+        update_params = experiment_update.dict(exclude_unset=True)
+        query, values = self._if_updated_at(
+            UPDATE_EXPERIMENT_BY_ID_QUERY, SQLITE_UPDATE_EXPERIMENT_BY_ID_QUERY, if_updated_at
+        )
+        values.update({"id": id_exp, "updated_at": self.timestamp(datetime.now(timezone.utc))})
+        for column in UPDATABLE_COLUMNS:
+            values[f"set_{column}"] = column in update_params
+            values[column] = update_params.get(column)
+        if isinstance(values["coordinator_ip"], IPv4Address) or isinstance(values["coordinator_ip"], IPv6Address):
             values["coordinator_ip"] = str(values["coordinator_ip"])
         try:
-            updated_experiment = await self.db.fetch_one(query=UPDATE_EXPERIMENT_BY_ID_QUERY, values=values)
-        except Exception as e:
-            print(e)
+            updated_experiment = await self.db.fetch_one(query=query, values=values)
+        except Exception:
+            logger.exception("Failed to update experiment %s", id_exp)
             raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Invalid update params.")
-        return ExperimentInDB(**updated_experiment)
+        finally:
+            self.record_write()
+            self.cache.invalidate(id=id_exp)
+        if not updated_experiment:
+            return None
 
-    async def delete_experiment_by_id(self, *, id: int) -> int:
-        experiment = await self.get_experiment_by_id(id=id)
-        if not experiment:
+        updated_experiment = ExperimentPublic(**updated_experiment)
+        # Forget that an experiment did not exist under the new names
+        self.cache.invalidate(
+            organization_name=updated_experiment.organization_name, model_name=updated_experiment.model_name
+        )
+        return updated_experiment
+
+    async def update_coordinators(
+        self, *, coordinators: List[ExperimentCoordinator], organization_names: List[str]
+    ) -> List[ExperimentPublic]:
+        """
+        Set the coordinators of several experiments in a single statement. Unless all of them are experiments of the
+        organizations, none is updated.
+        """
+        query, organization_names = self._by_organizations(
+            self.db, UPDATE_COORDINATORS_QUERY, SQLITE_UPDATE_COORDINATORS_QUERY, organization_names
+        )
+        entries = [
+            (
+                coordinator.id,
+                str(coordinator.coordinator_ip) if coordinator.coordinator_ip else None,
+                coordinator.coordinator_port,
+            )
+            for coordinator in coordinators
+        ]
+        values = {"organization_names": organization_names, "updated_at": self.timestamp(datetime.now(timezone.utc))}
+        if is_sqlite(self.db):
+            values["coordinators"] = json.dumps(entries)
+        else:
+            values["ids"], values["coordinator_ips"], values["coordinator_ports"] = (
+                list(column) for column in zip(*entries)
+            )
+
+        try:
+            async with self.db.transaction():
+                records = await self.db.fetch_all(query=query, values=values)
+                missing = sorted(
+                    {coordinator.id for coordinator in coordinators} - {record["id"] for record in records}
+                )
+                if missing:
+                    raise HTTPException(
+                        status_code=HTTP_401_UNAUTHORIZED,
+                        detail=f"You need to be an admin of the organizations of the experiments {missing} to update their coordinators",
+                    )
+        finally:
+            self.record_write()
+            self.cache.invalidate_ids(id for id, _, _ in entries)
+        return [ExperimentPublic(**record) for record in records]
+
+    async def move_coordinator(
+        self, *, move: CoordinatorMove, organization_names: List[str]
+    ) -> List[ExperimentPublic]:
+        """Move all the experiments of the organizations from a coordinator to another one"""
+        query, organization_names = self._by_organizations(
+            self.db, MOVE_COORDINATOR_QUERY, SQLITE_MOVE_COORDINATOR_QUERY, organization_names
+        )
+        records = await self.db.fetch_all(
+            query=query,
+            values={
+                "organization_names": organization_names,
+                "coordinator_ip": str(move.coordinator_ip),
+                "coordinator_port": move.coordinator_port,
+                "new_coordinator_ip": str(move.new_coordinator_ip),
+                "new_coordinator_port": move.new_coordinator_port,
+                "updated_at": self.timestamp(datetime.now(timezone.utc)),
+            },
+        )
+        self.record_write()
+        self.cache.invalidate_ids(record["id"] for record in records)
+        return [ExperimentPublic(**record) for record in records]
+
+    async def delete_experiment_by_id(
+        self, *, id: int, if_updated_at: Optional[List[datetime]] = None
+    ) -> Optional[ExperimentPublic]:
+        """
+        Delete the experiment and return it as it was, or None if there was no experiment with this id. With
+        `if_updated_at`, only delete the experiment if it was last updated at one of these times.
+        """
+        query, values = self._if_updated_at(
+            DELETE_EXPERIMENT_BY_ID_QUERY, SQLITE_DELETE_EXPERIMENT_BY_ID_QUERY, if_updated_at
+        )
+        deleted_experiment = await self.db.fetch_one(query=query, values={**values, "id": id})
+        self.record_write()
+        self.signing_keys.discard(id)
+        self.cache.invalidate(id=id)
+        if not deleted_experiment:
             return None
-        deleted_id = await self.db.execute(query=DELETE_EXPERIMENT_BY_ID_QUERY, values={"id": id})
-        return deleted_id
+
+        return ExperimentPublic(**deleted_experiment)
+
+    async def purge_experiment_tombstones(self, *, before: datetime) -> None:
+        """Delete the tombstones of the experiments deleted before `before`, which no sync cursor can need anymore"""
+        await self.db.execute(query=PURGE_EXPERIMENT_TOMBSTONES_QUERY, values={"before": self.timestamp(before)})
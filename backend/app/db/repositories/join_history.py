@@ -0,0 +1,133 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from app.db.repositories.base import BaseRepository
+
+
+JOIN_HISTORY_COLUMNS = ("experiment_id", "username", "peer_key_digest", "joined_at")
+PARTITION_PREFIX = "join_history_"
+PARTITION_DATE_FORMAT = "%Y%m%d"
+LIST_PARTITIONS_QUERY = """
+    SELECT child.relname AS name
+    FROM pg_inherits
+    JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = 'join_history';
+"""
+# Identifiers and bounds can't be bound parameters; they are only ever formatted from dates
+CREATE_PARTITION_QUERY = """
+    CREATE TABLE IF NOT EXISTS {name}
+    PARTITION OF join_history
+    FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00');
+"""
+DROP_PARTITION_QUERY = "DROP TABLE IF EXISTS {name};"
+# A partition can't be created for a day the default partition holds joins of. The joins are moved to a table that is
+# attached as the partition of the day afterwards, while inserts into the default partition wait.
+DEFAULT_PARTITION_HAS_JOINS_QUERY = """
+    SELECT EXISTS (
+        SELECT 1
+        FROM join_history_default
+        WHERE joined_at >= :start AND joined_at < :end
+    );
+"""
+LOCK_JOIN_HISTORY_QUERY = "LOCK TABLE ONLY join_history IN SHARE UPDATE EXCLUSIVE MODE;"
+LOCK_DEFAULT_PARTITION_QUERY = "LOCK TABLE join_history_default IN ACCESS EXCLUSIVE MODE;"
+CREATE_DETACHED_PARTITION_QUERY = """
+    CREATE TABLE {name} (LIKE join_history INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+"""
+MOVE_DEFAULT_PARTITION_JOINS_QUERY = """
+    WITH moved AS (
+        DELETE FROM join_history_default
+        WHERE joined_at >= :start AND joined_at < :end
+        RETURNING {columns}
+    )
+    INSERT INTO {name} ({columns})
+    SELECT {columns} FROM moved;
+"""
+ATTACH_PARTITION_QUERY = """
+    ALTER TABLE join_history
+    ATTACH PARTITION {name} FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00');
+"""
+JoinRecord = Tuple[int, str, Optional[str], datetime.datetime]
+
+
+def partition_name(day: datetime.date) -> str:
+    return f"{PARTITION_PREFIX}{day.strftime(PARTITION_DATE_FORMAT)}"
+
+
+def partition_day(name: str) -> Optional[datetime.date]:
+    """Day of a daily partition, None for the default partition"""
+    try:
+        return datetime.datetime.strptime(name[len(PARTITION_PREFIX) :], PARTITION_DATE_FORMAT).date()
+    except ValueError:
+        return None
+
+
+class JoinHistoryRepository(BaseRepository):
+    """
+    All database actions associated with the history of joins
+    """
+
+    async def insert_joins(self, joins: Iterable[JoinRecord]) -> None:
+        """Insert a batch of joins with a single COPY"""
+        async with self.db.connection() as connection:
+            await connection.raw_connection.copy_records_to_table(
+                "join_history", records=joins, columns=JOIN_HISTORY_COLUMNS
+            )
+
+    async def create_partitions(self, first_day: datetime.date, days: int) -> List[str]:
+        """
+        Create the missing daily partitions, and return the names of those which took the joins the default
+        partition held for their day
+        """
+        existing = {record["name"] for record in await self.db.fetch_all(query=LIST_PARTITIONS_QUERY)}
+        filled = []
+        for offset in range(days):
+            day = first_day + datetime.timedelta(days=offset)
+            name = partition_name(day)
+            if name in existing:
+                continue
+            start = datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.timezone.utc)
+            bounds = {"name": name, "start": day.isoformat(), "end": (day + datetime.timedelta(days=1)).isoformat()}
+            values = {"start": start, "end": start + datetime.timedelta(days=1)}
+            if not await self.db.fetch_val(query=DEFAULT_PARTITION_HAS_JOINS_QUERY, values=values):
+                await self.db.execute(query=CREATE_PARTITION_QUERY.format(**bounds))
+                continue
+
+            async with self.db.transaction():
+                await self.db.execute(query=LOCK_JOIN_HISTORY_QUERY)
+                await self.db.execute(query=LOCK_DEFAULT_PARTITION_QUERY)
+                await self.db.execute(query=CREATE_DETACHED_PARTITION_QUERY.format(name=name))
+                await self.db.execute(
+                    query=MOVE_DEFAULT_PARTITION_JOINS_QUERY.format(
+                        name=name, columns=", ".join(JOIN_HISTORY_COLUMNS)
+                    ),
+                    values=values,
+                )
+                await self.db.execute(query=ATTACH_PARTITION_QUERY.format(**bounds))
+            filled.append(name)
+        return filled
+
+    async def drop_partitions_before(self, day: datetime.date) -> List[str]:
+        """Drop the partitions holding joins older than `day`, and return their names"""
+        dropped = []
+        for record in await self.db.fetch_all(query=LIST_PARTITIONS_QUERY):
+            partition_start = partition_day(record["name"])
+            if partition_start is not None and partition_start < day:
+                await self.db.execute(query=DROP_PARTITION_QUERY.format(name=record["name"]))
+                dropped.append(record["name"])
+        return dropped
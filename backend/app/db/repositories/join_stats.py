@@ -0,0 +1,106 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import datetime
+from typing import List, Sequence, Tuple
+
+from app.db.repositories.base import BaseRepository
+from app.db.sqlite import is_sqlite, parse_timestamp
+
+
+# Each worker writes its own row per experiment and minute, overwritten with its running totals at every flush, so
+# that flushing a window twice never counts its joins twice. Joins to experiments deleted meanwhile are skipped.
+UPSERT_JOIN_STATS_QUERY = """
+    INSERT INTO join_stats (experiment_id, minute, worker_id, joins, peers)
+    SELECT windows.experiment_id, windows.minute, :worker_id, windows.joins, windows.peers
+    FROM unnest(
+        CAST(:experiment_ids AS INTEGER[]),
+        CAST(:minutes AS TIMESTAMPTZ[]),
+        CAST(:joins AS BIGINT[]),
+        CAST(:peers AS BYTEA[])
+    ) AS windows (experiment_id, minute, joins, peers)
+    JOIN experiments ON experiments.id = windows.experiment_id
+    ON CONFLICT (experiment_id, minute, worker_id) DO UPDATE
+    SET joins = EXCLUDED.joins,
+        peers = EXCLUDED.peers;
+"""
+SQLITE_UPSERT_JOIN_STATS_QUERY = """
+    INSERT INTO join_stats (experiment_id, minute, worker_id, joins, peers)
+    SELECT id, :minute, :worker_id, :joins, :peers
+    FROM experiments
+    WHERE id = :experiment_id
+    ON CONFLICT (experiment_id, minute, worker_id) DO UPDATE
+    SET joins = excluded.joins,
+        peers = excluded.peers;
+"""
+LIST_JOIN_STATS_QUERY = """
+    SELECT minute, worker_id, joins, peers
+    FROM join_stats
+    WHERE experiment_id = :experiment_id
+    AND minute >= :since
+    ORDER BY minute;
+"""
+PURGE_JOIN_STATS_QUERY = """
+    DELETE FROM join_stats
+    WHERE minute < :before;
+"""
+# (experiment_id, minute, joins, registers of the HyperLogLog of the peers)
+JoinStatsWindow = Tuple[int, datetime.datetime, int, bytes]
+# (minute, worker_id, joins, registers of the HyperLogLog of the peers)
+JoinStatsRow = Tuple[datetime.datetime, str, int, bytes]
+
+
+class JoinStatsRepository(BaseRepository):
+    """
+    All database actions associated with the per-minute join counters
+    """
+
+    async def upsert_windows(self, worker_id: str, windows: Sequence[JoinStatsWindow]) -> None:
+        if is_sqlite(self.db):
+            await self.db.execute_many(
+                query=SQLITE_UPSERT_JOIN_STATS_QUERY,
+                values=[
+                    {
+                        "experiment_id": experiment_id,
+                        "minute": self.timestamp(minute),
+                        "worker_id": worker_id,
+                        "joins": joins,
+                        "peers": peers,
+                    }
+                    for experiment_id, minute, joins, peers in windows
+                ],
+            )
+            return
+        experiment_ids, minutes, joins, peers = zip(*windows)
+        await self.db.execute(
+            query=UPSERT_JOIN_STATS_QUERY,
+            values={
+                "worker_id": worker_id,
+                "experiment_ids": list(experiment_ids),
+                "minutes": list(minutes),
+                "joins": list(joins),
+                "peers": list(peers),
+            },
+        )
+
+    async def list_join_stats(self, *, experiment_id: int, since: datetime.datetime) -> List[JoinStatsRow]:
+        values = {"experiment_id": experiment_id, "since": self.timestamp(since)}
+        records = await self.read(lambda db: db.fetch_all(query=LIST_JOIN_STATS_QUERY, values=values))
+        return [
+            (parse_timestamp(record["minute"]), record["worker_id"], record["joins"], bytes(record["peers"]))
+            for record in records
+        ]
+
+    async def purge_join_stats(self, *, before: datetime.datetime) -> None:
+        await self.db.execute(query=PURGE_JOIN_STATS_QUERY, values={"before": self.timestamp(before)})
@@ -0,0 +1,81 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import datetime
+
+from app.db.repositories.base import BaseRepository
+from app.db.sqlite import is_sqlite
+
+
+# Takes a token from the bucket after refilling it for the time elapsed since it was last taken from, unless less
+# than one is left, in which case no row is returned. A new bucket starts full.
+ACQUIRE_TOKEN_QUERY = """
+    INSERT INTO rate_limit_buckets (key, tokens, rate, capacity, updated_at)
+    VALUES (:key, :tokens, :rate, :capacity, now())
+    ON CONFLICT (key) DO UPDATE
+    SET tokens     = LEAST(
+            EXCLUDED.capacity,
+            rate_limit_buckets.tokens
+            + EXTRACT(EPOCH FROM EXCLUDED.updated_at - rate_limit_buckets.updated_at) * EXCLUDED.rate
+        ) - 1,
+        rate       = EXCLUDED.rate,
+        capacity   = EXCLUDED.capacity,
+        updated_at = EXCLUDED.updated_at
+    WHERE LEAST(
+        EXCLUDED.capacity,
+        rate_limit_buckets.tokens
+        + EXTRACT(EPOCH FROM EXCLUDED.updated_at - rate_limit_buckets.updated_at) * EXCLUDED.rate
+    ) >= 1
+    RETURNING tokens;
+"""
+SQLITE_ACQUIRE_TOKEN_QUERY = """
+    INSERT INTO rate_limit_buckets (key, tokens, rate, capacity, updated_at)
+    VALUES (:key, :tokens, :rate, :capacity, :now)
+    ON CONFLICT (key) DO UPDATE
+    SET tokens     = MIN(
+            excluded.capacity,
+            rate_limit_buckets.tokens
+            + (julianday(excluded.updated_at) - julianday(rate_limit_buckets.updated_at)) * 86400 * excluded.rate
+        ) - 1,
+        rate       = excluded.rate,
+        capacity   = excluded.capacity,
+        updated_at = excluded.updated_at
+    WHERE MIN(
+        excluded.capacity,
+        rate_limit_buckets.tokens
+        + (julianday(excluded.updated_at) - julianday(rate_limit_buckets.updated_at)) * 86400 * excluded.rate
+    ) >= 1
+    RETURNING tokens;
+"""
+PURGE_RATE_LIMIT_BUCKETS_QUERY = """
+    DELETE FROM rate_limit_buckets
+    WHERE updated_at < :before;
+"""
+
+
+class RateLimitsRepository(BaseRepository):
+    """
+    All database actions associated with the token buckets of the rate limits shared by the workers
+    """
+
+    async def acquire(self, *, key: str, rate: float, capacity: float) -> bool:
+        """Take a token from the bucket of `key`, refilled at `rate` tokens per second, and return whether there was one"""
+        values = {"key": key, "tokens": capacity - 1, "rate": rate, "capacity": capacity}
+        if is_sqlite(self.db):
+            values["now"] = self.timestamp(datetime.datetime.now(datetime.timezone.utc))
+            return await self.db.fetch_one(query=SQLITE_ACQUIRE_TOKEN_QUERY, values=values) is not None
+        return await self.db.fetch_one(query=ACQUIRE_TOKEN_QUERY, values=values) is not None
+
+    async def purge(self, *, before: datetime.datetime) -> None:
+        await self.db.execute(query=PURGE_RATE_LIMIT_BUCKETS_QUERY, values={"before": self.timestamp(before)})
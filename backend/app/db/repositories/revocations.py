@@ -0,0 +1,141 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from functools import partial
+from typing import List, Optional
+
+from app.core.config import REVOCATION_CACHE_SIZE, REVOCATION_REFRESH_SECONDS
+from app.db.cache import IncrementalSetCache, SetChange, SetSnapshot
+from app.db.repositories.base import BaseRepository
+from app.models.revocation import RevocationList
+
+
+USERNAME = "username"
+PEER_KEY = "peer_key"
+
+LOCK_EXPERIMENT_QUERY = """
+    SELECT id
+    FROM experiments
+    WHERE id = :experiment_id
+    FOR NO KEY UPDATE;
+"""
+REVOKE_QUERY = """
+    INSERT INTO revocations (experiment_id, kind, value)
+    SELECT :experiment_id, kind, value
+    FROM unnest(CAST(:kinds AS TEXT[]), CAST(:values AS TEXT[])) AS entries (kind, value)
+    ON CONFLICT (experiment_id, kind, value) DO UPDATE
+    SET revoked = true,
+        seq     = nextval('revocations_seq')
+    WHERE revocations.revoked = false;
+"""
+LIFT_REVOCATIONS_QUERY = """
+    UPDATE revocations
+    SET revoked = false,
+        seq     = nextval('revocations_seq')
+    FROM unnest(CAST(:kinds AS TEXT[]), CAST(:values AS TEXT[])) AS entries (kind, value)
+    WHERE revocations.experiment_id = :experiment_id
+    AND revocations.kind = entries.kind
+    AND revocations.value = entries.value
+    AND revocations.revoked;
+"""
+LIST_REVOCATION_CHANGES_QUERY = """
+    SELECT kind, value, revoked, seq
+    FROM revocations
+    WHERE experiment_id = :experiment_id
+    AND seq > :since_version
+    ORDER BY seq;
+"""
+
+
+class RevocationsRepository(BaseRepository):
+    """
+    All database actions associated with the revocation lists of experiments
+    """
+
+    cache = IncrementalSetCache(maxsize=REVOCATION_CACHE_SIZE, refresh_interval=REVOCATION_REFRESH_SECONDS)
+
+    async def revoke(self, *, experiment_id: int, usernames: List[str], peer_key_digests: List[str]) -> None:
+        await self._apply(REVOKE_QUERY, experiment_id, usernames, peer_key_digests)
+
+    async def lift_revocations(self, *, experiment_id: int, usernames: List[str], peer_key_digests: List[str]) -> None:
+        await self._apply(LIFT_REVOCATIONS_QUERY, experiment_id, usernames, peer_key_digests)
+
+    async def _apply(self, query: str, experiment_id: int, usernames: List[str], peer_key_digests: List[str]) -> None:
+        self.require_postgresql("Revocations")
+        entries = sorted({(USERNAME, username) for username in usernames} | {(PEER_KEY, d) for d in peer_key_digests})
+        if not entries:
+            return
+        kinds, values = (list(column) for column in zip(*entries))
+        # Writers of the same experiment take turns, so that its sequence numbers are committed in increasing order
+        # and a reader never skips a change by moving its version past it
+        async with self.db.transaction():
+            await self.db.execute(query=LOCK_EXPERIMENT_QUERY, values={"experiment_id": experiment_id})
+            await self.db.execute(
+                query=query, values={"experiment_id": experiment_id, "kinds": kinds, "values": values}
+            )
+        self.cache.invalidate(experiment_id)
+
+    async def list_revocation_changes(self, *, experiment_id: int, since_version: int) -> List[SetChange]:
+        records = await self.db.fetch_all(
+            query=LIST_REVOCATION_CHANGES_QUERY,
+            values={"experiment_id": experiment_id, "since_version": since_version},
+        )
+        return [(record["kind"], record["value"], record["revoked"], record["seq"]) for record in records]
+
+    async def get_revocation_snapshot(self, *, experiment_id: int, refresh: bool = False) -> SetSnapshot:
+        if refresh:
+            self.cache.invalidate(experiment_id)
+        return await self.cache.get(experiment_id, partial(self._fetch_changes, experiment_id))
+
+    async def _fetch_changes(self, experiment_id: int, since_version: int) -> List[SetChange]:
+        return await self.list_revocation_changes(experiment_id=experiment_id, since_version=since_version)
+
+    async def is_revoked(self, *, experiment_id: int, username: str, peer_key_digest: Optional[str]) -> bool:
+        snapshot = await self.get_revocation_snapshot(experiment_id=experiment_id)
+        if snapshot.contains(USERNAME, username):
+            return True
+        return peer_key_digest is not None and snapshot.contains(PEER_KEY, peer_key_digest)
+
+    async def get_revocation_list(
+        self, *, experiment_id: int, snapshot: SetSnapshot, since_version: Optional[int] = None
+    ) -> RevocationList:
+        if not since_version or since_version > snapshot.version:
+            return RevocationList(
+                experiment_id=experiment_id,
+                version=snapshot.version,
+                since_version=None,
+                usernames=sorted(snapshot.members[USERNAME]),
+                peer_key_digests=sorted(snapshot.members[PEER_KEY]),
+            )
+
+        delta = RevocationList(
+            experiment_id=experiment_id,
+            version=snapshot.version,
+            since_version=since_version,
+            usernames=[],
+            peer_key_digests=[],
+        )
+        if since_version == snapshot.version:
+            return delta
+
+        changes = await self.list_revocation_changes(experiment_id=experiment_id, since_version=since_version)
+        for kind, value, revoked, seq in changes:
+            if seq > snapshot.version:
+                # Changed after the snapshot was taken, the next delta will include it
+                continue
+            if kind == USERNAME:
+                (delta.usernames if revoked else delta.lifted_usernames).append(value)
+            else:
+                (delta.peer_key_digests if revoked else delta.lifted_peer_key_digests).append(value)
+        return delta
@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Sequence, Union
+
+from databases import Database
+
+
+# Applied to every connection: WAL lets readers proceed while a write is in progress, which makes synchronous commits
+# safe to relax, and SQLite only enforces foreign keys (and their cascades) when asked to
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA foreign_keys = ON;",
+)
+
+# The queries written for SQLite use RETURNING, the most recent of the features they rely on
+SQLITE_MIN_VERSION = (3, 35, 0)
+
+
+def check_sqlite_version() -> None:
+    """Fail early when the SQLite library Python is linked against is too old to run the queries of the app"""
+    if sqlite3.sqlite_version_info < SQLITE_MIN_VERSION:
+        required = ".".join(str(part) for part in SQLITE_MIN_VERSION)
+        raise RuntimeError(f"SQLite {required} or later is required, found {sqlite3.sqlite_version}.")
+
+
+def is_sqlite(database: Database) -> bool:
+    return database.url.dialect == "sqlite"
+
+
+def sqlite_timestamp(value: datetime) -> str:
+    """
+    Timestamp to bind on SQLite, which stores them as text: in UTC, without offset and with microseconds only when
+    there are some like CURRENT_TIMESTAMP, so that timestamps compare in chronological order
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(" ")
+
+
+def parse_timestamp(value: Union[datetime, str]) -> datetime:
+    """Timestamp read by a raw query, which SQLite returns as the text it stores, in UTC"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+class PragmaPool:
+    """
+    Proxy of the connection factory of the SQLite backend of `databases`, which opens a new connection every time one
+    is acquired, applying pragmas to the connections it opens
+    """
+
+    def __init__(self, pool: Any, pragmas: Sequence[str]) -> None:
+        self._pool = pool
+        self.pragmas = tuple(pragmas)
+
+    async def acquire(self) -> Any:
+        connection = await self._pool.acquire()
+        for pragma in self.pragmas:
+            await connection.execute(pragma)
+        return connection
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+
+def configure_sqlite(database: Database, pragmas: Sequence[str] = SQLITE_PRAGMAS) -> None:
+    backend = database._backend
+    if not isinstance(backend._pool, PragmaPool):
+        backend._pool = PragmaPool(backend._pool, pragmas)
+
+
+def updated_at_trigger(table: str) -> str:
+    """
+    SQLite counterpart of the `update_updated_at_column` triggers of PostgreSQL, for migrations. As SQLite triggers
+    cannot modify the row being updated, it updates it again, unless the update set `updated_at` itself.
+    """
+    return f"""
+        CREATE TRIGGER update_{table}_modtime
+            AFTER UPDATE
+            ON {table}
+            FOR EACH ROW
+            WHEN NEW.updated_at = OLD.updated_at
+        BEGIN
+            UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid;
+        END;
+        """
@@ -12,34 +12,271 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.#
+import asyncio
 import logging
 import os
+import time
+from typing import Optional
 
-from databases import Database
+from databases import Database, DatabaseURL
 from fastapi import FastAPI
 
-from app.core.config import DATABASE_URL
+from app.core.config import (
+    DATABASE_REPLICA_URL,
+    DATABASE_URL,
+    DB_CONNECT_DEADLINE_SECONDS,
+    DB_CONNECT_MAX_BACKOFF_SECONDS,
+    DB_CONNECT_RETRY_INTERVAL_SECONDS,
+    DB_POOL_ACQUIRE_TIMEOUT_SECONDS,
+    DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_STATEMENT_TIMEOUT_MS,
+    EXPERIMENT_CHANGES_LISTENER,
+    EXPERIMENT_TOMBSTONE_PURGE_INTERVAL_SECONDS,
+    EXPERIMENT_TOMBSTONE_RETENTION_DAYS,
+    JOIN_HISTORY_BATCH_SIZE,
+    JOIN_HISTORY_ENABLED,
+    JOIN_HISTORY_FLUSH_INTERVAL_SECONDS,
+    JOIN_HISTORY_QUEUE_SIZE,
+    JOIN_HISTORY_RETENTION_DAYS,
+    JOIN_STATS_ENABLED,
+    JOIN_STATS_FLUSH_INTERVAL_SECONDS,
+    JOIN_STATS_RETENTION_DAYS,
+    LISTENER_HEARTBEAT_SECONDS,
+    LISTENER_MAX_BACKOFF_SECONDS,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_CACHE_SIZE,
+    RATE_LIMIT_CREATE_PER_MINUTE,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_JOIN_PER_MINUTE,
+    RATE_LIMIT_READ_PER_MINUTE,
+    RATE_LIMIT_WRITE_PER_MINUTE,
+    REPLICA_CHECK_INTERVAL_SECONDS,
+    REPLICA_MAX_LAG_SECONDS,
+    SQLITE_BUSY_TIMEOUT_SECONDS,
+)
+from app.db.instrumentation import InstrumentedDatabase
+from app.db.listener import ExperimentChangesListener
+from app.db.pool import instrument_pool
+from app.db.replica import ReplicaRouter
+from app.db.sqlite import check_sqlite_version, configure_sqlite, is_sqlite
+from app.services.join_history import JoinHistoryBuffer
+from app.services.join_stats import JoinStatsAggregator
+from app.services.rate_limit import (
+    CREATE,
+    JOIN,
+    READ,
+    WRITE,
+    DatabaseRateLimitBackend,
+    MemoryRateLimitBackend,
+    RateLimiter,
+)
+from app.services.tombstones import TombstonePurger
 
 
 logger = logging.getLogger(__name__)
 
 
-async def connect_to_db(app: FastAPI) -> None:
+async def connect_database(url: str) -> Database:
+    if DatabaseURL(url).dialect == "sqlite":
+        # A busy connection waits for the write lock held by another one for up to the timeout
+        database = InstrumentedDatabase(url, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
+        configure_sqlite(database)
+        await database.connect()
+        return database
+
+    # The pool opens its `min_size` connections while connecting, so that the first requests don't pay for them
+    database = InstrumentedDatabase(
+        url,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS,
+        server_settings={"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)},
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+    )
+    await database.connect()
+    instrument_pool(database, acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT_SECONDS)
+    return database
+
+
+async def connect_with_backoff(url: str, deadline: float) -> Database:
+    """Retry connecting with exponential backoff until `deadline` seconds have passed, then raise the last error"""
+    give_up_at = time.monotonic() + deadline
+    backoff = 0.1
+    while True:
+        try:
+            return await connect_database(url)
+        except Exception as e:
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                raise
+            logger.warning(f"Could not connect to the database, retrying in {min(backoff, remaining):.1f}s: {e}")
+            await asyncio.sleep(min(backoff, remaining))
+            backoff = min(2 * backoff, DB_CONNECT_MAX_BACKOFF_SECONDS)
+
+
+async def connect_to_db(app: FastAPI, deadline: float = DB_CONNECT_DEADLINE_SECONDS) -> None:
     DB_URL = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else DATABASE_URL
-    database = Database(DB_URL, min_size=2, max_size=10)
+    app.state._db = None
+    app.state._db_router = None
+    if not hasattr(app.state, "_db_connect_lock"):
+        app.state._db_connect_lock = asyncio.Lock()
+        app.state._db_connect_failed_at = float("-inf")
+    if DatabaseURL(DB_URL).dialect == "sqlite":
+        check_sqlite_version()
     try:
-        await database.connect()
-        app.state._db = database
+        app.state._db = await connect_with_backoff(DB_URL, deadline)
     except Exception as e:
+        app.state._db_connect_failed_at = time.monotonic()
         logger.warn("--- DB CONNECTION ERROR ---")
         logger.warn(e)
         logger.warn("--- DB CONNECTION ERROR ---")
+        return
+
+    if DATABASE_REPLICA_URL is not None and not is_sqlite(app.state._db):
+        # Reads are served by the primary until the replica can be connected to
+        app.state._db_router = ReplicaRouter(
+            app.state._db,
+            None,
+            max_lag=REPLICA_MAX_LAG_SECONDS,
+            check_interval=REPLICA_CHECK_INTERVAL_SECONDS,
+            connect_replica=lambda: connect_database(DATABASE_REPLICA_URL),
+            retry_interval=DB_CONNECT_RETRY_INTERVAL_SECONDS,
+        )
+        await app.state._db_router.connect()
+
+
+async def get_connected_database(app: FastAPI) -> Optional[Database]:
+    """
+    The database of the app, connecting to it if that failed at startup. A single request connects at a time, and
+    requests coming less than DB_CONNECT_RETRY_INTERVAL_SECONDS after a failure don't try again.
+    """
+    if getattr(app.state, "_db", None) is not None:
+        return app.state._db
+    if not hasattr(app.state, "_db_connect_lock"):
+        # The app has not started
+        return None
+
+    async with app.state._db_connect_lock:
+        if (
+            app.state._db is None
+            and time.monotonic() - app.state._db_connect_failed_at >= DB_CONNECT_RETRY_INTERVAL_SECONDS
+        ):
+            await connect_to_db(app, deadline=0)
+            if app.state._db is not None:
+                await start_experiment_changes_listener(app)
+    return app.state._db
 
 
 async def close_db_connection(app: FastAPI) -> None:
     try:
-        await app.state._db.disconnect()
+        router = getattr(app.state, "_db_router", None)
+        if router is not None and router.replica is not None:
+            await router.replica.disconnect()
+        if getattr(app.state, "_db", None) is not None:
+            await app.state._db.disconnect()
     except Exception as e:
         logger.warn("--- DB DISCONNECT ERROR ---")
         logger.warn(e)
         logger.warn("--- DB DISCONNECT ERROR ---")
+
+
+async def start_experiment_changes_listener(app: FastAPI) -> None:
+    app.state._experiment_changes_listener = None
+    if not EXPERIMENT_CHANGES_LISTENER or getattr(app.state, "_db", None) is None:
+        return
+    if is_sqlite(app.state._db):
+        # SQLite has no notifications: the experiments changed by other workers expire from their caches
+        return
+    listener = ExperimentChangesListener(
+        str(app.state._db.url),
+        heartbeat_interval=LISTENER_HEARTBEAT_SECONDS,
+        max_backoff=LISTENER_MAX_BACKOFF_SECONDS,
+        router=app.state._db_router,
+    )
+    listener.start()
+    app.state._experiment_changes_listener = listener
+
+
+async def stop_experiment_changes_listener(app: FastAPI) -> None:
+    listener = getattr(app.state, "_experiment_changes_listener", None)
+    if listener is not None:
+        await listener.stop()
+
+
+async def start_join_history(app: FastAPI) -> None:
+    app.state._join_history = None
+    # The join history is written with COPY, into partitions
+    if not JOIN_HISTORY_ENABLED or DATABASE_URL.dialect == "sqlite":
+        return
+    join_history = JoinHistoryBuffer(
+        lambda: get_connected_database(app),
+        maxsize=JOIN_HISTORY_QUEUE_SIZE,
+        batch_size=JOIN_HISTORY_BATCH_SIZE,
+        flush_interval=JOIN_HISTORY_FLUSH_INTERVAL_SECONDS,
+        retention_days=JOIN_HISTORY_RETENTION_DAYS,
+    )
+    join_history.start()
+    app.state._join_history = join_history
+
+
+async def stop_join_history(app: FastAPI) -> None:
+    join_history = getattr(app.state, "_join_history", None)
+    if join_history is not None:
+        await join_history.stop()
+
+
+async def start_join_stats(app: FastAPI) -> None:
+    app.state._join_stats = None
+    if not JOIN_STATS_ENABLED:
+        return
+    join_stats = JoinStatsAggregator(
+        lambda: get_connected_database(app),
+        flush_interval=JOIN_STATS_FLUSH_INTERVAL_SECONDS,
+        retention_days=JOIN_STATS_RETENTION_DAYS,
+    )
+    join_stats.start()
+    app.state._join_stats = join_stats
+
+
+async def stop_join_stats(app: FastAPI) -> None:
+    join_stats = getattr(app.state, "_join_stats", None)
+    if join_stats is not None:
+        await join_stats.stop()
+
+
+async def start_tombstone_purger(app: FastAPI) -> None:
+    tombstone_purger = TombstonePurger(
+        lambda: get_connected_database(app),
+        purge_interval=EXPERIMENT_TOMBSTONE_PURGE_INTERVAL_SECONDS,
+        retention_days=EXPERIMENT_TOMBSTONE_RETENTION_DAYS,
+    )
+    tombstone_purger.start()
+    app.state._tombstone_purger = tombstone_purger
+
+
+async def stop_tombstone_purger(app: FastAPI) -> None:
+    tombstone_purger = getattr(app.state, "_tombstone_purger", None)
+    if tombstone_purger is not None:
+        await tombstone_purger.stop()
+
+
+def start_rate_limiter(app: FastAPI) -> None:
+    app.state._rate_limiter = None
+    if not RATE_LIMIT_ENABLED:
+        return
+    if RATE_LIMIT_BACKEND == "database":
+        backend = DatabaseRateLimitBackend(lambda: get_connected_database(app))
+    else:
+        backend = MemoryRateLimitBackend(maxsize=RATE_LIMIT_CACHE_SIZE)
+    app.state._rate_limiter = RateLimiter(
+        backend,
+        budgets={
+            JOIN: RATE_LIMIT_JOIN_PER_MINUTE,
+            CREATE: RATE_LIMIT_CREATE_PER_MINUTE,
+            READ: RATE_LIMIT_READ_PER_MINUTE,
+            WRITE: RATE_LIMIT_WRITE_PER_MINUTE,
+        },
+    )
@@ -0,0 +1,34 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from enum import Enum
+
+from app.models.core import CoreModel
+
+
+class AllowlistUploadMode(str, Enum):
+    replace = "replace"
+    merge = "merge"
+
+
+class AllowlistUploadResult(CoreModel):
+    """
+    Usernames added to and removed from the allowlist of an experiment by an upload, and its size and version after it
+    """
+
+    experiment_id: int
+    version: int
+    size: int
+    added: int
+    removed: int
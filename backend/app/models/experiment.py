@@ -12,13 +12,26 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.#
-from typing import Optional
+import hashlib
+from datetime import datetime
+from typing import List, Optional
 
-from pydantic import IPvAnyAddress, validator
+from pydantic import IPvAnyAddress, root_validator, validator
 
 from app.models.core import CoreModel, DateTimeModelMixin, IDModelMixin
 
 
+def get_key_id(auth_server_public_key: bytes) -> str:
+    """Identifier of an experiment key pair, derived from its public key"""
+    return hashlib.sha256(auth_server_public_key).hexdigest()[:16]
+
+
+def derive_key_id(cls, key_id, values):
+    if key_id is None and values.get("auth_server_public_key") is not None:
+        return get_key_id(values["auth_server_public_key"])
+    return key_id
+
+
 class ExperimentBase(CoreModel):
     """
     All common characteristics of our Experiment resource
@@ -71,5 +84,116 @@ class ExperimentPublic(IDModelMixin, DateTimeModelMixin, ExperimentBase):
     coordinator_port: Optional[int]
 
 
+class ExperimentCoordinator(IDModelMixin, CoreModel):
+    """
+    New coordinator of an experiment, in a bulk update
+    """
+
+    coordinator_ip: Optional[IPvAnyAddress]
+    coordinator_port: Optional[int]
+
+    @validator("coordinator_port")
+    def validate_port(cls, port):
+        return ExperimentBase.validate_port(port)
+
+
+class CoordinatorMove(CoreModel):
+    """
+    Move of every experiment whose coordinator is at (coordinator_ip, coordinator_port) to a new coordinator
+    """
+
+    coordinator_ip: IPvAnyAddress
+    coordinator_port: int
+    new_coordinator_ip: IPvAnyAddress
+    new_coordinator_port: int
+
+    @validator("coordinator_port", "new_coordinator_port")
+    def validate_port(cls, port):
+        return ExperimentBase.validate_port(port)
+
+
+class CoordinatorsUpdate(CoreModel):
+    """
+    Either new coordinators for a list of experiments, or the move of all the experiments of a coordinator
+    """
+
+    experiments: Optional[List[ExperimentCoordinator]]
+    move: Optional[CoordinatorMove]
+
+    @root_validator(skip_on_failure=True)
+    def validate_update(cls, values):
+        if (values.get("experiments") is None) == (values.get("move") is None):
+            raise ValueError("either experiments or move must be given")
+        ids = [experiment.id for experiment in values.get("experiments") or ()]
+        if values.get("experiments") is not None and not ids:
+            raise ValueError("experiments must not be empty")
+        if len(ids) != len(set(ids)):
+            raise ValueError("experiments must not be listed more than once")
+        return values
+
+
+class CoordinatorsUpdateResult(CoreModel):
+    """
+    Experiments whose coordinator was updated
+    """
+
+    experiments: List[ExperimentPublic]
+
+
+class ExperimentJoinView(ExperimentPublic):
+    """
+    Public view of an experiment along with its public key: all a join needs except the signing key itself
+    """
+
+    auth_server_public_key: bytes
+    key_id: Optional[str]
+
+    _derive_key_id = validator("key_id", always=True, allow_reuse=True)(derive_key_id)
+
+
+class ExperimentSigningKey(IDModelMixin, CoreModel):
+    """
+    Private key of an experiment, only loaded to sign passes
+    """
+
+    auth_server_public_key: bytes
+    auth_server_private_key: bytes
+    key_id: Optional[str]
+
+    _derive_key_id = validator("key_id", always=True, allow_reuse=True)(derive_key_id)
+
+
+class ExperimentsPage(CoreModel):
+    """
+    A page of experiments, and the cursor to pass to get the next one if there is one
+    """
+
+    experiments: List[ExperimentPublic]
+    next_cursor: Optional[str]
+
+
 class DeletedExperimentPublic(IDModelMixin, CoreModel):
     pass
+
+
+class ExperimentTombstone(CoreModel):
+    """
+    An experiment deleted from an organization, or moved out of it
+    """
+
+    id: int
+    organization_name: str
+    model_name: str
+    deleted_at: datetime
+
+
+class ExperimentChanges(CoreModel):
+    """
+    Experiments created or changed, and experiments gone, since a sync cursor. Changes keep coming as long as
+    `has_more`, and `next_cursor` is to be passed to the next sync.
+    """
+
+    experiments: List[ExperimentPublic]
+    deleted: List[ExperimentTombstone]
+    next_cursor: str
+    has_more: bool
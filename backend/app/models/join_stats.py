@@ -0,0 +1,40 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import datetime
+from typing import List
+
+from app.models.core import CoreModel
+
+
+class JoinStatsWindow(CoreModel):
+    """
+    Joins to an experiment during a minute, and an estimate of the number of distinct peers that joined it
+    """
+
+    minute: datetime.datetime
+    joins: int
+    unique_peers: int
+
+
+class ExperimentJoinStats(CoreModel):
+    """
+    Joins to an experiment per minute since `since`, and in total over that period
+    """
+
+    experiment_id: int
+    since: datetime.datetime
+    joins: int
+    unique_peers: int
+    windows: List[JoinStatsWindow]
@@ -0,0 +1,39 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from typing import List
+
+from app.models.core import CoreModel
+
+
+class PublicKey(CoreModel):
+    """
+    Public key of an experiment as a JSON Web Key, along with the OpenSSH encoding passes are verified with
+    """
+
+    kty: str
+    kid: str
+    use: str
+    n: str
+    e: str
+    experiment_id: int
+    auth_server_public_key: str
+
+
+class KeySet(CoreModel):
+    """
+    JSON Web Key Set of the keys verifying the passes of one or several experiments
+    """
+
+    keys: List[PublicKey]
@@ -0,0 +1,87 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.models.core import CoreModel
+
+
+class HistogramSnapshot(CoreModel):
+    """
+    Cumulative counts of the observations below each bucket bound
+    """
+
+    buckets: Dict[str, int]
+    count: int
+    sum: float
+    max: float
+
+
+class PoolStats(CoreModel):
+    min_size: int
+    max_size: int
+    size: int
+    in_use: int
+    idle: int
+    waiters: int
+    acquire_timeouts: int
+    acquire_wait_seconds: HistogramSnapshot
+
+
+class Readiness(CoreModel):
+    ready: bool
+
+
+class JoinHistoryStats(CoreModel):
+    queue_depth: int
+    max_queue_depth: int
+    queue_size: int
+    enqueued: int
+    written: int
+    dropped: int
+    failed: int
+    flush_seconds: HistogramSnapshot
+
+
+class JoinStatsAggregatorStats(CoreModel):
+    windows: int
+    recorded: int
+    flushes: int
+    failed_flushes: int
+    flush_seconds: HistogramSnapshot
+
+
+class QueryMetrics(CoreModel):
+    calls: int
+    errors: int
+    rows: int
+    slow: int
+    latency_seconds: HistogramSnapshot
+
+
+class SlowQuerySample(CoreModel):
+    """
+    A query slower than the threshold, and its EXPLAIN ANALYZE output if captured. Its parameters are only logged.
+    """
+
+    name: str
+    duration_seconds: float
+    observed_at: datetime
+    plan: Optional[Any]
+
+
+class QueryStats(CoreModel):
+    queries: Dict[str, QueryMetrics]
+    slow_samples: List[SlowQuerySample]
@@ -0,0 +1,53 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import string
+from typing import List, Optional
+
+from pydantic import validator
+
+from app.models.core import CoreModel
+
+
+class RevocationUpdate(CoreModel):
+    """
+    Usernames and peer keys to revoke from (or restore to) an experiment. Peer keys can be given either as the
+    public key itself or as its digest.
+    """
+
+    usernames: List[str] = []
+    peer_public_keys: List[bytes] = []
+    peer_key_digests: List[str] = []
+
+    @validator("peer_key_digests", each_item=True)
+    def validate_peer_key_digest(cls, digest):
+        digest = digest.lower()
+        if len(digest) != 64 or not set(digest) <= set(string.hexdigits):
+            raise ValueError("peer key digests are hex-encoded SHA-256 digests")
+        return digest
+
+
+class RevocationList(CoreModel):
+    """
+    Revocation list of an experiment at `version`. When `since_version` is set, this is a delta: `usernames` and
+    `peer_key_digests` were revoked after `since_version` and the `lifted_*` entries were restored after it.
+    """
+
+    experiment_id: int
+    version: int
+    since_version: Optional[int]
+    usernames: List[str]
+    peer_key_digests: List[str]
+    lifted_usernames: List[str] = []
+    lifted_peer_key_digests: List[str] = []
@@ -12,17 +12,21 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.#
+import hmac
 from enum import Enum
 from functools import partial
 from typing import List, Optional
 
 import requests
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security.http import HTTPAuthorizationCredentials, HTTPBase
 from pydantic import BaseModel
 from requests import ConnectionError, HTTPError
 from starlette.status import HTTP_401_UNAUTHORIZED
 
+from app.core.config import MONITORING_TOKEN
+from app.services.rate_limit import get_rate_limiter, request_budget, token_key, user_key
+
 
 HF_API = "https://huggingface.co/api"
 
@@ -55,7 +59,19 @@ UnauthenticatedError = partial(
 api_key = HTTPBase(scheme="bearer", auto_error=False)
 
 
-async def authenticate(credentials: Optional[HTTPAuthorizationCredentials] = Depends(api_key)) -> MoonlandingUser:
+async def rate_limit_token(
+    request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(api_key)
+) -> None:
+    """Count the request against the rate limit of its token, before the token is checked"""
+    rate_limiter = get_rate_limiter(request)
+    if rate_limiter is not None and credentials is not None:
+        await rate_limiter.check(request_budget(request), token_key(credentials.credentials))
+
+
+async def authenticate(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(api_key),
+    _: None = Depends(rate_limit_token),
+) -> MoonlandingUser:
     if credentials is None:
         raise UnauthenticatedError(detail="Not authenticated")
 
@@ -84,6 +100,27 @@ async def authenticate(credentials: Optional[HTTPAuthorizationCredentials] = Dep
     return MoonlandingUser(username=username, email=email, orgs=orgs)
 
 
+async def rate_limit_user(request: Request, user: MoonlandingUser = Depends(authenticate)) -> None:
+    """Count the request against the rate limit of its user, shared by all the tokens of the user"""
+    rate_limiter = get_rate_limiter(request)
+    if rate_limiter is not None:
+        await rate_limiter.check(request_budget(request), user_key(user.username))
+
+
+async def authenticate_monitoring(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(api_key),
+) -> None:
+    """Let operators holding the monitoring token read the internals of the app"""
+    monitoring_token = str(MONITORING_TOKEN)
+    if (
+        not monitoring_token
+        or credentials is None
+        or credentials.scheme.lower() != "bearer"
+        or not hmac.compare_digest(credentials.credentials.encode(), monitoring_token.encode())
+    ):
+        raise UnauthenticatedError(detail="Invalid monitoring credentials")
+
+
 def moonlanding_auth(token: str) -> dict:
     """Validate token with Moon Landing
     TODO: cache requests to avoid flooding Moon Landing
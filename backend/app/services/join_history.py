@@ -0,0 +1,176 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+import datetime
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from databases import Database
+
+from app.core.metrics import Histogram
+from app.db.repositories.join_history import JoinHistoryRepository, JoinRecord
+
+
+logger = logging.getLogger(__name__)
+
+# Partitions are created for the current day and the next ones, and checked on this interval
+PARTITIONS_AHEAD_DAYS = 3
+MAINTENANCE_INTERVAL_SECONDS = 60 * 60
+
+
+class JoinHistoryBuffer:
+    """
+    Bounded in-memory queue of joins, written to the join history by a background task in batches of up to
+    `batch_size` joins, at least every `flush_interval` seconds. Recording a join never waits: when the queue is full,
+    the join is dropped and counted. The background task also creates and drops the daily partitions of the history.
+    """
+
+    def __init__(
+        self,
+        get_database: Callable[[], Awaitable[Optional[Database]]],
+        maxsize: int,
+        batch_size: int,
+        flush_interval: float,
+        retention_days: int,
+    ) -> None:
+        self.get_database = get_database
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.queue: Optional[asyncio.Queue] = None
+        self.enqueued = 0
+        self.written = 0
+        # Joins not recorded because the queue was full, and because writing their batch failed
+        self.dropped = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.flush_seconds = Histogram()
+        self._stopping: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def record(self, experiment_id: int, username: str, peer_key_digest: Optional[str]) -> bool:
+        joined_at = datetime.datetime.now(datetime.timezone.utc)
+        try:
+            self.queue.put_nowait((experiment_id, username, peer_key_digest, joined_at))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return True
+
+    def start(self) -> None:
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        self._tasks = [loop.create_task(self._flush_forever()), loop.create_task(self._maintain_forever())]
+
+    async def stop(self) -> None:
+        """Write the joins still queued, then stop"""
+        if not self._tasks:
+            return
+        self._stopping.set()
+        flush_task, maintenance_task = self._tasks
+        maintenance_task.cancel()
+        await asyncio.gather(flush_task, maintenance_task, return_exceptions=True)
+        self._tasks = []
+
+    async def _collect_batch(self) -> List[JoinRecord]:
+        loop = asyncio.get_event_loop()
+        batch: List[JoinRecord] = []
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._stopping.is_set():
+                break
+            # Wait for the next join, unless stopping in the meantime
+            get, stopping = loop.create_task(self.queue.get()), loop.create_task(self._stopping.wait())
+            done, pending = await asyncio.wait((get, stopping), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            if get not in done:
+                break
+            batch.append(get.result())
+        return batch
+
+    async def _write(self, batch: List[JoinRecord]) -> None:
+        start = time.perf_counter()
+        try:
+            database = await self.get_database()
+            if database is None:
+                raise ConnectionError("The database is unavailable")
+            await JoinHistoryRepository(database).insert_joins(batch)
+        except Exception as e:
+            logger.warning(f"Could not write {len(batch)} joins to the join history: {e}")
+            self.failed += len(batch)
+            return
+        finally:
+            self.flush_seconds.observe(time.perf_counter() - start)
+        self.written += len(batch)
+
+    async def flush(self) -> None:
+        """Write all the joins queued so far"""
+        while not self.queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self._write(batch)
+
+    async def _flush_forever(self) -> None:
+        while not (self._stopping.is_set() and self.queue.empty()):
+            batch = await self._collect_batch()
+            if batch:
+                await self._write(batch)
+
+    async def maintain_partitions(self, today: Optional[datetime.date] = None) -> None:
+        today = today or datetime.datetime.now(datetime.timezone.utc).date()
+        database = await self.get_database()
+        if database is None:
+            return
+        join_history_repo = JoinHistoryRepository(database)
+        filled = await join_history_repo.create_partitions(today, PARTITIONS_AHEAD_DAYS)
+        if filled:
+            logger.warning(f"Moved joins out of the default join history partition into: {', '.join(filled)}")
+        dropped = await join_history_repo.drop_partitions_before(today - datetime.timedelta(days=self.retention_days))
+        if dropped:
+            logger.info(f"Dropped the join history partitions past retention: {', '.join(dropped)}")
+
+    async def _maintain_forever(self) -> None:
+        while True:
+            try:
+                await self.maintain_partitions()
+            except Exception as e:
+                # Other workers may be creating the same partitions
+                logger.warning(f"Could not maintain the join history partitions: {e}")
+            await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_size": self.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flush_seconds": self.flush_seconds.snapshot(),
+        }
@@ -0,0 +1,192 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+import datetime
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from databases import Database
+
+from app.core.metrics import Histogram, HyperLogLog
+from app.db.repositories.join_stats import JoinStatsRepository, JoinStatsRow
+
+
+logger = logging.getLogger(__name__)
+
+# Rows past retention are deleted on this interval
+PURGE_INTERVAL_SECONDS = 60 * 60
+WindowKey = Tuple[int, datetime.datetime]
+
+
+def minute_of(moment: datetime.datetime) -> datetime.datetime:
+    return moment.replace(second=0, microsecond=0)
+
+
+class JoinWindow:
+    """
+    Joins to an experiment during a minute, and the distinct peers that joined it
+    """
+
+    __slots__ = ("joins", "peers", "dirty")
+
+    def __init__(self) -> None:
+        self.joins = 0
+        self.peers = HyperLogLog()
+        # Whether the window changed since it was last written
+        self.dirty = False
+
+    def add(self, peer: str) -> None:
+        self.joins += 1
+        self.peers.add(peer)
+        self.dirty = True
+
+
+class JoinStatsAggregator:
+    """
+    Counters of the joins to each experiment per minute, kept in memory and written to the `join_stats` rollup table
+    by a background task every `flush_interval` seconds. Recording a join is a couple of in-memory updates, with no
+    database round trip. Each worker writes its own rows, holding the running totals of its windows, and keeps the
+    windows of the current minute until they are over and written.
+    """
+
+    def __init__(
+        self,
+        get_database: Callable[[], Awaitable[Optional[Database]]],
+        flush_interval: float,
+        retention_days: int,
+        worker_id: Optional[str] = None,
+    ) -> None:
+        self.get_database = get_database
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self.windows: Dict[WindowKey, JoinWindow] = {}
+        self.recorded = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flush_seconds = Histogram()
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._purged_at = float("-inf")
+
+    def record(self, experiment_id: int, peer: str, now: Optional[datetime.datetime] = None) -> None:
+        minute = minute_of(now or datetime.datetime.now(datetime.timezone.utc))
+        window = self.windows.get((experiment_id, minute))
+        if window is None:
+            window = self.windows[(experiment_id, minute)] = JoinWindow()
+        window.add(peer)
+        self.recorded += 1
+
+    def start(self) -> None:
+        self._stopping = asyncio.Event()
+        self._task = asyncio.get_event_loop().create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        """Write the windows changed since the last flush, then stop"""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    async def flush(self, now: Optional[datetime.datetime] = None) -> None:
+        """Write the windows changed since the last flush, and forget the past ones already written"""
+        current_minute = minute_of(now or datetime.datetime.now(datetime.timezone.utc))
+        dirty = [(key, window) for key, window in self.windows.items() if window.dirty]
+        for _, window in dirty:
+            window.dirty = False
+
+        if dirty:
+            start = time.perf_counter()
+            try:
+                database = await self.get_database()
+                if database is None:
+                    raise ConnectionError("The database is unavailable")
+                await JoinStatsRepository(database).upsert_windows(
+                    self.worker_id,
+                    [
+                        (experiment_id, minute, window.joins, bytes(window.peers))
+                        for (experiment_id, minute), window in dirty
+                    ],
+                )
+            except Exception as e:
+                # The windows hold running totals, so they are simply written again at the next flush
+                logger.warning(f"Could not write the join counters of {len(dirty)} windows: {e}")
+                for _, window in dirty:
+                    window.dirty = True
+                self.failed_flushes += 1
+                return
+            finally:
+                self.flush_seconds.observe(time.perf_counter() - start)
+            self.flushes += 1
+
+        for key in [key for key, window in self.windows.items() if key[1] < current_minute and not window.dirty]:
+            del self.windows[key]
+
+    async def purge(self) -> None:
+        database = await self.get_database()
+        if database is None:
+            return
+        before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.retention_days)
+        await JoinStatsRepository(database).purge_join_stats(before=before)
+
+    async def _flush_forever(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            if time.monotonic() - self._purged_at >= PURGE_INTERVAL_SECONDS:
+                try:
+                    await self.purge()
+                    self._purged_at = time.monotonic()
+                except Exception as e:
+                    logger.warning(f"Could not purge the join counters past retention: {e}")
+
+    def merge(
+        self, experiment_id: int, since: datetime.datetime, rows: List[JoinStatsRow]
+    ) -> Dict[datetime.datetime, Tuple[int, HyperLogLog]]:
+        """
+        Joins and distinct peers per minute since `since`, from the rows written by all the workers and from the
+        windows of this worker, which are at least as recent as its rows
+        """
+        merged: Dict[datetime.datetime, Tuple[int, HyperLogLog]] = {}
+
+        def add(minute: datetime.datetime, joins: int, peers: HyperLogLog) -> None:
+            total, union = merged.get(minute, (0, HyperLogLog(peers.precision)))
+            union.merge(peers)
+            merged[minute] = (total + joins, union)
+
+        for (window_experiment_id, minute), window in self.windows.items():
+            if window_experiment_id == experiment_id and minute >= since:
+                add(minute, window.joins, window.peers)
+        for minute, worker_id, joins, peers in rows:
+            if worker_id == self.worker_id and (experiment_id, minute) in self.windows:
+                continue
+            add(minute, joins, HyperLogLog(registers=peers))
+        return merged
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "windows": len(self.windows),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flush_seconds": self.flush_seconds.snapshot(),
+        }
@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import base64
+import hashlib
+import time
+from functools import lru_cache
+from typing import Dict, Iterable
+
+from app.api.dependencies import crypto
+from app.api.responses import dumps
+from app.core.config import EXPERIMENT_CACHE_TTL_SECONDS, KEY_SET_CACHE_SIZE
+from app.db.cache import LRUCache
+from app.db.repositories.experiments import ExperimentsRepository
+from app.models.experiment import get_key_id
+
+
+class KeySetDocument:
+    """
+    Key set rendered once, as the body of the responses serving it and their entity tag
+    """
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, keys: Iterable[Dict[str, object]]) -> None:
+        self.body = dumps({"keys": list(keys)})
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+
+
+# (experiment id, key id) -> key set. A key id designates a single key pair, so entries never go stale.
+experiment_key_sets = LRUCache(maxsize=KEY_SET_CACHE_SIZE)
+# organization name -> (expiration time, key set), for organizations with experiments only: anyone can ask for the key
+# set of any name, which must not evict the key sets in use
+organization_key_sets = LRUCache(maxsize=KEY_SET_CACHE_SIZE)
+EMPTY_KEY_SET = KeySetDocument([])
+
+
+def base64url_uint(value: int) -> str:
+    return base64.urlsafe_b64encode(value.to_bytes((value.bit_length() + 7) // 8 or 1, "big")).rstrip(b"=").decode()
+
+
+@lru_cache(maxsize=KEY_SET_CACHE_SIZE)
+def public_jwk(experiment_id: int, auth_server_public_key: bytes) -> Dict[str, object]:
+    """JSON Web Key of the public key of an experiment, which is only parsed once"""
+    numbers = crypto.load_public_key(auth_server_public_key).public_numbers()
+    return {
+        "kty": "RSA",
+        "kid": get_key_id(auth_server_public_key),
+        "use": "sig",
+        "n": base64url_uint(numbers.n),
+        "e": base64url_uint(numbers.e),
+        "experiment_id": experiment_id,
+        "auth_server_public_key": auth_server_public_key.decode(),
+    }
+
+
+def get_experiment_key_set(experiment_id: int, key_id: str, auth_server_public_key: bytes) -> KeySetDocument:
+    document = experiment_key_sets.get((experiment_id, key_id))
+    if document is None:
+        document = KeySetDocument([public_jwk(experiment_id, auth_server_public_key)])
+        experiment_key_sets.set((experiment_id, key_id), document)
+    return document
+
+
+async def get_organization_key_set(organization_name: str, experiments_repo: ExperimentsRepository) -> KeySetDocument:
+    expires_at, document = organization_key_sets.get(organization_name, (float("-inf"), None))
+    if expires_at < time.monotonic():
+        public_keys = await experiments_repo.list_experiment_public_keys(organization_name=organization_name)
+        if not public_keys:
+            return EMPTY_KEY_SET
+        document = KeySetDocument(public_jwk(experiment_id, public_key) for experiment_id, public_key in public_keys)
+        organization_key_sets.set(organization_name, (time.monotonic() + EXPERIMENT_CACHE_TTL_SECONDS, document))
+    return document
@@ -0,0 +1,136 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import datetime
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from databases import Database
+from fastapi import HTTPException, Request
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS
+
+from app.db.repositories.rate_limits import RateLimitsRepository
+
+
+JOIN = "join"
+CREATE = "create"
+READ = "read"
+WRITE = "write"
+# Buckets idle for longer than this are full again, and are deleted from the database on this interval
+PURGE_INTERVAL_SECONDS = 10 * 60
+
+
+def rate_limit_budget(budget: str) -> Callable:
+    """Decorator of a route endpoint counting its requests against `budget` instead of the READ or WRITE budget"""
+
+    def decorate(endpoint: Callable) -> Callable:
+        endpoint.rate_limit_budget = budget
+        return endpoint
+
+    return decorate
+
+
+def request_budget(request: Request) -> str:
+    endpoint = request.scope.get("endpoint")
+    budget = getattr(endpoint, "rate_limit_budget", None)
+    if budget is not None:
+        return budget
+    return READ if request.method in ("GET", "HEAD") else WRITE
+
+
+class MemoryRateLimitBackend:
+    """
+    Token buckets of a single worker, bounded in number: the buckets used the least recently are dropped first, which
+    only forgets the limits of the clients that are the least likely to be limited
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        # key -> (tokens, monotonic time they were counted at)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, key: str, rate: float, capacity: float) -> bool:
+        now = time.monotonic()
+        tokens, counted_at = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - counted_at) * rate)
+        allowed = tokens >= 1
+        self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return allowed
+
+
+class DatabaseRateLimitBackend:
+    """
+    Token buckets in the database, shared by all the workers, at the cost of a write per rate-limited request
+    """
+
+    def __init__(self, get_database: Callable[[], Awaitable[Optional[Database]]]) -> None:
+        self.get_database = get_database
+        self._purged_at = float("-inf")
+
+    async def acquire(self, key: str, rate: float, capacity: float) -> bool:
+        database = await self.get_database()
+        if database is None:
+            # The requests fail anyway
+            return True
+        rate_limits_repo = RateLimitsRepository(database)
+        if time.monotonic() - self._purged_at >= PURGE_INTERVAL_SECONDS:
+            self._purged_at = time.monotonic()
+            await rate_limits_repo.purge(
+                before=datetime.datetime.now(datetime.timezone.utc)
+                - datetime.timedelta(seconds=PURGE_INTERVAL_SECONDS)
+            )
+        return await rate_limits_repo.acquire(key=key, rate=rate, capacity=capacity)
+
+
+class RateLimiter:
+    """
+    Token bucket rate limits, with a budget of requests per minute for each kind of route. A bucket holds up to a
+    minute of requests, refilled continuously.
+    """
+
+    def __init__(self, backend, budgets: Dict[str, int]) -> None:
+        self.backend = backend
+        self.budgets = budgets
+        self.limited = 0
+
+    async def check(self, budget: str, key: str) -> None:
+        """Count a request against the bucket of `key` for `budget`, raising a 429 error if it is empty"""
+        per_minute = self.budgets[budget]
+        rate = per_minute / 60
+        if await self.backend.acquire(f"{budget}:{key}", rate, per_minute):
+            return
+        self.limited += 1
+        # An empty bucket holds less than one token, which is refilled within this time
+        raise HTTPException(
+            status_code=HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, retry later.",
+            headers={"Retry-After": str(math.ceil(1 / rate))},
+        )
+
+
+def get_rate_limiter(request: Request) -> Optional[RateLimiter]:
+    return getattr(request.app.state, "_rate_limiter", None)
+
+
+def token_key(token: str) -> str:
+    return "token:" + hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def user_key(username: str) -> str:
+    return "user:" + username
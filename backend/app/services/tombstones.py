@@ -0,0 +1,69 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+import datetime
+import logging
+from typing import Awaitable, Callable, Optional
+
+from databases import Database
+
+from app.db.repositories.experiments import ExperimentsRepository
+
+
+logger = logging.getLogger(__name__)
+
+
+class TombstonePurger:
+    """
+    Background task deleting, every `purge_interval` seconds, the tombstones of experiments deleted more than
+    `retention_days` ago, past which sync cursors expire
+    """
+
+    def __init__(
+        self, get_database: Callable[[], Awaitable[Optional[Database]]], purge_interval: float, retention_days: int
+    ) -> None:
+        self.get_database = get_database
+        self.purge_interval = purge_interval
+        self.retention_days = retention_days
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._stopping = asyncio.Event()
+        self._task = asyncio.get_event_loop().create_task(self._purge_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def purge(self) -> None:
+        database = await self.get_database()
+        if database is None:
+            return
+        before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.retention_days)
+        await ExperimentsRepository(database).purge_experiment_tombstones(before=before)
+
+    async def _purge_forever(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.purge()
+            except Exception as e:
+                logger.warning(f"Could not purge the experiment tombstones past retention: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.purge_interval)
+            except asyncio.TimeoutError:
+                pass
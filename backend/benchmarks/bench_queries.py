@@ -0,0 +1,94 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+"""
+Compare the latency of the hot experiment lookups through `databases` and through the prepared fast path, with and
+without asyncpg's statement cache (the latter being how they run behind PgBouncer in transaction pooling mode).
+
+Usage, against the database configured as for the app (set TESTING=1 to use the test database):
+
+    python -m benchmarks.bench_queries [--iterations N]
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+from databases import Database
+
+from app.core.config import DATABASE_URL
+from app.db.prepared import fetch_one_prepared
+from app.db.repositories.experiments import (
+    GET_EXPERIMENT_BY_ID_QUERY,
+    GET_EXPERIMENT_BY_ORGANIZATON_AND_MODEL_NAME_QUERY,
+    GET_EXPERIMENT_JOIN_VIEW_BY_ID_QUERY,
+)
+
+
+SEED_EXPERIMENT_QUERY = """
+    INSERT INTO experiments (organization_name, model_name, creator, auth_server_public_key)
+    VALUES ('benchmark_org', 'benchmark_model', 'benchmark_user', 'benchmark_key')
+    ON CONFLICT (organization_name, model_name) DO UPDATE
+    SET creator = excluded.creator
+    RETURNING id;
+"""
+DELETE_EXPERIMENT_QUERY = "DELETE FROM experiments WHERE id = :id;"
+
+
+async def measure(name: str, run: Callable[[], Awaitable[object]], iterations: int) -> None:
+    for _ in range(min(100, iterations)):
+        await run()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await run()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<64} {elapsed / iterations * 1e6:8.1f} us/query {iterations / elapsed:10.0f} queries/s")
+
+
+async def main(iterations: int) -> None:
+    url = f"{DATABASE_URL}_test" if os.environ.get("TESTING") else str(DATABASE_URL)
+    db = Database(url, min_size=1, max_size=1)
+    uncached_db = Database(url, min_size=1, max_size=1, statement_cache_size=0)
+    await db.connect()
+    await uncached_db.connect()
+    id = await db.fetch_val(query=SEED_EXPERIMENT_QUERY)
+    try:
+        lookups = {
+            "get by id": (GET_EXPERIMENT_BY_ID_QUERY, {"id": id}),
+            "get by organization and model name": (
+                GET_EXPERIMENT_BY_ORGANIZATON_AND_MODEL_NAME_QUERY,
+                {"organization_name": "benchmark_org", "model_name": "benchmark_model"},
+            ),
+            "join view by id": (GET_EXPERIMENT_JOIN_VIEW_BY_ID_QUERY, {"id": id}),
+        }
+        for lookup, (query, values) in lookups.items():
+            await measure(f"{lookup} / databases", lambda: db.fetch_one(query=query, values=values), iterations)
+            await measure(f"{lookup} / prepared", lambda: fetch_one_prepared(db, query, values), iterations)
+            await measure(
+                f"{lookup} / prepared, no statement cache",
+                lambda: fetch_one_prepared(uncached_db, query, values),
+                iterations,
+            )
+    finally:
+        await db.execute(query=DELETE_EXPERIMENT_QUERY, values={"id": id})
+        await uncached_db.disconnect()
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
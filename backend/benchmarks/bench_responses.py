@@ -0,0 +1,126 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+"""
+Compare the CPU time spent building and serializing the responses of the experiment routes the way FastAPI does for
+a `response_model` (validating the result again, then encoding it with `jsonable_encoder` and `json`), and through the
+fast path of `FastJSONRoute`. No database is needed.
+
+Usage:
+
+    python -m benchmarks.bench_responses [--iterations N]
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import time
+from typing import Awaitable, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.api.responses import FastJSONResponse, orjson
+from app.models.experiment import ExperimentPublic, ExperimentsPage
+from app.models.experiment_join import ExperimentJoinOutput, HivemindAccess
+
+
+NOW = datetime.datetime.now(datetime.timezone.utc)
+EXPERIMENT = ExperimentPublic(
+    id=1,
+    organization_name="benchmark_org",
+    model_name="benchmark_model",
+    creator="benchmark_user",
+    coordinator_ip=ipaddress.ip_address("192.0.2.1"),
+    coordinator_port=8080,
+    created_at=NOW,
+    updated_at=NOW,
+)
+PAGE = ExperimentsPage(experiments=[EXPERIMENT.copy(update={"id": id}) for id in range(100)], next_cursor="cursor")
+PUBLIC_KEY = b"-----BEGIN PUBLIC KEY-----\n" + b"A" * 392 + b"\n-----END PUBLIC KEY-----\n"
+HIVEMIND_ACCESS = HivemindAccess(
+    username="benchmark_user", peer_public_key=PUBLIC_KEY, expiration_time=NOW, signature=b"S" * 344
+)
+
+
+async def measure(name: str, run: Callable[[], Awaitable[bytes]], iterations: int) -> float:
+    for _ in range(min(100, iterations)):
+        await run()
+    start = time.process_time()
+    for _ in range(iterations):
+        await run()
+    per_response = (time.process_time() - start) / iterations
+    print(f"{name:<48} {per_response * 1e6:8.1f} us/response")
+    return per_response
+
+
+def fastapi_path(model: type, build: Callable[[], object]) -> Callable[[], Awaitable[bytes]]:
+    """The route builds its result from validated models, which FastAPI validates again against the response model"""
+    field = create_response_field(name=f"Response_{model.__name__}", type_=model)
+
+    async def run() -> bytes:
+        content = await serialize_response(field=field, response_content=build(), is_coroutine=True)
+        return JSONResponse(content).body
+
+    return run
+
+
+def fast_path(build: Callable[[], object]) -> Callable[[], Awaitable[bytes]]:
+    async def run() -> bytes:
+        return FastJSONResponse(build()).body
+
+    return run
+
+
+async def main(iterations: int) -> None:
+    print(f"JSON encoder of the fast path: {'orjson' if orjson is not None else 'json'}")
+    cases = {
+        "experiment": (
+            ExperimentPublic,
+            lambda: ExperimentPublic(**EXPERIMENT.dict()),
+            lambda: EXPERIMENT,
+        ),
+        "page of 100 experiments": (
+            ExperimentsPage,
+            lambda: ExperimentsPage(experiments=PAGE.experiments, next_cursor=PAGE.next_cursor),
+            lambda: ExperimentsPage.construct(experiments=PAGE.experiments, next_cursor=PAGE.next_cursor),
+        ),
+        "join": (
+            ExperimentJoinOutput,
+            lambda: ExperimentJoinOutput(
+                **EXPERIMENT.dict(), hivemind_access=HIVEMIND_ACCESS, auth_server_public_key=PUBLIC_KEY
+            ),
+            lambda: ExperimentJoinOutput.construct(
+                coordinator_ip=EXPERIMENT.coordinator_ip,
+                coordinator_port=EXPERIMENT.coordinator_port,
+                hivemind_access=HIVEMIND_ACCESS,
+                auth_server_public_key=PUBLIC_KEY,
+            ),
+        ),
+    }
+    for case, (model, build, build_fast) in cases.items():
+        slow_body, fast_body = await fastapi_path(model, build)(), await fast_path(build_fast)()
+        assert json.loads(slow_body) == json.loads(fast_body), f"The responses to {case} differ"
+        slow = await measure(f"{case} / validated again", fastapi_path(model, build), iterations)
+        fast = await measure(f"{case} / fast path", fast_path(build_fast), iterations)
+        print(f"{case:<48} {(slow - fast) * 1e6:8.1f} us saved per response ({slow / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.iterations))
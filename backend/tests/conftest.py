@@ -14,7 +14,7 @@
 # limitations under the License.#
 import os
 import warnings
-from typing import Tuple
+from typing import List, Tuple
 
 import alembic
 import pytest
@@ -23,16 +23,33 @@ from asgi_lifespan import LifespanManager
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 from databases import Database
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from httpx import AsyncClient
+from starlette.datastructures import Secret
 
 from app.api.routes.experiments import create_new_experiment, update_experiment_by_id
+from app.core.config import DATABASE_URL
 from app.db.repositories.experiments import ExperimentsRepository
 from app.models.experiment import ExperimentCreatePublic, ExperimentPublic, ExperimentUpdate
 from app.models.experiment_join import ExperimentJoinInput
+from app.services import authentication
 from app.services.authentication import MoonlandingUser, Organization, RepoRole
 
 
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line("markers", "postgresql: tests of features that require PostgreSQL, skipped on SQLite")
+
+
+# The whole suite runs against the backend selected by DATABASE_BACKEND
+def pytest_collection_modifyitems(config: pytest.Config, items: List[pytest.Item]) -> None:
+    if DATABASE_URL.dialect != "sqlite":
+        return
+    requires_postgresql = pytest.mark.skip(reason="requires PostgreSQL")
+    for item in items:
+        if "postgresql" in item.keywords:
+            item.add_marker(requires_postgresql)
+
+
 # Apply migrations at beginning and end of testing session
 @pytest.fixture(scope="session")
 def apply_migrations():
@@ -70,6 +87,13 @@ async def client(app: FastAPI) -> AsyncClient:
             yield client
 
 
+# Headers of the operators allowed to read the monitoring endpoints
+@pytest.fixture
+def monitoring_headers(monkeypatch) -> dict:
+    monkeypatch.setattr(authentication, "MONITORING_TOKEN", Secret("monitoring-token"))
+    return {"Authorization": "Bearer monitoring-token"}
+
+
 # Fixtures for authenticated User1
 
 # Create an organization
@@ -152,6 +176,31 @@ async def test_experiment_1_created_by_user_1(db: Database, moonlanding_user_1:
     return new_exp
 
 
+@pytest.fixture
+async def test_experiment_of_module(
+    request: pytest.FixtureRequest, db: Database, moonlanding_user_1: MoonlandingUser
+) -> ExperimentPublic:
+    """An experiment of user 1 shared by the tests of a module, named after it: model_allowlist for test_allowlist"""
+    experiments_repo = ExperimentsRepository(db)
+
+    organization_name = "org_1"
+    model_name = "model_" + request.module.__name__.rsplit(".", 1)[-1][len("test_") :]
+
+    experiment = await experiments_repo.get_experiment_by_organization_and_model_name(
+        organization_name=organization_name, model_name=model_name
+    )
+
+    if experiment:
+        return experiment
+
+    new_experiment = ExperimentCreatePublic(organization_name=organization_name, model_name=model_name)
+    return await create_new_experiment(
+        new_experiment=new_experiment,
+        experiments_repo=experiments_repo,
+        user=moonlanding_user_1,
+    )
+
+
 @pytest.fixture
 async def test_experiment_2_created_by_user_1_for_updates_tests(
     db: Database, moonlanding_user_1: MoonlandingUser
@@ -198,6 +247,11 @@ async def test_experiment_join_input_2_by_user_2() -> Tuple[ExperimentJoinInput,
 # Fixtures for authenticated User2
 
 # Create a user for testing
+def join_payload(join_input: ExperimentJoinInput) -> dict:
+    """Body of a request joining an experiment with the peer key of `join_input`"""
+    return {"experiment_join_input": {"peer_public_key": join_input.peer_public_key.decode("utf-8")}}
+
+
 @pytest.fixture
 def moonlanding_user_2(organization_3_admin, organization_1_read) -> MoonlandingUser:
     moonlanding_user_2 = MoonlandingUser(
@@ -239,8 +293,10 @@ async def test_experiment_1_created_by_user_2(db: Database, moonlanding_user_2:
         user=moonlanding_user_2,
     )
     exp = await update_experiment_by_id(
+        response=Response(),
         id=experiment.id,
         experiment_update=ExperimentUpdate(coordinator_ip="192.0.2.0", coordinator_port=80),
+        if_match=None,
         experiments_repo=experiments_repo,
         user=moonlanding_user_2,
     )
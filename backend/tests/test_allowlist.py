@@ -0,0 +1,140 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+from typing import AsyncIterator, Tuple
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from databases import Database
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.db.prepared import compile_query
+from app.db.repositories.allowlist import AllowlistRepository
+from app.db.repositories.revocations import LOCK_EXPERIMENT_QUERY
+from app.models.allowlist import AllowlistUploadResult
+from app.models.experiment import ExperimentPublic
+from app.models.experiment_join import ExperimentJoinInput
+from app.services.authentication import MoonlandingUser, authenticate
+from tests.conftest import join_payload
+
+
+# decorate all tests with @pytest.mark.asyncio
+pytestmark = [pytest.mark.asyncio, pytest.mark.postgresql]
+
+
+@pytest.fixture
+def outside_user() -> MoonlandingUser:
+    return MoonlandingUser(username="Outsider", email="outsider@test.co", orgs=[])
+
+
+async def upload(
+    client: AsyncClient, app: FastAPI, experiment_id: int, usernames: str, mode: str
+) -> AllowlistUploadResult:
+    res = await client.put(
+        app.url_path_for("allowlist:upload-allowlist", id=experiment_id),
+        params={"mode": mode},
+        content=usernames.encode("utf-8"),
+        headers={"Content-Type": "text/plain"},
+    )
+    assert res.status_code == status.HTTP_200_OK, res.content
+    return AllowlistUploadResult(**res.json())
+
+
+class TestAllowlist:
+    async def test_allowlisted_user_can_join(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_of_module: ExperimentPublic,
+        outside_user: MoonlandingUser,
+        test_experiment_join_input_1_by_user_2: Tuple[ExperimentJoinInput, rsa.RSAPrivateKey],
+    ) -> None:
+        join_input, _ = test_experiment_join_input_1_by_user_2
+        experiment_id = test_experiment_of_module.id
+        join_path = app.url_path_for("experiments:join-experiment-by-id", id=experiment_id)
+
+        result = await upload(
+            client_wt_auth_user_1, app, experiment_id, "Outsider\nUser9\n\n  User8  \nUser9", "replace"
+        )
+        assert (result.added, result.removed, result.size) == (3, 0, 3)
+
+        app.dependency_overrides[authenticate] = lambda: outside_user
+        res = await client_wt_auth_user_1.put(join_path, json=join_payload(join_input))
+        assert res.status_code == status.HTTP_200_OK, res.content
+
+        # Only admins of the organization of the experiment can upload its allowlist
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("allowlist:upload-allowlist", id=experiment_id), content=b"Outsider\n"
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED, res.content
+
+    async def test_replace_and_merge(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_of_module: ExperimentPublic,
+        outside_user: MoonlandingUser,
+        test_experiment_join_input_1_by_user_2: Tuple[ExperimentJoinInput, rsa.RSAPrivateKey],
+    ) -> None:
+        join_input, _ = test_experiment_join_input_1_by_user_2
+        experiment_id = test_experiment_of_module.id
+        join_path = app.url_path_for("experiments:join-experiment-by-id", id=experiment_id)
+        as_user_1 = app.dependency_overrides[authenticate]
+
+        replaced = await upload(client_wt_auth_user_1, app, experiment_id, "User8\nUser9\n", "replace")
+        assert (replaced.added, replaced.removed, replaced.size) == (0, 1, 2)
+
+        app.dependency_overrides[authenticate] = lambda: outside_user
+        res = await client_wt_auth_user_1.put(join_path, json=join_payload(join_input))
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED, res.content
+
+        app.dependency_overrides[authenticate] = as_user_1
+        merged = await upload(client_wt_auth_user_1, app, experiment_id, "Outsider\nUser8", "merge")
+        assert (merged.added, merged.removed, merged.size) == (1, 0, 3)
+        assert merged.version > replaced.version
+
+        app.dependency_overrides[authenticate] = lambda: outside_user
+        res = await client_wt_auth_user_1.put(join_path, json=join_payload(join_input))
+        assert res.status_code == status.HTTP_200_OK, res.content
+
+    async def test_uploads_lock_the_experiment_only_once_received(
+        self, client: AsyncClient, db: Database, test_experiment_of_module: ExperimentPublic
+    ) -> None:
+        received = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def stalled_upload() -> AsyncIterator[bytes]:
+            yield b"User8\n"
+            received.set()
+            await finish.wait()
+            yield b"User9\n"
+
+        upload_task = asyncio.ensure_future(
+            AllowlistRepository(db).upload_allowlist(
+                experiment_id=test_experiment_of_module.id, usernames=stalled_upload(), replace=False
+            )
+        )
+        try:
+            await asyncio.wait_for(received.wait(), timeout=5)
+            # The other writers of the experiment are not blocked while the client is uploading
+            async with db.connection() as connection, connection.transaction():
+                await connection.raw_connection.execute("SET LOCAL lock_timeout = '1s';")
+                await connection.raw_connection.execute(
+                    compile_query(LOCK_EXPERIMENT_QUERY)[0], test_experiment_of_module.id
+                )
+        finally:
+            finish.set()
+            await upload_task
@@ -0,0 +1,80 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import datetime
+import json
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app.api.routes.experiments import create_new_experiment
+from app.cli import export_experiments, import_experiments
+from app.db.repositories.experiments import GET_EXPERIMENT_SIGNING_KEY_BY_ID_QUERY, ExperimentsRepository
+from app.models.experiment import ExperimentCreatePublic
+from app.services.authentication import MoonlandingUser
+
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.postgresql]
+
+
+class TestImportExport:
+    @pytest.mark.parametrize("format", ("ndjson", "csv"))
+    async def test_exported_experiments_are_imported_with_their_keys(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, moonlanding_user_1: MoonlandingUser, tmp_path, format
+    ) -> None:
+        db = app.state._db
+        experiments_repo = ExperimentsRepository(db)
+        experiment = await create_new_experiment(
+            new_experiment=ExperimentCreatePublic(
+                organization_name="org_1", model_name=f"model_export_{format}", coordinator_ip="192.0.2.1"
+            ),
+            experiments_repo=experiments_repo,
+            user=moonlanding_user_1,
+        )
+        keys = await db.fetch_one(query=GET_EXPERIMENT_SIGNING_KEY_BY_ID_QUERY, values={"id": experiment.id})
+
+        path = str(tmp_path / f"experiments.{format}")
+        exported = await export_experiments(db, path)
+        assert exported == await db.fetch_val(query="SELECT count(*) FROM experiments;")
+        if format == "ndjson":
+            with open(path) as file:
+                assert len([json.loads(line) for line in file]) == exported
+
+        # Experiments that still exist are skipped
+        assert await import_experiments(db, path) == 0
+
+        await experiments_repo.delete_experiment_by_id(id=experiment.id)
+        imported_after = await db.fetch_val(query="SELECT now();")
+        assert await import_experiments(db, path) == 1
+
+        imported = await experiments_repo.get_experiment_by_organization_and_model_name(
+            organization_name="org_1", model_name=f"model_export_{format}"
+        )
+        assert imported.id != experiment.id
+        assert imported.dict(exclude={"id", "updated_at"}) == experiment.dict(exclude={"id", "updated_at"})
+        # Listed by the changes since the deletion, after its tombstone
+        assert imported.updated_at > imported_after
+        changes = await experiments_repo.list_experiment_changes(
+            organization_names=["org_1"],
+            after=(imported_after, 0),
+            until=imported.updated_at + datetime.timedelta(seconds=1),
+            limit=100,
+        )
+        assert imported.id in [change.id for change in changes]
+        imported_keys = await db.fetch_one(query=GET_EXPERIMENT_SIGNING_KEY_BY_ID_QUERY, values={"id": imported.id})
+        assert imported_keys["auth_server_public_key"] == keys["auth_server_public_key"]
+        assert imported_keys["auth_server_private_key"] == keys["auth_server_private_key"]
+
+        await experiments_repo.delete_experiment_by_id(id=imported.id)
@@ -12,6 +12,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.#
+import asyncio
 import base64
 import datetime
 from ipaddress import IPv4Address, IPv6Address
@@ -21,12 +22,20 @@ import pytest
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
+from databases import Database
 from fastapi import FastAPI, status
 from httpx import AsyncClient
 
 from app.api.dependencies import crypto
+from app.api.dependencies.pagination import encode_cursor
+from app.api.routes import experiments as experiments_routes
+from app.core.config import EXPERIMENT_TOMBSTONE_RETENTION_DAYS
+from app.db.repositories.experiments import ExperimentsRepository
+from app.db.tasks import get_connected_database, stop_tombstone_purger
 from app.models.experiment import ExperimentCreate, ExperimentCreatePublic, ExperimentPublic, ExperimentUpdate
-from app.models.experiment_join import ExperimentJoinInput, ExperimentJoinOutput
+from app.models.experiment_join import ExperimentJoinInput, ExperimentJoinOutput, HivemindAccess
+from app.services.authentication import MoonlandingUser, authenticate
+from app.services.tombstones import TombstonePurger
 
 
 # decorate all tests with @pytest.mark.asyncio
@@ -125,6 +134,18 @@ class TestCreateExperiment:
         )
         assert res.status_code == status_code
 
+    async def test_duplicate_experiment_raises_error(self, app: FastAPI, client_wt_auth_user_1: AsyncClient) -> None:
+        new_experiment = ExperimentCreatePublic(organization_name="org_1", model_name="model-duplicate")
+        res = await client_wt_auth_user_1.post(
+            app.url_path_for("experiments:create-experiment"), json={"new_experiment": new_experiment.dict()}
+        )
+        assert res.status_code == status.HTTP_201_CREATED
+
+        res = await client_wt_auth_user_1.post(
+            app.url_path_for("experiments:create-experiment"), json={"new_experiment": new_experiment.dict()}
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
     async def test_unauthenticated_user_unable_to_create_experiment(
         self, app: FastAPI, client: AsyncClient, new_experiment: ExperimentCreate
     ) -> None:
@@ -414,6 +435,26 @@ class TestDeleteExperiment:
 
 
 class TestJoinExperimentById:
+    async def test_join_responses_only_expose_the_fields_of_the_join_output(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_2: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+        test_experiment_join_input_1_by_user_2: ExperimentJoinInput,
+    ) -> None:
+        join_input, _ = test_experiment_join_input_1_by_user_2
+        values = join_input.dict()
+        values["peer_public_key"] = values["peer_public_key"].decode("utf-8")
+
+        res = await client_wt_auth_user_2.put(
+            app.url_path_for("experiments:join-experiment-by-id", id=test_experiment_1_created_by_user_1.id),
+            json={"experiment_join_input": values},
+        )
+        assert res.status_code == status.HTTP_200_OK, res.content
+        # The join output is built from the join view of the experiment, whose other fields stay private
+        assert set(res.json()) == set(ExperimentJoinOutput.__fields__)
+        assert set(res.json()["hivemind_access"]) == set(HivemindAccess.__fields__)
+
     async def test_can_join_experiment_successfully(
         self,
         moonlanding_user_1,
@@ -811,3 +852,662 @@ class TestJoinExperimentByOrgAndModelName:
             },
         )
         assert res.status_code == status.HTTP_401_UNAUTHORIZED, res.content
+
+
+class TestHivemindAccessExpiration:
+    async def test_expiration_time_is_jittered_within_bounds(
+        self,
+        test_experiment_join_input_1_by_user_2: ExperimentJoinInput,
+    ) -> None:
+        join_input_1, private_key_input_1 = test_experiment_join_input_1_by_user_2
+        current_time = datetime.datetime.utcnow()
+        expiration_times = [
+            crypto.create_hivemind_access(
+                peer_public_key=join_input_1.peer_public_key,
+                private_key=private_key_input_1,
+                username="User2",
+            ).expiration_time
+            for _ in range(10)
+        ]
+
+        latest = datetime.datetime.utcnow() + datetime.timedelta(minutes=crypto.EXPIRATION_MINUTES)
+        earliest = current_time + datetime.timedelta(
+            minutes=crypto.EXPIRATION_MINUTES - crypto.EXPIRATION_JITTER_MINUTES
+        )
+        for expiration_time in expiration_times:
+            assert earliest <= expiration_time <= latest
+        # passes delivered together should not all expire at the same time
+        assert len(set(expiration_times)) > 1
+
+    @pytest.mark.parametrize("jitter_fraction", [0.5, 1, 2])
+    async def test_jitter_is_capped_to_a_fraction_of_the_lifetime(self, monkeypatch, jitter_fraction: float) -> None:
+        monkeypatch.setattr(crypto, "EXPIRATION_JITTER_MINUTES", crypto.EXPIRATION_MINUTES * jitter_fraction)
+        # Always draw the largest jitter allowed
+        monkeypatch.setattr(crypto.random, "uniform", lambda low, high: high)
+
+        current_time = datetime.datetime.utcnow()
+        expiration_time = crypto.get_expiration_time(current_time)
+        assert expiration_time == current_time + datetime.timedelta(
+            minutes=crypto.EXPIRATION_MINUTES * (1 - crypto.MAX_EXPIRATION_JITTER_FRACTION)
+        )
+
+
+class TestExperimentCache:
+    async def test_lookups_are_served_from_cache_until_invalidated(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_2_created_by_user_1_for_updates_tests: ExperimentPublic,
+    ) -> None:
+        cache = ExperimentsRepository.cache
+        experiment_id = test_experiment_2_created_by_user_1_for_updates_tests.id
+        path = app.url_path_for("experiments:get-experiment-by-id", id=experiment_id)
+
+        res = await client_wt_auth_user_1.get(path)
+        assert res.status_code == status.HTTP_200_OK
+        hits = cache.hits
+        res = await client_wt_auth_user_1.get(path)
+        assert res.status_code == status.HTTP_200_OK
+        assert cache.hits == hits + 1
+        assert 0 < cache.hit_ratio <= 1
+
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:update-experiment-by-id", id=experiment_id),
+            json={"experiment_update": {"coordinator_port": 1234}},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        res = await client_wt_auth_user_1.get(path)
+        assert ExperimentPublic(**res.json()).coordinator_port == 1234
+
+    async def test_missing_experiments_are_cached(self, app: FastAPI, client_wt_auth_user_1: AsyncClient) -> None:
+        cache = ExperimentsRepository.cache
+        experiments_repo = ExperimentsRepository(app.state._db)
+
+        assert await experiments_repo.get_experiment_by_id(id=123456789) is None
+        negative_hits, misses = cache.negative_hits, cache.misses
+        assert await experiments_repo.get_experiment_by_id(id=123456789) is None
+        assert cache.negative_hits == negative_hits + 1
+        assert cache.misses == misses
+
+
+class TestExperimentViews:
+    async def test_only_the_signing_view_holds_the_private_key(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+    ) -> None:
+        experiments_repo = ExperimentsRepository(app.state._db)
+
+        experiment = await experiments_repo.get_experiment_by_id(id=test_experiment_1_created_by_user_1.id)
+        assert not hasattr(experiment, "auth_server_public_key")
+        assert not hasattr(experiment, "auth_server_private_key")
+
+        join_view = await experiments_repo.get_experiment_join_view_by_id(id=test_experiment_1_created_by_user_1.id)
+        assert join_view.auth_server_public_key is not None
+        assert not hasattr(join_view, "auth_server_private_key")
+
+        private_key = await experiments_repo.get_experiment_private_key(experiment=join_view)
+        assert crypto.save_public_key(private_key.public_key()) == join_view.auth_server_public_key
+
+    async def test_private_keys_are_evicted_on_delete_and_after_their_ttl(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        moonlanding_user_1: MoonlandingUser,
+        monkeypatch,
+    ) -> None:
+        experiments_repo = ExperimentsRepository(app.state._db)
+        experiment = await experiments_routes.create_new_experiment(
+            new_experiment=ExperimentCreatePublic(organization_name="org_1", model_name="model_signing_key_eviction"),
+            experiments_repo=experiments_repo,
+            user=moonlanding_user_1,
+        )
+        join_view = await experiments_repo.get_experiment_join_view_by_id(id=experiment.id)
+        private_key = await experiments_repo.get_experiment_private_key(experiment=join_view)
+        signing_keys = ExperimentsRepository.signing_keys
+        assert signing_keys.get(join_view.key_id) is private_key
+
+        monkeypatch.setattr(signing_keys, "ttl", 0)
+        signing_keys.discard(experiment.id)
+        await experiments_repo.get_experiment_private_key(experiment=join_view)
+        await asyncio.sleep(0.01)
+        assert signing_keys.get(join_view.key_id) is None
+
+        monkeypatch.undo()
+        await experiments_repo.get_experiment_private_key(experiment=join_view)
+        await experiments_repo.delete_experiment_by_id(id=experiment.id)
+        assert signing_keys.get(join_view.key_id) is None
+        assert await experiments_repo.get_experiment_private_key(experiment=join_view) is None
+
+
+class TestListExperiments:
+    async def test_pages_cover_every_experiment_of_the_user_organizations(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_2: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+        test_experiment_1_created_by_user_2: ExperimentPublic,
+    ) -> None:
+        res = await client_wt_auth_user_2.get(app.url_path_for("experiments:list-experiments"), params={"limit": 500})
+        assert res.status_code == status.HTTP_200_OK
+        everything = res.json()
+        assert everything["next_cursor"] is None
+
+        listed = [(exp["organization_name"], exp["model_name"], exp["id"]) for exp in everything["experiments"]]
+        assert listed == sorted(listed)
+        assert {org for org, _, _ in listed} <= {"org_1", "org_3"}
+        assert test_experiment_1_created_by_user_1.id in [id for _, _, id in listed]
+        assert test_experiment_1_created_by_user_2.id in [id for _, _, id in listed]
+
+        paged, cursor = [], None
+        while True:
+            params = {"limit": 1} if cursor is None else {"limit": 1, "cursor": cursor}
+            res = await client_wt_auth_user_2.get(app.url_path_for("experiments:list-experiments"), params=params)
+            assert res.status_code == status.HTTP_200_OK
+            page = res.json()
+            assert len(page["experiments"]) <= 1
+            paged += [(exp["organization_name"], exp["model_name"], exp["id"]) for exp in page["experiments"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert paged == listed
+
+    @pytest.mark.parametrize(
+        "params",
+        (
+            {"cursor": "not-a-cursor"},
+            {"cursor": encode_cursor(["org_1", "model_1"])},
+            {"cursor": encode_cursor([1, {}, "x"])},
+            {"cursor": encode_cursor(["org_1", "model_1", "1"])},
+            {"cursor": encode_cursor(["org_1", "model_1", True])},
+            {"limit": 0},
+            {"limit": 100000},
+        ),
+    )
+    async def test_invalid_pagination_params_raise_error(
+        self, app: FastAPI, client_wt_auth_user_2: AsyncClient, params: dict
+    ) -> None:
+        res = await client_wt_auth_user_2.get(app.url_path_for("experiments:list-experiments"), params=params)
+        assert res.status_code in (status.HTTP_400_BAD_REQUEST, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+class TestExperimentChanges:
+    @pytest.fixture(autouse=True)
+    def no_changes_delay(self, monkeypatch) -> None:
+        monkeypatch.setattr(experiments_routes, "EXPERIMENT_CHANGES_DELAY_SECONDS", 0)
+
+    @staticmethod
+    async def sync(app: FastAPI, client: AsyncClient, cursor: str = None, limit: int = 500) -> dict:
+        params = {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+        res = await client.get(app.url_path_for("experiments:list-experiment-changes"), params=params)
+        assert res.status_code == status.HTTP_200_OK
+        return res.json()
+
+    async def sync_changes(self, app: FastAPI, client: AsyncClient, cursor: str) -> dict:
+        """Sync until changes come, which takes up to a second as syncs stop at the last whole second"""
+        for _ in range(30):
+            changes = await self.sync(app, client, cursor=cursor)
+            if changes["experiments"] or changes["deleted"]:
+                break
+            await asyncio.sleep(0.1)
+        return changes
+
+    async def test_syncs_return_the_changes_since_the_previous_one(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient
+    ) -> None:
+        everything = await self.sync(app, client_wt_auth_user_1)
+        assert not everything["has_more"]
+        assert everything["deleted"] == []
+        assert {exp["organization_name"] for exp in everything["experiments"]} <= {
+            "org_1",
+            "org_2",
+            "organization_a",
+            "Organization_a",
+        }
+
+        # Small pages list the same experiments, in the order of their last change
+        paged, cursor = [], None
+        while True:
+            page = await self.sync(app, client_wt_auth_user_1, cursor=cursor, limit=1)
+            paged += [exp["id"] for exp in page["experiments"]]
+            cursor = page["next_cursor"]
+            if not page["has_more"]:
+                break
+        assert paged == [exp["id"] for exp in everything["experiments"]]
+
+        res = await client_wt_auth_user_1.post(
+            app.url_path_for("experiments:create-experiment"),
+            json={"new_experiment": {"organization_name": "org_1", "model_name": "model_changes"}},
+        )
+        assert res.status_code == status.HTTP_201_CREATED
+        experiment_id = res.json()["id"]
+        # Changes made by earlier tests in the second the first sync stopped at may come along
+        changes = await self.sync_changes(app, client_wt_auth_user_1, cursor=cursor)
+        assert experiment_id in [exp["id"] for exp in changes["experiments"]]
+        assert experiment_id not in [exp["id"] for exp in changes["deleted"]]
+
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:update-experiment-by-id", id=experiment_id),
+            json={"experiment_update": {"coordinator_port": 4242}},
+        )
+        assert res.status_code == status.HTTP_200_OK
+        changes = await self.sync_changes(app, client_wt_auth_user_1, cursor=changes["next_cursor"])
+        assert [(exp["id"], exp["coordinator_port"]) for exp in changes["experiments"]] == [(experiment_id, 4242)]
+        assert changes["deleted"] == []
+
+        res = await client_wt_auth_user_1.delete(
+            app.url_path_for("experiments:delete-experiment-by-id", id=experiment_id)
+        )
+        assert res.status_code == status.HTTP_200_OK
+        changes = await self.sync_changes(app, client_wt_auth_user_1, cursor=changes["next_cursor"])
+        assert changes["experiments"] == []
+        assert [(exp["id"], exp["organization_name"], exp["model_name"]) for exp in changes["deleted"]] == [
+            (experiment_id, "org_1", "model_changes")
+        ]
+
+        changes = await self.sync(app, client_wt_auth_user_1, cursor=changes["next_cursor"])
+        assert changes["experiments"] == [] and changes["deleted"] == []
+        assert not changes["has_more"]
+
+    async def test_experiments_moved_out_of_an_organization_are_deleted_from_it(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, moonlanding_user_2: MoonlandingUser
+    ) -> None:
+        res = await client_wt_auth_user_1.post(
+            app.url_path_for("experiments:create-experiment"),
+            json={"new_experiment": {"organization_name": "org_1", "model_name": "model_changes_moved"}},
+        )
+        experiment_id = res.json()["id"]
+
+        # user 2 reads org_1 but not organization_a, to which user 1 moves the experiment
+        previous_override = app.dependency_overrides[authenticate]
+        app.dependency_overrides[authenticate] = lambda: moonlanding_user_2
+        try:
+            cursor_user_2 = (await self.sync(app, client_wt_auth_user_1))["next_cursor"]
+        finally:
+            app.dependency_overrides[authenticate] = previous_override
+        cursor_user_1 = (await self.sync(app, client_wt_auth_user_1))["next_cursor"]
+
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:update-experiment-by-id", id=experiment_id),
+            json={"experiment_update": {"organization_name": "organization_a"}},
+        )
+        assert res.status_code == status.HTTP_200_OK
+
+        changes = await self.sync_changes(app, client_wt_auth_user_1, cursor=cursor_user_1)
+        assert experiment_id in [exp["id"] for exp in changes["experiments"]]
+        assert experiment_id not in [exp["id"] for exp in changes["deleted"]]
+
+        app.dependency_overrides[authenticate] = lambda: moonlanding_user_2
+        try:
+            changes = await self.sync_changes(app, client_wt_auth_user_1, cursor=cursor_user_2)
+        finally:
+            app.dependency_overrides[authenticate] = previous_override
+        assert experiment_id not in [exp["id"] for exp in changes["experiments"]]
+        assert (experiment_id, "org_1") in [(exp["id"], exp["organization_name"]) for exp in changes["deleted"]]
+
+    @pytest.mark.parametrize(
+        "cursor, status_code",
+        (
+            ("not-a-cursor", status.HTTP_400_BAD_REQUEST),
+            (encode_cursor(["2021-01-01T00:00:00+00:00", "1", "2021-01-01T00:00:00+00:00", 0]), 400),
+            (encode_cursor(["yesterday", 1, "2021-01-01T00:00:00+00:00", 0]), 400),
+            (encode_cursor(["2021-01-01T00:00:00+00:00", 1, "2021-01-01T00:00:00+00:00", 0]), status.HTTP_410_GONE),
+        ),
+    )
+    async def test_invalid_or_expired_cursors_raise_error(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, cursor: str, status_code: int
+    ) -> None:
+        res = await client_wt_auth_user_1.get(
+            app.url_path_for("experiments:list-experiment-changes"), params={"cursor": cursor}
+        )
+        assert res.status_code == status_code
+
+    async def test_tombstones_are_purged_past_retention_in_the_background(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, moonlanding_user_1: MoonlandingUser
+    ) -> None:
+        await stop_tombstone_purger(app)
+        db = app.state._db
+        experiments_repo = ExperimentsRepository(db)
+
+        def purges() -> int:
+            metrics = db.query_stats.queries.get("experiments.purge_experiment_tombstones")
+            return metrics.calls if metrics is not None else 0
+
+        purges_before = purges()
+        ids = []
+        for model_name in ("model_purged_tombstone", "model_kept_tombstone"):
+            experiment = await experiments_routes.create_new_experiment(
+                new_experiment=ExperimentCreatePublic(organization_name="org_1", model_name=model_name),
+                experiments_repo=experiments_repo,
+                user=moonlanding_user_1,
+            )
+            ids.append(experiment.id)
+        for id in ids:
+            await experiments_repo.delete_experiment_by_id(id=id)
+        # Deleting does not purge
+        assert purges() == purges_before
+
+        long_ago = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+            days=EXPERIMENT_TOMBSTONE_RETENTION_DAYS + 1
+        )
+        await db.execute(
+            query="UPDATE experiment_tombstones SET deleted_at = :deleted_at WHERE experiment_id = :experiment_id;",
+            values={"deleted_at": experiments_repo.timestamp(long_ago), "experiment_id": ids[0]},
+        )
+        purger = TombstonePurger(
+            lambda: get_connected_database(app),
+            purge_interval=3600,
+            retention_days=EXPERIMENT_TOMBSTONE_RETENTION_DAYS,
+        )
+        await purger.purge()
+        remaining = await db.fetch_all(
+            query="SELECT experiment_id FROM experiment_tombstones WHERE experiment_id IN (:purged, :kept);",
+            values={"purged": ids[0], "kept": ids[1]},
+        )
+        assert [record["experiment_id"] for record in remaining] == [ids[1]]
+
+
+@pytest.fixture
+async def search_experiments(
+    db: Database, moonlanding_user_1: MoonlandingUser, moonlanding_user_2: MoonlandingUser
+) -> dict:
+    experiments_repo = ExperimentsRepository(db)
+    experiments = {}
+    for organization_name, model_name, user in (
+        ("org_1", "searchable_bert", moonlanding_user_1),
+        ("org_1", "searchable_bert_large", moonlanding_user_1),
+        ("org_1", "tiny_searchable_bert", moonlanding_user_1),
+        ("organization_a", "unrelated_model", moonlanding_user_1),
+        ("org_3", "searchable_bert_hidden", moonlanding_user_2),
+    ):
+        experiment = await experiments_repo.get_experiment_by_organization_and_model_name(
+            organization_name=organization_name, model_name=model_name
+        )
+        if not experiment:
+            experiment = await experiments_routes.create_new_experiment(
+                new_experiment=ExperimentCreatePublic(organization_name=organization_name, model_name=model_name),
+                experiments_repo=experiments_repo,
+                user=user,
+            )
+        experiments[model_name] = experiment
+    return experiments
+
+
+class TestSearchExperiments:
+    async def test_matches_are_ranked_and_restricted_to_the_user_organizations(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, search_experiments: dict
+    ) -> None:
+        res = await client_wt_auth_user_1.get(
+            app.url_path_for("experiments:search-experiments"), params={"query": "SEARCHABLE_bert"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        page = res.json()
+        assert page["next_cursor"] is None
+
+        # Exact match, then prefix, then substring, which SQLite does not match
+        expected = ["searchable_bert", "searchable_bert_large", "tiny_searchable_bert"]
+        if app.state._db.url.dialect == "sqlite":
+            expected = expected[:2]
+        assert [exp["model_name"] for exp in page["experiments"]] == expected
+
+        paged, cursor = [], None
+        while True:
+            params = {"query": "searchable_bert", "limit": 1}
+            res = await client_wt_auth_user_1.get(
+                app.url_path_for("experiments:search-experiments"),
+                params=params if cursor is None else {**params, "cursor": cursor},
+            )
+            assert res.status_code == status.HTTP_200_OK
+            paged += [exp["model_name"] for exp in res.json()["experiments"]]
+            cursor = res.json()["next_cursor"]
+            if cursor is None:
+                break
+        assert paged == expected
+
+    async def test_organization_names_are_searched(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, search_experiments: dict
+    ) -> None:
+        res = await client_wt_auth_user_1.get(
+            app.url_path_for("experiments:search-experiments"), params={"query": "organization_a"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert search_experiments["unrelated_model"].id in [exp["id"] for exp in res.json()["experiments"]]
+
+    async def test_wildcards_are_matched_literally(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, search_experiments: dict
+    ) -> None:
+        res = await client_wt_auth_user_1.get(
+            app.url_path_for("experiments:search-experiments"), params={"query": "searchable%bert"}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["experiments"] == []
+
+    @pytest.mark.parametrize(
+        "params",
+        (
+            {},
+            {"query": "ab"},
+            {"query": "searchable", "cursor": "not-a-cursor"},
+            {"query": "searchable", "cursor": encode_cursor([0, "model", "org_1"])},
+            {"query": "searchable", "cursor": encode_cursor([0, {}, "org_1", 1])},
+            {"query": "searchable", "cursor": encode_cursor([0, "model", 1, 1])},
+            {"query": "searchable", "cursor": encode_cursor(["0", "model", "org_1", 1])},
+            {"query": "x" * 101},
+        ),
+    )
+    async def test_invalid_search_params_raise_error(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, params: dict
+    ) -> None:
+        res = await client_wt_auth_user_1.get(app.url_path_for("experiments:search-experiments"), params=params)
+        assert res.status_code in (status.HTTP_400_BAD_REQUEST, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+@pytest.fixture
+async def coordinated_experiments(
+    db: Database, moonlanding_user_1: MoonlandingUser, moonlanding_user_2: MoonlandingUser
+) -> List[ExperimentPublic]:
+    experiments_repo = ExperimentsRepository(db)
+    experiments = []
+    for organization_name, model_name, user in (
+        ("org_1", "coordinated_model_a", moonlanding_user_1),
+        ("org_1", "coordinated_model_b", moonlanding_user_1),
+        ("org_3", "coordinated_model_c", moonlanding_user_2),
+    ):
+        experiment = await experiments_repo.get_experiment_by_organization_and_model_name(
+            organization_name=organization_name, model_name=model_name
+        )
+        if not experiment:
+            experiment = await experiments_routes.create_new_experiment(
+                new_experiment=ExperimentCreatePublic(organization_name=organization_name, model_name=model_name),
+                experiments_repo=experiments_repo,
+                user=user,
+            )
+        experiments.append(experiment)
+    return experiments
+
+
+class TestUpdateCoordinators:
+    async def test_coordinators_of_several_experiments_are_updated(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, coordinated_experiments: List[ExperimentPublic]
+    ) -> None:
+        experiment_a, experiment_b, _ = coordinated_experiments
+        # Cached before the update, which must evict it
+        await client_wt_auth_user_1.get(app.url_path_for("experiments:get-experiment-by-id", id=experiment_a.id))
+
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:update-coordinators"),
+            json={
+                "coordinators_update": {
+                    "experiments": [
+                        {"id": experiment_a.id, "coordinator_ip": "10.0.0.1", "coordinator_port": 1000},
+                        {"id": experiment_b.id, "coordinator_ip": "::1", "coordinator_port": 1001},
+                    ]
+                }
+            },
+        )
+        assert res.status_code == status.HTTP_200_OK
+        updated = {exp["id"]: (exp["coordinator_ip"], exp["coordinator_port"]) for exp in res.json()["experiments"]}
+        assert updated == {experiment_a.id: ("10.0.0.1", 1000), experiment_b.id: ("::1", 1001)}
+
+        res = await client_wt_auth_user_1.get(app.url_path_for("experiments:get-experiment-by-id", id=experiment_a.id))
+        assert (res.json()["coordinator_ip"], res.json()["coordinator_port"]) == ("10.0.0.1", 1000)
+
+    async def test_no_experiment_is_updated_unless_all_can_be(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, coordinated_experiments: List[ExperimentPublic]
+    ) -> None:
+        experiment_a, _, experiment_c = coordinated_experiments
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:update-coordinators"),
+            json={
+                "coordinators_update": {
+                    "experiments": [
+                        {"id": experiment_a.id, "coordinator_ip": "10.0.0.9", "coordinator_port": 9000},
+                        {"id": experiment_c.id, "coordinator_ip": "10.0.0.9", "coordinator_port": 9000},
+                    ]
+                }
+            },
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+        assert str([experiment_c.id]) in res.json()["detail"]
+
+        res = await client_wt_auth_user_1.get(app.url_path_for("experiments:get-experiment-by-id", id=experiment_a.id))
+        assert res.json()["coordinator_ip"] != "10.0.0.9"
+
+    async def test_experiments_of_a_coordinator_are_moved(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        moonlanding_user_2: MoonlandingUser,
+        coordinated_experiments: List[ExperimentPublic],
+    ) -> None:
+        experiment_a, experiment_b, experiment_c = coordinated_experiments
+        coordinators = [
+            {"id": experiment.id, "coordinator_ip": "10.0.1.1", "coordinator_port": 1100}
+            for experiment in (experiment_a, experiment_b)
+        ]
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:update-coordinators"),
+            json={"coordinators_update": {"experiments": coordinators}},
+        )
+        assert res.status_code == status.HTTP_200_OK
+
+        # The experiment of org_3 has the same coordinator, but user 1 is not an admin of org_3
+        previous_override = app.dependency_overrides[authenticate]
+        app.dependency_overrides[authenticate] = lambda: moonlanding_user_2
+        try:
+            res = await client_wt_auth_user_1.put(
+                app.url_path_for("experiments:update-coordinators"),
+                json={
+                    "coordinators_update": {
+                        "experiments": [
+                            {"id": experiment_c.id, "coordinator_ip": "10.0.1.1", "coordinator_port": 1100}
+                        ]
+                    }
+                },
+            )
+            assert res.status_code == status.HTTP_200_OK
+        finally:
+            app.dependency_overrides[authenticate] = previous_override
+
+        move = {
+            "coordinator_ip": "10.0.1.1",
+            "coordinator_port": 1100,
+            "new_coordinator_ip": "10.0.2.2",
+            "new_coordinator_port": 2200,
+        }
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:update-coordinators"), json={"coordinators_update": {"move": move}}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        moved = {exp["id"]: (exp["coordinator_ip"], exp["coordinator_port"]) for exp in res.json()["experiments"]}
+        assert moved == {experiment_a.id: ("10.0.2.2", 2200), experiment_b.id: ("10.0.2.2", 2200)}
+
+        experiment = await ExperimentsRepository(app.state._db).get_experiment_by_id(id=experiment_c.id)
+        assert (str(experiment.coordinator_ip), experiment.coordinator_port) == ("10.0.1.1", 1100)
+
+    @pytest.mark.parametrize(
+        "coordinators_update",
+        (
+            {},
+            {"experiments": []},
+            {"experiments": [{"id": 1, "coordinator_port": 1}, {"id": 1, "coordinator_port": 2}]},
+            {"experiments": [{"id": 1, "coordinator_port": 100000}]},
+            {
+                "experiments": [{"id": 1, "coordinator_port": 1}],
+                "move": {
+                    "coordinator_ip": "10.0.1.1",
+                    "coordinator_port": 1100,
+                    "new_coordinator_ip": "10.0.2.2",
+                    "new_coordinator_port": 2200,
+                },
+            },
+        ),
+    )
+    async def test_invalid_updates_raise_error(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, coordinators_update: dict
+    ) -> None:
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:update-coordinators"), json={"coordinators_update": coordinators_update}
+        )
+        assert res.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+class TestConditionalRequests:
+    async def test_unchanged_experiments_are_not_modified(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, test_experiment_1_created_by_user_1: ExperimentPublic
+    ) -> None:
+        experiment = test_experiment_1_created_by_user_1
+        urls = [
+            app.url_path_for("experiments:get-experiment-by-id", id=experiment.id),
+            app.url_path_for("experiments:get-experiment-by-organization-and-model-name")
+            + f"?organization_name={experiment.organization_name}&model_name={experiment.model_name}",
+        ]
+        for url in urls:
+            res = await client_wt_auth_user_1.get(url)
+            assert res.status_code == status.HTTP_200_OK
+            etag = res.headers["ETag"]
+            assert etag.startswith(f'"{experiment.id}-')
+
+            res = await client_wt_auth_user_1.get(url, headers={"If-None-Match": f'"other", {etag}'})
+            assert res.status_code == status.HTTP_304_NOT_MODIFIED
+            assert res.headers["ETag"] == etag
+            assert res.content == b""
+
+            res = await client_wt_auth_user_1.get(url, headers={"If-None-Match": '"other"'})
+            assert res.status_code == status.HTTP_200_OK
+
+    async def test_updates_and_deletions_honor_if_match(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, db: Database, moonlanding_user_1: MoonlandingUser
+    ) -> None:
+        experiment = await experiments_routes.create_new_experiment(
+            new_experiment=ExperimentCreatePublic(organization_name="org_1", model_name="conditional_model"),
+            experiments_repo=ExperimentsRepository(db),
+            user=moonlanding_user_1,
+        )
+        url = app.url_path_for("experiments:update-experiment-by-id", id=experiment.id)
+        res = await client_wt_auth_user_1.get(url)
+        etag = res.headers["ETag"]
+
+        res = await client_wt_auth_user_1.put(
+            url, json={"experiment_update": {"coordinator_port": 1234}}, headers={"If-Match": etag}
+        )
+        assert res.status_code == status.HTTP_200_OK
+        new_etag = res.headers["ETag"]
+        assert new_etag != etag
+
+        # The experiment changed since `etag`: the update is not applied
+        for if_match in (etag, f"W/{new_etag}", '"not-an-etag"'):
+            res = await client_wt_auth_user_1.put(
+                url, json={"experiment_update": {"coordinator_port": 4321}}, headers={"If-Match": if_match}
+            )
+            assert res.status_code == status.HTTP_412_PRECONDITION_FAILED
+        res = await client_wt_auth_user_1.get(url, headers={"If-None-Match": new_etag})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+
+        res = await client_wt_auth_user_1.delete(url, headers={"If-Match": etag})
+        assert res.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+        res = await client_wt_auth_user_1.delete(url, headers={"If-Match": f"{etag}, {new_etag}"})
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["coordinator_port"] == 1234
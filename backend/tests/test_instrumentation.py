@@ -0,0 +1,119 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import logging
+
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.db.instrumentation import REDACTED, UNNAMED_QUERY, InstrumentedDatabase, QueryStats, query_name, redact
+from app.db.repositories import experiments, revocations
+from app.db.sqlite import is_sqlite
+from app.models.experiment import ExperimentPublic
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestQueryNames:
+    def test_queries_are_named_after_their_constant(self) -> None:
+        assert query_name(experiments.GET_EXPERIMENT_BY_ID_QUERY) == "experiments.get_experiment_by_id"
+        assert query_name(revocations.LOCK_EXPERIMENT_QUERY) == "revocations.lock_experiment"
+        assert query_name("SELECT 1;") == UNNAMED_QUERY
+
+    def test_secrets_are_redacted(self) -> None:
+        redacted = redact(
+            {
+                "id": 1,
+                "auth_server_private_key": "pem",
+                "coordinator_ip": "127.0.0.1",
+                "data": b"\x00",
+                "ids": [*range(20)],
+            }
+        )
+        assert redacted["id"] == 1
+        assert redacted["auth_server_private_key"] == REDACTED
+        assert redacted["coordinator_ip"] == "127.0.0.1"
+        assert redacted["data"] == REDACTED
+        assert redacted["ids"][-1] == "... (20 items)"
+
+
+class TestQueryStats:
+    async def test_listing_is_recorded(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+        monitoring_headers: dict,
+    ) -> None:
+        res = await client_wt_auth_user_1.get(app.url_path_for("experiments:list-experiments"))
+        assert res.status_code == status.HTTP_200_OK
+        listed = len(res.json()["experiments"])
+
+        res = await client_wt_auth_user_1.get(
+            app.url_path_for("monitoring:get-query-stats"), headers=monitoring_headers
+        )
+        assert res.status_code == status.HTTP_200_OK
+        listing = "list_experiments_by_organizations"
+        if is_sqlite(app.state._db):
+            listing = f"sqlite_{listing}"
+        metrics = res.json()["queries"][f"experiments.{listing}"]
+        assert metrics["calls"] >= 1
+        assert metrics["rows"] >= listed > 0
+        assert metrics["latency_seconds"]["count"] == metrics["calls"]
+
+    @pytest.mark.postgresql
+    async def test_slow_queries_are_logged_and_explained(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+        caplog: pytest.LogCaptureFixture,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        # The logging configuration of alembic, applied by the migrations, disables the loggers existing at the time
+        monkeypatch.setattr(logging.getLogger("app.db.instrumentation"), "disabled", False)
+        # Every query is slow, and only the two slowest are sampled. A database of its own keeps the background tasks
+        # of the app from adding samples.
+        db = InstrumentedDatabase(str(app.state._db.url), query_stats=QueryStats(1e-9, max_samples=2, explain=True))
+        await db.connect()
+        try:
+            with caplog.at_level(logging.WARNING, logger="app.db.instrumentation"):
+                await db.fetch_val(query="SELECT CAST(:secret_key AS TEXT);", values={"secret_key": "hunter2"})
+                await db.fetch_one(
+                    query=experiments.GET_EXPERIMENT_BY_ID_QUERY, values={"id": test_experiment_1_created_by_user_1.id}
+                )
+                async with db.transaction(force_rollback=True):
+                    await db.execute(
+                        query=revocations.LOCK_EXPERIMENT_QUERY,
+                        values={"experiment_id": test_experiment_1_created_by_user_1.id},
+                    )
+        finally:
+            await db.disconnect()
+        samples = db.query_stats.slow_samples()
+
+        assert "hunter2" not in caplog.text
+        assert "Slow query experiments.get_experiment_by_id" in caplog.text
+        assert len(samples) == 2
+        assert samples[0]["duration_seconds"] >= samples[1]["duration_seconds"]
+        assert f"'secret_key': '{REDACTED}'" in caplog.text
+        for sample in samples:
+            # Parameters may identify users, and are only logged
+            assert "values" not in sample
+            if sample["name"] == "revocations.lock_experiment":
+                # Locking rows again is not free of side effects
+                assert sample["plan"] is None
+            else:
+                assert sample["plan"][0]["Plan"]["Actual Loops"] >= 1
@@ -0,0 +1,151 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+import datetime
+from typing import Tuple
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.api.dependencies import crypto
+from app.db import tasks
+from app.db.repositories.join_history import LIST_PARTITIONS_QUERY, JoinHistoryRepository
+from app.models.experiment import ExperimentPublic
+from app.models.experiment_join import ExperimentJoinInput
+from app.services.join_history import JoinHistoryBuffer
+
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.postgresql]
+
+LIST_EXPERIMENT_JOINS_QUERY = """
+    SELECT username, peer_key_digest
+    FROM join_history
+    WHERE experiment_id = :experiment_id
+    AND joined_at >= :since;
+"""
+
+
+class TestJoinHistory:
+    async def test_joins_are_recorded(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_2: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+        test_experiment_join_input_1_by_user_2: Tuple[ExperimentJoinInput, rsa.RSAPrivateKey],
+        monitoring_headers: dict,
+    ) -> None:
+        join_input, _ = test_experiment_join_input_1_by_user_2
+        values = join_input.dict()
+        values["peer_public_key"] = values["peer_public_key"].decode("utf-8")
+        since = datetime.datetime.now(datetime.timezone.utc)
+        res = await client_wt_auth_user_2.put(
+            app.url_path_for("experiments:join-experiment-by-id", id=test_experiment_1_created_by_user_1.id),
+            json={"experiment_join_input": values},
+        )
+        assert res.status_code == status.HTTP_200_OK
+
+        values = {"experiment_id": test_experiment_1_created_by_user_1.id, "since": since}
+        joins = []
+        for _ in range(100):
+            joins = await app.state._db.fetch_all(query=LIST_EXPERIMENT_JOINS_QUERY, values=values)
+            if joins:
+                break
+            await asyncio.sleep(0.05)
+        assert [(join["username"], join["peer_key_digest"]) for join in joins] == [
+            ("User2", crypto.peer_key_digest(join_input.peer_public_key))
+        ]
+
+        res = await client_wt_auth_user_2.get(
+            app.url_path_for("monitoring:get-join-history-stats"), headers=monitoring_headers
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["written"] >= 1
+
+    async def test_joins_are_dropped_when_the_queue_is_full_and_drained_on_stop(
+        self, app: FastAPI, client_wt_auth_user_2: AsyncClient, test_experiment_1_created_by_user_1: ExperimentPublic
+    ) -> None:
+        async def get_database():
+            return app.state._db
+
+        join_history = JoinHistoryBuffer(get_database, maxsize=1, batch_size=10, flush_interval=60, retention_days=90)
+        join_history.start()
+        since = datetime.datetime.now(datetime.timezone.utc)
+        assert join_history.record(test_experiment_1_created_by_user_1.id, "queued_user", None)
+        assert not join_history.record(test_experiment_1_created_by_user_1.id, "dropped_user", None)
+        await join_history.stop()
+
+        stats = join_history.stats()
+        assert (stats["enqueued"], stats["written"], stats["dropped"], stats["queue_depth"]) == (1, 1, 1, 0)
+        joins = await app.state._db.fetch_all(
+            query=LIST_EXPERIMENT_JOINS_QUERY,
+            values={"experiment_id": test_experiment_1_created_by_user_1.id, "since": since},
+        )
+        assert [join["username"] for join in joins] == ["queued_user"]
+
+    async def test_partitions_are_created_ahead_and_dropped_past_retention(
+        self, app: FastAPI, client_wt_auth_user_2: AsyncClient
+    ) -> None:
+        # The partitions of the app would otherwise be maintained meanwhile, with another retention
+        await tasks.stop_join_history(app)
+
+        async def get_database():
+            return app.state._db
+
+        async def list_partitions():
+            return {record["name"] for record in await app.state._db.fetch_all(query=LIST_PARTITIONS_QUERY)}
+
+        join_history = JoinHistoryBuffer(get_database, maxsize=1, batch_size=1, flush_interval=1, retention_days=30)
+        await join_history.maintain_partitions(today=datetime.date(2000, 1, 10))
+        assert {"join_history_20000110", "join_history_20000111", "join_history_20000112"} <= await list_partitions()
+
+        await join_history.maintain_partitions(today=datetime.date(2000, 3, 1))
+        partitions = await list_partitions()
+        assert not {"join_history_20000110", "join_history_20000111", "join_history_20000112"} & partitions
+        assert {"join_history_20000301", "join_history_default"} <= partitions
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        assert f"join_history_{today:%Y%m%d}" in partitions
+
+        for day in ("20000301", "20000302", "20000303"):
+            await app.state._db.execute(query=f"DROP TABLE join_history_{day};")
+
+    async def test_partitions_take_the_joins_of_their_day_from_the_default_partition(
+        self, app: FastAPI, client_wt_auth_user_2: AsyncClient, test_experiment_1_created_by_user_1: ExperimentPublic
+    ) -> None:
+        await tasks.stop_join_history(app)
+        db = app.state._db
+        join_history_repo = JoinHistoryRepository(db)
+        # As if the partitions had not been maintained for a while
+        joined_at = datetime.datetime(2000, 6, 1, 12, tzinfo=datetime.timezone.utc)
+        other_day = datetime.datetime(2000, 6, 2, 12, tzinfo=datetime.timezone.utc)
+        in_june_2000 = "joined_at >= '2000-06-01' AND joined_at < '2000-07-01'"
+        await join_history_repo.insert_joins(
+            [
+                (test_experiment_1_created_by_user_1.id, "User2", None, joined_at),
+                (test_experiment_1_created_by_user_1.id, "User2", None, other_day),
+            ]
+        )
+        try:
+            assert await join_history_repo.create_partitions(datetime.date(2000, 6, 1), 1) == ["join_history_20000601"]
+            assert await db.fetch_val(query="SELECT count(*) FROM join_history_20000601;") == 1
+            assert await db.fetch_val(query=f"SELECT count(*) FROM join_history_default WHERE {in_june_2000};") == 1
+            assert await db.fetch_val(query=f"SELECT count(*) FROM join_history WHERE {in_june_2000};") == 2
+
+            # Existing partitions are left alone
+            assert await join_history_repo.create_partitions(datetime.date(2000, 6, 1), 1) == []
+        finally:
+            await db.execute(query="DROP TABLE IF EXISTS join_history_20000601;")
+            await db.execute(query=f"DELETE FROM join_history_default WHERE {in_june_2000};")
@@ -0,0 +1,155 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import datetime
+from typing import Tuple
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.core.metrics import HyperLogLog
+from app.db.repositories.join_stats import JoinStatsRepository
+from app.models.experiment import ExperimentPublic
+from app.models.experiment_join import ExperimentJoinInput
+from app.services.join_stats import JoinStatsAggregator, minute_of
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestHyperLogLog:
+    def test_count_is_close_to_the_number_of_distinct_values(self) -> None:
+        for distinct in (0, 1, 10, 1000, 20000):
+            hll = HyperLogLog()
+            for value in range(distinct):
+                hll.add(f"peer-{value}")
+                hll.add(f"peer-{value}")
+            assert abs(hll.count() - distinct) <= max(1, 0.1 * distinct)
+
+    def test_merge_estimates_the_union(self) -> None:
+        first, second = HyperLogLog(), HyperLogLog()
+        for value in range(1000):
+            first.add(f"peer-{value}")
+        for value in range(500, 1500):
+            second.add(f"peer-{value}")
+        first.merge(HyperLogLog(registers=bytes(second)))
+        assert abs(first.count() - 1500) <= 150
+
+        with pytest.raises(ValueError):
+            first.merge(HyperLogLog(precision=4))
+
+
+class TestJoinStats:
+    async def test_joins_are_counted_per_minute_and_flushed_without_double_counting(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, test_experiment_1_created_by_user_1: ExperimentPublic
+    ) -> None:
+        async def get_database():
+            return app.state._db
+
+        experiment_id = test_experiment_1_created_by_user_1.id
+        now = datetime.datetime.now(datetime.timezone.utc)
+        past_minute = minute_of(now) - datetime.timedelta(minutes=1)
+        join_stats = JoinStatsAggregator(get_database, flush_interval=60, retention_days=30)
+        join_stats.record(experiment_id, "peer-1", now=past_minute)
+        join_stats.record(experiment_id, "peer-1", now=now)
+        join_stats.record(experiment_id, "peer-2", now=now)
+        await join_stats.flush(now=now)
+        join_stats.record(experiment_id, "peer-3", now=now)
+        await join_stats.flush(now=now)
+
+        # The past window is forgotten once written, the current one is kept
+        assert list(join_stats.windows) == [(experiment_id, minute_of(now))]
+        rows = await JoinStatsRepository(app.state._db).list_join_stats(experiment_id=experiment_id, since=past_minute)
+        own_rows = [(minute, joins) for minute, worker_id, joins, _ in rows if worker_id == join_stats.worker_id]
+        assert own_rows == [(past_minute, 1), (minute_of(now), 3)]
+
+        merged = join_stats.merge(experiment_id, past_minute, rows)
+        assert {minute: (joins, peers.count()) for minute, (joins, peers) in merged.items()}[minute_of(now)][1] >= 3
+        assert merged[past_minute][0] >= 1
+
+    async def test_failed_flushes_are_retried(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, test_experiment_1_created_by_user_1: ExperimentPublic
+    ) -> None:
+        available = False
+
+        async def get_database():
+            return app.state._db if available else None
+
+        experiment_id = test_experiment_1_created_by_user_1.id
+        now = datetime.datetime.now(datetime.timezone.utc)
+        join_stats = JoinStatsAggregator(get_database, flush_interval=60, retention_days=30)
+        join_stats.record(experiment_id, "peer-1", now=now)
+        await join_stats.flush(now=now)
+        assert join_stats.stats()["failed_flushes"] == 1
+
+        available = True
+        await join_stats.flush(now=now)
+        rows = await JoinStatsRepository(app.state._db).list_join_stats(
+            experiment_id=experiment_id, since=minute_of(now)
+        )
+        assert [joins for _, worker_id, joins, _ in rows if worker_id == join_stats.worker_id] == [1]
+
+    async def test_get_join_stats_counts_joins_not_written_yet(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+        test_experiment_join_input_1_by_user_2: Tuple[ExperimentJoinInput, rsa.RSAPrivateKey],
+        monitoring_headers: dict,
+    ) -> None:
+        experiment_id = test_experiment_1_created_by_user_1.id
+        url = app.url_path_for("join-stats:get-experiment-join-stats", id=experiment_id)
+        res = await client_wt_auth_user_1.get(url, params={"minutes": 24 * 60})
+        assert res.status_code == status.HTTP_200_OK
+        before = res.json()
+
+        join_input, _ = test_experiment_join_input_1_by_user_2
+        values = join_input.dict()
+        values["peer_public_key"] = values["peer_public_key"].decode("utf-8")
+        for _ in range(2):
+            res = await client_wt_auth_user_1.put(
+                app.url_path_for("experiments:join-experiment-by-id", id=experiment_id),
+                json={"experiment_join_input": values},
+            )
+            assert res.status_code == status.HTTP_200_OK
+
+        res = await client_wt_auth_user_1.get(url, params={"minutes": 24 * 60})
+        assert res.status_code == status.HTTP_200_OK
+        stats = res.json()
+        assert stats["experiment_id"] == experiment_id
+        assert stats["joins"] == before["joins"] + 2
+        assert stats["unique_peers"] >= 1
+        assert sum(window["joins"] for window in stats["windows"]) == stats["joins"]
+
+        res = await client_wt_auth_user_1.get(
+            app.url_path_for("monitoring:get-join-stats-aggregator-stats"), headers=monitoring_headers
+        )
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json()["recorded"] >= 2
+
+    async def test_get_join_stats_requires_an_admin(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_2: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+    ) -> None:
+        res = await client_wt_auth_user_2.get(
+            app.url_path_for("join-stats:get-experiment-join-stats", id=test_experiment_1_created_by_user_1.id)
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+        res = await client_wt_auth_user_2.get(app.url_path_for("join-stats:get-experiment-join-stats", id=999999))
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
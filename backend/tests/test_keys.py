@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import base64
+
+import pytest
+from databases import Database
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.api.dependencies import crypto
+from app.api.routes import experiments as experiments_routes
+from app.db.repositories.experiments import ExperimentsRepository
+from app.models.experiment import ExperimentCreatePublic, get_key_id
+from app.services.authentication import MoonlandingUser
+from app.services.keys import organization_key_sets
+
+
+pytestmark = pytest.mark.asyncio
+
+
+def decode_uint(value: str) -> int:
+    return int.from_bytes(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)), "big")
+
+
+class TestKeySets:
+    async def test_experiment_key_set_is_public_and_cacheable(
+        self, app: FastAPI, client: AsyncClient, db: Database, moonlanding_user_1: MoonlandingUser
+    ) -> None:
+        experiment = await experiments_routes.create_new_experiment(
+            new_experiment=ExperimentCreatePublic(organization_name="org_1", model_name="key_set_model"),
+            experiments_repo=ExperimentsRepository(db),
+            user=moonlanding_user_1,
+        )
+        join_view = await ExperimentsRepository(db).get_experiment_join_view_by_id(id=experiment.id)
+
+        url = app.url_path_for("keys:get-experiment-key-set", id=experiment.id)
+        res = await client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        assert res.headers["Cache-Control"].startswith("public, max-age=")
+        (key,) = res.json()["keys"]
+        assert key["kid"] == get_key_id(join_view.auth_server_public_key)
+        assert key["auth_server_public_key"].encode() == join_view.auth_server_public_key
+        numbers = crypto.load_public_key(join_view.auth_server_public_key).public_numbers()
+        assert (decode_uint(key["n"]), decode_uint(key["e"])) == (numbers.n, numbers.e)
+
+        etag = res.headers["ETag"]
+        res = await client.get(url, headers={"If-None-Match": etag})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+        assert res.headers["ETag"] == etag
+        assert res.content == b""
+
+        res = await client.get(app.url_path_for("keys:get-experiment-key-set", id=999999))
+        assert res.status_code == status.HTTP_404_NOT_FOUND
+
+    async def test_organization_key_set_lists_the_keys_of_its_experiments(
+        self, app: FastAPI, client: AsyncClient, db: Database, moonlanding_user_1: MoonlandingUser
+    ) -> None:
+        organization_key_sets.clear()
+        url = app.url_path_for("keys:get-organization-key-set", organization_name="organization_a")
+        first = await experiments_routes.create_new_experiment(
+            new_experiment=ExperimentCreatePublic(organization_name="organization_a", model_name="key_set_model"),
+            experiments_repo=ExperimentsRepository(db),
+            user=moonlanding_user_1,
+        )
+        res = await client.get(url)
+        assert res.status_code == status.HTTP_200_OK
+        before = {key["experiment_id"] for key in res.json()["keys"]}
+        assert first.id in before
+
+        second = await experiments_routes.create_new_experiment(
+            new_experiment=ExperimentCreatePublic(organization_name="organization_a", model_name="key_set_model_2"),
+            experiments_repo=ExperimentsRepository(db),
+            user=moonlanding_user_1,
+        )
+        # Served from the cache until it expires
+        res = await client.get(url)
+        assert {key["experiment_id"] for key in res.json()["keys"]} == before
+
+        organization_key_sets.clear()
+        res = await client.get(url, headers={"If-None-Match": res.headers["ETag"]})
+        assert res.status_code == status.HTTP_200_OK
+        assert {key["experiment_id"] for key in res.json()["keys"]} == before | {second.id}
+
+    async def test_organizations_without_experiments_are_not_cached(self, app: FastAPI, client: AsyncClient) -> None:
+        organization_key_sets.clear()
+        for _ in range(2):
+            res = await client.get(app.url_path_for("keys:get-organization-key-set", organization_name="no_such_org"))
+            assert res.status_code == status.HTTP_200_OK
+            assert res.json() == {"keys": []}
+            assert organization_key_sets.get("no_such_org") is None
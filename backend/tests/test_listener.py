@@ -0,0 +1,152 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+
+import pytest
+from databases import Database
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app.api.routes.experiments import create_new_experiment
+from app.db.listener import ExperimentChangesListener
+from app.db.replica import ReplicaRouter
+from app.db.repositories.experiments import PUBLIC_VIEW, ExperimentsRepository
+from app.models.experiment import ExperimentCreatePublic, ExperimentPublic
+from app.services.authentication import MoonlandingUser
+
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.postgresql]
+
+# Bypasses the repository, as another worker would
+UPDATE_COORDINATOR_PORT_QUERY = "UPDATE experiments SET coordinator_port = :coordinator_port WHERE id = :id;"
+DELETE_EXPERIMENT_QUERY = "DELETE FROM experiments WHERE id = :id;"
+
+
+async def wait_for(condition, timeout: float = 5.0) -> bool:
+    for _ in range(int(timeout / 0.05)):
+        if condition():
+            return True
+        await asyncio.sleep(0.05)
+    return condition()
+
+
+# The app is started before the experiment of the module is created
+@pytest.mark.usefixtures("client_wt_auth_user_1")
+class TestExperimentChangesListener:
+    async def test_changes_from_other_workers_are_evicted(
+        self, app: FastAPI, test_experiment_of_module: ExperimentPublic
+    ) -> None:
+        listener = app.state._experiment_changes_listener
+        assert await wait_for(lambda: listener.connected)
+
+        experiments_repo = ExperimentsRepository(app.state._db)
+        key = ExperimentsRepository.cache.id_key(PUBLIC_VIEW, test_experiment_of_module.id)
+        await experiments_repo.get_experiment_by_id(id=test_experiment_of_module.id)
+        assert ExperimentsRepository.cache.get(key)[0]
+
+        await app.state._db.execute(
+            query=UPDATE_COORDINATOR_PORT_QUERY,
+            values={"id": test_experiment_of_module.id, "coordinator_port": 7777},
+        )
+        assert await wait_for(lambda: not ExperimentsRepository.cache.get(key)[0])
+        experiment = await experiments_repo.get_experiment_by_id(id=test_experiment_of_module.id)
+        assert experiment.coordinator_port == 7777
+
+    async def test_changes_missed_while_disconnected_are_evicted(
+        self, app: FastAPI, test_experiment_of_module: ExperimentPublic
+    ) -> None:
+        await app.state._experiment_changes_listener.stop()
+        db = app.state._db
+        experiments_repo = ExperimentsRepository(db)
+        key = ExperimentsRepository.cache.id_key(PUBLIC_VIEW, test_experiment_of_module.id)
+        await experiments_repo.get_experiment_by_id(id=test_experiment_of_module.id)
+
+        since = await db.fetch_val(query="SELECT now();")
+        await db.execute(
+            query=UPDATE_COORDINATOR_PORT_QUERY,
+            values={"id": test_experiment_of_module.id, "coordinator_port": 8888},
+        )
+        assert ExperimentsRepository.cache.get(key)[0]
+
+        listener = ExperimentChangesListener(str(db.url), heartbeat_interval=5, max_backoff=60)
+        async with db.connection() as connection:
+            assert await listener.catch_up(connection.raw_connection, since) >= 1
+        assert not ExperimentsRepository.cache.get(key)[0]
+        experiment = await experiments_repo.get_experiment_by_id(id=test_experiment_of_module.id)
+        assert experiment.coordinator_port == 8888
+
+    async def test_deletions_missed_while_disconnected_are_evicted(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, moonlanding_user_1: MoonlandingUser
+    ) -> None:
+        await app.state._experiment_changes_listener.stop()
+        db = app.state._db
+        experiments_repo = ExperimentsRepository(db)
+        experiment = await create_new_experiment(
+            new_experiment=ExperimentCreatePublic(organization_name="org_1", model_name="model_listener_deleted"),
+            experiments_repo=experiments_repo,
+            user=moonlanding_user_1,
+        )
+        key = ExperimentsRepository.cache.name_key(PUBLIC_VIEW, "org_1", "model_listener_deleted")
+        await experiments_repo.get_experiment_by_organization_and_model_name(
+            organization_name="org_1", model_name="model_listener_deleted"
+        )
+
+        since = await db.fetch_val(query="SELECT now();")
+        await db.execute(query=DELETE_EXPERIMENT_QUERY, values={"id": experiment.id})
+        assert ExperimentsRepository.cache.get(key)[0]
+
+        listener = ExperimentChangesListener(str(db.url), heartbeat_interval=5, max_backoff=60)
+        async with db.connection() as connection:
+            assert await listener.catch_up(connection.raw_connection, since) >= 1
+        assert not ExperimentsRepository.cache.get(key)[0]
+
+    async def test_changes_are_not_read_again_from_a_lagging_replica(
+        self, app: FastAPI, test_experiment_of_module: ExperimentPublic
+    ) -> None:
+        await app.state._experiment_changes_listener.stop()
+        db = app.state._db
+        # A replica lagging behind the primary: a transaction whose snapshot predates the change
+        replica = Database(str(db.url), force_rollback=True, min_size=1, max_size=1)
+        await replica.connect()
+        await replica.execute(query="SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
+        router = ReplicaRouter(db, replica, max_lag=5, check_interval=3600)
+        listener = ExperimentChangesListener(str(db.url), heartbeat_interval=5, max_backoff=60, router=router)
+        listener.start()
+        try:
+            assert await wait_for(lambda: listener.connected)
+            experiments_repo = ExperimentsRepository(db, router=router)
+            key = ExperimentsRepository.cache.id_key(PUBLIC_VIEW, test_experiment_of_module.id)
+            ExperimentsRepository.cache.invalidate(id=test_experiment_of_module.id)
+            assert await router.read_db() is replica
+            await experiments_repo.get_experiment_by_id(id=test_experiment_of_module.id)
+            assert ExperimentsRepository.cache.get(key)[0]
+
+            await db.execute(
+                query=UPDATE_COORDINATOR_PORT_QUERY,
+                values={"id": test_experiment_of_module.id, "coordinator_port": 9999},
+            )
+            assert await wait_for(lambda: not ExperimentsRepository.cache.get(key)[0])
+            stale = await replica.fetch_val(
+                query="SELECT coordinator_port FROM experiments WHERE id = :id;",
+                values={"id": test_experiment_of_module.id},
+            )
+            assert stale != 9999
+
+            experiment = await experiments_repo.get_experiment_by_id(id=test_experiment_of_module.id)
+            assert experiment.coordinator_port == 9999
+            assert ExperimentsRepository.cache.get(key)[1].coordinator_port == 9999
+        finally:
+            await listener.stop()
+            await replica.disconnect()
@@ -0,0 +1,134 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.db import tasks
+from app.db.pool import get_pool
+from app.models.experiment import ExperimentPublic
+
+
+pytestmark = pytest.mark.asyncio
+
+
+INTERNAL_ROUTES = (
+    "monitoring:get-pool-stats",
+    "monitoring:get-query-stats",
+    "monitoring:get-join-history-stats",
+    "monitoring:get-join-stats-aggregator-stats",
+)
+
+
+class TestMonitoringAuthentication:
+    @pytest.mark.parametrize("route", INTERNAL_ROUTES)
+    @pytest.mark.parametrize("headers", ({}, {"Authorization": "Bearer wrong-token"}))
+    async def test_internals_require_the_monitoring_token(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, monitoring_headers: dict, route: str, headers: dict
+    ) -> None:
+        # Users of the API are not operators
+        res = await client_wt_auth_user_1.get(app.url_path_for(route), headers=headers)
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.parametrize("route", INTERNAL_ROUTES)
+    async def test_internals_are_refused_without_a_monitoring_token(
+        self, app: FastAPI, client: AsyncClient, route: str
+    ) -> None:
+        res = await client.get(app.url_path_for(route), headers={"Authorization": "Bearer "})
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+    async def test_readiness_is_open(self, app: FastAPI, client: AsyncClient) -> None:
+        res = await client.get(app.url_path_for("monitoring:get-readiness"))
+        assert res.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.postgresql
+class TestPoolStats:
+    async def test_pool_stats_record_acquisitions(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+        monitoring_headers: dict,
+    ) -> None:
+        # Listings are never cached, so this goes through the pool
+        res = await client_wt_auth_user_1.get(app.url_path_for("experiments:list-experiments"))
+        assert res.status_code == status.HTTP_200_OK
+
+        res = await client_wt_auth_user_1.get(
+            app.url_path_for("monitoring:get-pool-stats"), headers=monitoring_headers
+        )
+        assert res.status_code == status.HTTP_200_OK
+        stats = res.json()
+        assert stats["size"] >= stats["min_size"]
+        assert stats["in_use"] + stats["idle"] == stats["size"]
+        assert stats["waiters"] == 0
+        assert stats["acquire_wait_seconds"]["count"] > 0
+        assert stats["acquire_wait_seconds"]["buckets"]["+Inf"] == stats["acquire_wait_seconds"]["count"]
+
+    async def test_acquire_timeout_is_applied(self, app: FastAPI, client_wt_auth_user_1: AsyncClient) -> None:
+        pool = get_pool(app.state._db)
+        connections = [await pool.acquire() for _ in range(pool.get_max_size())]
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.acquire(timeout=0.01)
+            assert pool.stats()["acquire_timeouts"] == 1
+        finally:
+            for connection in connections:
+                await pool.release(connection)
+
+
+@pytest.fixture
+async def disconnected_app(app: FastAPI, client_wt_auth_user_1: AsyncClient) -> FastAPI:
+    # As if the database had not been reachable at startup
+    await tasks.stop_experiment_changes_listener(app)
+    await app.state._db.disconnect()
+    app.state._db = None
+    app.state._db_connect_failed_at = float("-inf")
+    return app
+
+
+class TestReadiness:
+    async def test_ready_when_the_database_answers(self, app: FastAPI, client_wt_auth_user_1: AsyncClient) -> None:
+        res = await client_wt_auth_user_1.get(app.url_path_for("monitoring:get-readiness"))
+        assert res.status_code == status.HTTP_200_OK
+        assert res.json() == {"ready": True}
+
+    @pytest.mark.postgresql
+    async def test_connects_on_first_use(self, disconnected_app: FastAPI, client_wt_auth_user_1: AsyncClient) -> None:
+        res = await client_wt_auth_user_1.get(disconnected_app.url_path_for("experiments:list-experiments"))
+        assert res.status_code == status.HTTP_200_OK
+        assert disconnected_app.state._db.is_connected
+        assert disconnected_app.state._experiment_changes_listener is not None
+
+    async def test_not_ready_while_the_database_is_unreachable(
+        self, disconnected_app: FastAPI, client_wt_auth_user_1: AsyncClient, monkeypatch
+    ) -> None:
+        monkeypatch.setattr(tasks, "DATABASE_URL", "postgresql://postgres@localhost:1/unreachable")
+
+        res = await client_wt_auth_user_1.get(disconnected_app.url_path_for("monitoring:get-readiness"))
+        assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        failed_at = disconnected_app.state._db_connect_failed_at
+
+        # Requests fail fast without trying to connect again right away
+        res = await client_wt_auth_user_1.get(disconnected_app.url_path_for("experiments:list-experiments"))
+        assert res.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert disconnected_app.state._db_connect_failed_at == failed_at
+
+    async def test_connection_is_retried_until_the_deadline(self) -> None:
+        with pytest.raises(OSError):
+            await tasks.connect_with_backoff("postgresql://postgres@localhost:1/unreachable", deadline=0.3)
@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import pytest
+from databases import Database
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app.db.prepared import compile_query, fetch_one_prepared
+from app.db.repositories import experiments
+from app.models.experiment import ExperimentPublic
+
+
+pytestmark = pytest.mark.asyncio
+
+HOT_QUERIES = (
+    experiments.GET_EXPERIMENT_BY_ID_QUERY,
+    experiments.GET_EXPERIMENT_BY_ORGANIZATON_AND_MODEL_NAME_QUERY,
+    experiments.GET_EXPERIMENT_JOIN_VIEW_BY_ID_QUERY,
+    experiments.GET_EXPERIMENT_JOIN_VIEW_BY_ORGANIZATON_AND_MODEL_NAME_QUERY,
+    experiments.GET_EXPERIMENT_SIGNING_KEY_BY_ID_QUERY,
+)
+
+
+def experiment_values(experiment: ExperimentPublic) -> dict:
+    return {
+        "id": experiment.id,
+        "organization_name": experiment.organization_name,
+        "model_name": experiment.model_name,
+    }
+
+
+class TestPreparedQueries:
+    def test_compile_query_numbers_named_parameters(self) -> None:
+        sql, names = compile_query("SELECT CAST(:a AS TEXT), :b::INTEGER WHERE x = :a")
+        assert sql == "SELECT CAST($1 AS TEXT), $2::INTEGER WHERE x = $1"
+        assert names == ("a", "b")
+
+    @pytest.mark.parametrize("query", HOT_QUERIES)
+    async def test_prepared_queries_return_the_same_records(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+        query: str,
+    ) -> None:
+        db: Database = app.state._db
+        _, names = compile_query(query)
+        values = {name: experiment_values(test_experiment_1_created_by_user_1)[name] for name in names}
+
+        record = await fetch_one_prepared(db, query, values)
+        assert dict(record) == dict(await db.fetch_one(query=query, values=values))
+
+    @pytest.mark.postgresql
+    async def test_prepared_queries_without_statement_cache(
+        self, app: FastAPI, client_wt_auth_user_1: AsyncClient, test_experiment_1_created_by_user_1: ExperimentPublic
+    ) -> None:
+        # As configured behind PgBouncer in transaction pooling mode
+        db = Database(str(app.state._db.url), min_size=1, max_size=1, statement_cache_size=0)
+        await db.connect()
+        try:
+            for _ in range(2):
+                record = await fetch_one_prepared(
+                    db, experiments.GET_EXPERIMENT_BY_ID_QUERY, {"id": test_experiment_1_created_by_user_1.id}
+                )
+                assert ExperimentPublic(**record) == test_experiment_1_created_by_user_1
+        finally:
+            await db.disconnect()
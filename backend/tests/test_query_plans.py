@@ -0,0 +1,247 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator
+
+import pytest
+from databases import Database
+from databases.core import Connection
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app.db.repositories import allowlist, experiments, join_stats, revocations
+
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.postgresql]
+
+SEED_EXPERIMENTS_QUERY = """
+    INSERT INTO experiments (organization_name, model_name, creator)
+    SELECT 'plan_org_' || (i / 20), 'plan_model_' || (i % 20), 'plan_user'
+    FROM generate_series(0, 3999) AS i;
+"""
+SEED_REVOCATIONS_QUERY = """
+    INSERT INTO revocations (experiment_id, kind, value)
+    SELECT id, 'username', 'plan_user_' || i
+    FROM experiments, generate_series(0, 9) AS i
+    WHERE creator = 'plan_user';
+"""
+SEED_TOMBSTONES_QUERY = """
+    INSERT INTO experiment_tombstones (experiment_id, organization_name, model_name, deleted_at)
+    SELECT 100000 + i, 'plan_org_' || (i / 20), 'plan_model_' || (i % 20), now() - i * interval '1 minute'
+    FROM generate_series(0, 3999) AS i;
+"""
+
+EXPERIMENT_VALUES = {
+    "organization_name": "plan_org_7",
+    "model_name": "plan_model_3",
+    "coordinator_ip": "127.0.0.1",
+    "coordinator_port": 8080,
+}
+IF_MATCH_VALUES = {"check_updated_at": True, "updated_ats": [datetime.now(timezone.utc)]}
+UPDATE_VALUES = {
+    "id": 1,
+    "updated_at": datetime.now(timezone.utc),
+    **EXPERIMENT_VALUES,
+    **{f"set_{column}": True for column in experiments.UPDATABLE_COLUMNS},
+    **IF_MATCH_VALUES,
+}
+CHANGES_VALUES = {
+    "organization_names": ["plan_org_7", "plan_org_8"],
+    "after_id": 0,
+    "until": datetime.now(timezone.utc),
+    "limit": 51,
+}
+# Coordinators usually fetch the few changes made since a version they already hold
+RECENT_VERSION = 1000000
+REVOCATION_VALUES = {"experiment_id": 1, "kinds": ["username"], "values": ["plan_user_3"]}
+
+# (query, values, index the query must be served by, if any)
+QUERY_PLANS = {
+    "create_experiment": (
+        experiments.CREATE_EXPERIMENT_QUERY,
+        {**EXPERIMENT_VALUES, "creator": "plan_user", "auth_server_public_key": b"", "auth_server_private_key": b""},
+        None,
+    ),
+    "get_experiment_by_id": (experiments.GET_EXPERIMENT_BY_ID_QUERY, {"id": 1}, "experiments_pkey"),
+    "get_experiment_by_organization_and_model_name": (
+        experiments.GET_EXPERIMENT_BY_ORGANIZATON_AND_MODEL_NAME_QUERY,
+        {"organization_name": "plan_org_7", "model_name": "plan_model_3"},
+        "uix_1",
+    ),
+    "get_experiment_join_view_by_id": (
+        experiments.GET_EXPERIMENT_JOIN_VIEW_BY_ID_QUERY,
+        {"id": 1},
+        "experiments_pkey",
+    ),
+    "get_experiment_join_view_by_organization_and_model_name": (
+        experiments.GET_EXPERIMENT_JOIN_VIEW_BY_ORGANIZATON_AND_MODEL_NAME_QUERY,
+        {"organization_name": "plan_org_7", "model_name": "plan_model_3"},
+        "uix_1",
+    ),
+    "get_experiment_signing_key": (experiments.GET_EXPERIMENT_SIGNING_KEY_BY_ID_QUERY, {"id": 1}, "experiments_pkey"),
+    "list_experiments_by_organizations": (
+        experiments.LIST_EXPERIMENTS_BY_ORGANIZATIONS_QUERY,
+        {
+            "organization_names": ["plan_org_7", "plan_org_8"],
+            "after_organization_name": "plan_org_7",
+            "after_model_name": "plan_model_3",
+            "after_id": 0,
+            "limit": 51,
+        },
+        "uix_1",
+    ),
+    "list_experiment_changes": (
+        experiments.LIST_EXPERIMENT_CHANGES_QUERY,
+        {**CHANGES_VALUES, "after_updated_at": datetime(2021, 1, 1, tzinfo=timezone.utc)},
+        "ix_experiments_updated_at_id",
+    ),
+    "list_experiment_tombstones": (
+        experiments.LIST_EXPERIMENT_TOMBSTONES_QUERY,
+        {**CHANGES_VALUES, "after_deleted_at": datetime(2021, 1, 1, tzinfo=timezone.utc)},
+        "ix_experiment_tombstones_deleted_at_id",
+    ),
+    "purge_experiment_tombstones": (
+        experiments.PURGE_EXPERIMENT_TOMBSTONES_QUERY,
+        {"before": datetime(2021, 1, 1, tzinfo=timezone.utc)},
+        "ix_experiment_tombstones_deleted_at_id",
+    ),
+    "search_experiments": (
+        experiments.SEARCH_EXPERIMENTS_QUERY,
+        {
+            "organization_names": ["plan_org_7", "plan_org_8"],
+            "query": "plan_model_3",
+            "prefix": "plan\\_model\\_3%",
+            "contains": "%plan\\_model\\_3%",
+            "after_rank": -1,
+            "after_model_name": "",
+            "after_organization_name": "",
+            "after_id": 0,
+            "limit": 51,
+        },
+        None,
+    ),
+    "update_experiment_by_id": (experiments.UPDATE_EXPERIMENT_BY_ID_QUERY, UPDATE_VALUES, "experiments_pkey"),
+    "update_coordinators": (
+        experiments.UPDATE_COORDINATORS_QUERY,
+        {
+            "organization_names": ["plan_org_7", "plan_org_8"],
+            "ids": [1, 2, 3],
+            "coordinator_ips": ["10.0.0.1", "10.0.0.2", None],
+            "coordinator_ports": [1000, 1001, None],
+            "updated_at": datetime.now(timezone.utc),
+        },
+        "experiments_pkey",
+    ),
+    "move_coordinator": (
+        experiments.MOVE_COORDINATOR_QUERY,
+        {
+            "organization_names": ["plan_org_7", "plan_org_8"],
+            "coordinator_ip": "10.0.0.1",
+            "coordinator_port": 1000,
+            "new_coordinator_ip": "10.0.0.2",
+            "new_coordinator_port": 2000,
+            "updated_at": datetime.now(timezone.utc),
+        },
+        "uix_1",
+    ),
+    "delete_experiment_by_id": (
+        experiments.DELETE_EXPERIMENT_BY_ID_QUERY,
+        {"id": 1, **IF_MATCH_VALUES},
+        "experiments_pkey",
+    ),
+    "lock_experiment": (revocations.LOCK_EXPERIMENT_QUERY, {"experiment_id": 1}, "experiments_pkey"),
+    "revoke": (revocations.REVOKE_QUERY, REVOCATION_VALUES, None),
+    "lift_revocations": (revocations.LIFT_REVOCATIONS_QUERY, REVOCATION_VALUES, None),
+    "list_experiment_public_keys": (
+        experiments.LIST_EXPERIMENT_PUBLIC_KEYS_BY_ORGANIZATION_QUERY,
+        {"organization_name": "plan_org_7"},
+        "uix_1",
+    ),
+    "list_revocation_changes": (
+        revocations.LIST_REVOCATION_CHANGES_QUERY,
+        {"experiment_id": 1, "since_version": RECENT_VERSION},
+        "ix_revocations_experiment_id_seq",
+    ),
+    "list_allowlist_changes": (
+        allowlist.LIST_ALLOWLIST_CHANGES_QUERY,
+        {"experiment_id": 1, "since_version": RECENT_VERSION},
+        "ix_allowlist_experiment_id_seq",
+    ),
+    "list_join_stats": (
+        join_stats.LIST_JOIN_STATS_QUERY,
+        {"experiment_id": 1, "since": datetime.now(timezone.utc)},
+        "join_stats_pkey",
+    ),
+    "purge_join_stats": (
+        join_stats.PURGE_JOIN_STATS_QUERY,
+        {"before": datetime.now(timezone.utc)},
+        "ix_join_stats_minute",
+    ),
+}
+
+
+def iter_plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from iter_plan_nodes(child)
+
+
+@pytest.fixture
+async def seeded_db(client: AsyncClient, app: FastAPI) -> Connection:
+    db: Database = app.state._db
+    # The test runs in another task, which would get another connection from the database: it is handed this one, in
+    # which everything seeded is rolled back at the end of the test
+    async with db.connection() as connection:
+        async with connection.transaction(force_rollback=True):
+            await connection.execute(query=SEED_EXPERIMENTS_QUERY)
+            await connection.execute(query=SEED_REVOCATIONS_QUERY)
+            await connection.execute(query=SEED_TOMBSTONES_QUERY)
+            await connection.execute(query="ANALYZE experiments, revocations, experiment_tombstones;")
+            # Makes plans deterministic: a sequential scan that remains means that no index can serve the query
+            await connection.execute(query="SET LOCAL enable_seqscan = off;")
+            yield connection
+
+
+class TestQueryPlans:
+    @pytest.mark.parametrize("name", QUERY_PLANS)
+    async def test_queries_are_served_by_indexes(self, seeded_db: Connection, name: str) -> None:
+        query, values, expected_index = QUERY_PLANS[name]
+        plan = await seeded_db.fetch_val(query="EXPLAIN (FORMAT JSON) " + query, values=values)
+        nodes = list(iter_plan_nodes(json.loads(plan)[0]["Plan"]))
+
+        seq_scans = [node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"]
+        assert not seq_scans, f"{name} scans {seq_scans} sequentially"
+
+        if expected_index is not None:
+            used_indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+            assert expected_index in used_indexes, f"{name} uses {used_indexes} instead of {expected_index}"
+
+    async def test_concurrent_creations_conflict_on_the_unique_index(self, seeded_db: Connection) -> None:
+        query, values, _ = QUERY_PLANS["create_experiment"]
+        plan = await seeded_db.fetch_val(query="EXPLAIN (FORMAT JSON) " + query, values=values)
+        root = json.loads(plan)[0]["Plan"]
+        assert root["Conflict Arbiter Indexes"] == ["uix_1"]
+
+    async def test_searches_across_organizations_are_served_by_trigram_indexes(self, seeded_db: Connection) -> None:
+        if not await seeded_db.fetch_val(query="SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm';"):
+            pytest.skip("pg_trgm is not installed")
+        query, values, _ = QUERY_PLANS["search_experiments"]
+        values = {**values, "organization_names": [f"plan_org_{i}" for i in range(200)]}
+        plan = await seeded_db.fetch_val(query="EXPLAIN (FORMAT JSON) " + query, values=values)
+        used_indexes = {
+            node["Index Name"] for node in iter_plan_nodes(json.loads(plan)[0]["Plan"]) if "Index Name" in node
+        }
+        assert {"ix_experiments_model_name_trgm", "ix_experiments_organization_name_trgm"} <= used_indexes
@@ -0,0 +1,116 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import asyncio
+import uuid
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.services import rate_limit
+from app.services.rate_limit import (
+    CREATE,
+    JOIN,
+    READ,
+    WRITE,
+    DatabaseRateLimitBackend,
+    MemoryRateLimitBackend,
+    RateLimiter,
+)
+
+
+pytestmark = pytest.mark.asyncio
+
+USER_IDENTITY = {"type": "user", "name": "rate_limited_user", "email": None, "orgs": []}
+
+
+class TestRateLimitBackends:
+    async def test_memory_buckets_refill_over_time(self) -> None:
+        backend = MemoryRateLimitBackend(maxsize=1)
+        with patch.object(rate_limit.time, "monotonic", return_value=1000.0) as monotonic:
+            assert [await backend.acquire("a", rate=1, capacity=2) for _ in range(3)] == [True, True, False]
+            monotonic.return_value = 1001.5
+            assert [await backend.acquire("a", rate=1, capacity=2) for _ in range(3)] == [True, False, False]
+
+            # The least recently used bucket is dropped, and starts full again
+            assert await backend.acquire("b", rate=1, capacity=2)
+            assert await backend.acquire("a", rate=1, capacity=2)
+
+    async def test_database_buckets_are_shared(self, app: FastAPI, client: AsyncClient) -> None:
+        async def get_database():
+            return app.state._db
+
+        key = uuid.uuid4().hex
+        first, second = DatabaseRateLimitBackend(get_database), DatabaseRateLimitBackend(get_database)
+        assert await first.acquire(key, rate=0.001, capacity=2)
+        assert await second.acquire(key, rate=0.001, capacity=2)
+        assert not await first.acquire(key, rate=0.001, capacity=2)
+        # Refilled quickly enough, the bucket holds a token again
+        await asyncio.sleep(0.01)
+        assert await second.acquire(key, rate=1000, capacity=2)
+
+
+class TestRateLimitedRoutes:
+    async def test_requests_are_limited_per_token_and_per_user_before_authenticating(
+        self, app: FastAPI, client: AsyncClient
+    ) -> None:
+        app.state._rate_limiter = RateLimiter(
+            MemoryRateLimitBackend(maxsize=100), budgets={JOIN: 6, CREATE: 6, READ: 3, WRITE: 6}
+        )
+        url = app.url_path_for("experiments:list-experiments")
+        with patch("app.services.authentication.moonlanding_auth", return_value=USER_IDENTITY) as moonlanding_auth:
+            for _ in range(3):
+                res = await client.get(url, headers={"Authorization": "Bearer token_1"})
+                assert res.status_code == status.HTTP_200_OK
+
+            res = await client.get(url, headers={"Authorization": "Bearer token_1"})
+            assert res.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+            assert res.headers["Retry-After"] == "20"
+            assert moonlanding_auth.call_count == 3
+
+            # Another token of the same user is checked, then limited by the budget of the user
+            res = await client.get(url, headers={"Authorization": "Bearer token_2"})
+            assert res.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+            assert moonlanding_auth.call_count == 4
+
+            # Joins have a budget of their own
+            res = await client.put(
+                app.url_path_for("experiments:join-experiment-by-id", id=999999),
+                json={"experiment_join_input": {"peer_public_key": None}},
+                headers={"Authorization": "Bearer token_1"},
+            )
+            assert res.status_code == status.HTTP_401_UNAUTHORIZED
+            assert app.state._rate_limiter.limited == 2
+
+    async def test_the_default_limiter_rejects_empty_token_buckets_before_calling_whoami(
+        self, app: FastAPI, client: AsyncClient, monkeypatch
+    ) -> None:
+        # The limiter started with the app, without overriding authenticate or its dependencies
+        assert app.state._rate_limiter is not None
+        monkeypatch.setitem(app.state._rate_limiter.budgets, READ, 2)
+        url = app.url_path_for("experiments:list-experiments")
+        headers = {"Authorization": f"Bearer {uuid.uuid4().hex}"}
+        with patch("app.services.authentication.moonlanding_auth", return_value=USER_IDENTITY) as moonlanding_auth:
+            for _ in range(2):
+                res = await client.get(url, headers=headers)
+                assert res.status_code == status.HTTP_200_OK
+            assert moonlanding_auth.call_count == 2
+
+            res = await client.get(url, headers=headers)
+            assert res.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+            assert res.headers["Retry-After"] == "30"
+            assert res.json() == {"detail": "Too many requests, retry later."}
+            assert moonlanding_auth.call_count == 2
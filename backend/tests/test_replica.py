@@ -0,0 +1,115 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import pytest
+from asyncpg.exceptions import ConnectionDoesNotExistError
+from databases import Database
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app.db.replica import ReplicaRouter
+from app.db.repositories.experiments import ExperimentsRepository
+from app.models.experiment import ExperimentPublic, ExperimentUpdate
+
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.postgresql]
+
+
+@pytest.fixture
+async def replica(app: FastAPI, client_wt_auth_user_1: AsyncClient) -> Database:
+    # The test database stands in for a replica: it is not in recovery, so it never lags
+    replica = Database(str(app.state._db.url), min_size=1, max_size=1)
+    await replica.connect()
+    yield replica
+    if replica.is_connected:
+        await replica.disconnect()
+
+
+class TestReplicaRouting:
+    async def test_reads_go_to_a_healthy_replica(self, app: FastAPI, replica: Database) -> None:
+        router = ReplicaRouter(app.state._db, replica, max_lag=5, check_interval=0)
+        assert await router.read_db() is replica
+        assert router.lag == 0
+
+    async def test_reads_go_to_the_primary_after_a_write(
+        self, app: FastAPI, replica: Database, test_experiment_2_created_by_user_1_for_updates_tests: ExperimentPublic
+    ) -> None:
+        router = ReplicaRouter(app.state._db, replica, max_lag=5, check_interval=0)
+        experiments_repo = ExperimentsRepository(app.state._db, router=router)
+        assert await experiments_repo.get_read_db() is replica
+
+        await experiments_repo.update_experiment_by_id(
+            id_exp=test_experiment_2_created_by_user_1_for_updates_tests.id,
+            experiment_update=ExperimentUpdate(coordinator_port=4321),
+        )
+        assert await experiments_repo.get_read_db() is app.state._db
+
+        router.primary_until = float("-inf")
+        assert await experiments_repo.get_read_db() is replica
+
+    async def test_reads_go_to_the_primary_when_the_replica_lags(self, app: FastAPI, replica: Database) -> None:
+        router = ReplicaRouter(app.state._db, replica, max_lag=-1, check_interval=0)
+        assert await router.read_db() is app.state._db
+        assert not router.healthy
+
+    async def test_reads_go_to_the_primary_when_the_replica_is_down(self, app: FastAPI, replica: Database) -> None:
+        router = ReplicaRouter(app.state._db, replica, max_lag=5, check_interval=0)
+        assert await router.read_db() is replica
+
+        await replica.disconnect()
+        assert await router.read_db() is app.state._db
+        assert router.lag is None
+
+    async def test_reads_failing_on_the_replica_are_retried_on_the_primary(
+        self,
+        app: FastAPI,
+        replica: Database,
+        test_experiment_1_created_by_user_1: ExperimentPublic,
+        monkeypatch,
+    ) -> None:
+        router = ReplicaRouter(app.state._db, replica, max_lag=5, check_interval=3600)
+        experiments_repo = ExperimentsRepository(app.state._db, router=router)
+        assert await experiments_repo.get_read_db() is replica
+
+        # The replica goes down between two checks of its lag
+        async def fetch_all(*args, **kwargs):
+            raise ConnectionDoesNotExistError("connection was closed in the middle of operation")
+
+        monkeypatch.setattr(replica, "fetch_all", fetch_all)
+        experiments = await experiments_repo.list_experiments_by_organizations(organization_names=["org_1"], limit=10)
+        assert test_experiment_1_created_by_user_1.id in [experiment.id for experiment in experiments]
+        assert not router.healthy
+        assert await experiments_repo.get_read_db() is app.state._db
+
+    async def test_replica_is_connected_to_on_demand(self, app: FastAPI, replica: Database) -> None:
+        attempts = []
+
+        async def connect_replica() -> Database:
+            attempts.append(replica)
+            if len(attempts) == 1:
+                raise ConnectionRefusedError("the replica is not up yet")
+            return replica
+
+        router = ReplicaRouter(
+            app.state._db, None, max_lag=5, check_interval=0, connect_replica=connect_replica, retry_interval=3600
+        )
+        await router.connect()
+        assert router.replica is None
+        assert await router.read_db() is app.state._db
+        # Not retried before the retry interval
+        assert len(attempts) == 1
+
+        router.connect_failed_at = float("-inf")
+        assert await router.read_db() is replica
+        assert len(attempts) == 2
@@ -0,0 +1,115 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import datetime
+import ipaddress
+import json
+
+import pytest
+from fastapi import APIRouter, FastAPI, status
+from fastapi.encoders import jsonable_encoder
+from httpx import AsyncClient
+
+from app.api import responses
+from app.api.responses import FastJSONResponse, FastJSONRoute, dumps
+from app.models.experiment import ExperimentJoinView, ExperimentPublic, ExperimentsPage
+from app.models.experiment_join import ExperimentJoinOutput, HivemindAccess
+
+
+pytestmark = pytest.mark.asyncio
+
+NOW = datetime.datetime.now(datetime.timezone.utc)
+EXPERIMENT = ExperimentPublic(
+    id=1,
+    organization_name="org",
+    model_name="model",
+    creator="user",
+    coordinator_ip=ipaddress.ip_address("2001:db8::1"),
+    coordinator_port=8080,
+    created_at=NOW,
+    updated_at=NOW,
+)
+
+
+HIVEMIND_ACCESS = HivemindAccess(
+    username="user",
+    peer_public_key=b"-----BEGIN PUBLIC KEY-----\n",
+    expiration_time=datetime.datetime.utcnow(),
+    signature=b"c2lnbmF0dXJl",
+)
+CONTENTS = [
+    EXPERIMENT,
+    EXPERIMENT.copy(update={"created_at": NOW.replace(microsecond=0), "model_name": "modèle"}),
+    ExperimentsPage.construct(experiments=[EXPERIMENT, EXPERIMENT.copy(update={"coordinator_ip": None})]),
+    ExperimentsPage.construct(experiments=[], next_cursor="WyJvcmciLCJtb2RlbCIsMV0="),
+    ExperimentJoinOutput.construct(
+        coordinator_ip=ipaddress.ip_address("192.0.2.1"),
+        coordinator_port=None,
+        hivemind_access=HIVEMIND_ACCESS,
+        auth_server_public_key=b"key",
+    ),
+    ExperimentJoinOutput.construct(
+        coordinator_ip=ipaddress.ip_address("2001:db8::1"),
+        coordinator_port=8080,
+        hivemind_access=HIVEMIND_ACCESS.copy(update={"expiration_time": NOW}),
+        auth_server_public_key=b"key",
+    ),
+]
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch) -> str:
+    """Render with orjson, as in production, then with the fallback used when it is not installed"""
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(responses, "orjson", None)
+    return request.param
+
+
+class TestFastJSONResponse:
+    @pytest.mark.parametrize("content", CONTENTS)
+    def test_renders_models_as_fastapi_encodes_them(self, encoder: str, content) -> None:
+        assert json.loads(FastJSONResponse(content).body) == jsonable_encoder(content)
+
+    @pytest.mark.parametrize("content", CONTENTS)
+    def test_orjson_and_the_fallback_render_the_same_bodies(self, monkeypatch, content) -> None:
+        pytest.importorskip("orjson")
+        body = dumps(content)
+        monkeypatch.setattr(responses, "orjson", None)
+        assert dumps(content) == body
+
+    async def test_routes_only_skip_the_validation_of_instances_of_their_response_model(self) -> None:
+        join_view = ExperimentJoinView(**EXPERIMENT.dict(), auth_server_public_key=b"key")
+        router = APIRouter(route_class=FastJSONRoute)
+
+        @router.post("/experiment/", response_model=ExperimentPublic, status_code=status.HTTP_201_CREATED)
+        async def create_experiment() -> ExperimentPublic:
+            return EXPERIMENT
+
+        @router.get("/join-view/", response_model=ExperimentPublic)
+        async def get_join_view() -> ExperimentPublic:
+            return join_view
+
+        app = FastAPI()
+        app.include_router(router)
+        async with AsyncClient(app=app, base_url="http://testserver") as client:
+            res = await client.post("/experiment/")
+            assert res.status_code == status.HTTP_201_CREATED
+            assert res.json() == jsonable_encoder(EXPERIMENT)
+
+            # Only the fields of the response model are exposed
+            res = await client.get("/join-view/")
+            assert res.status_code == status.HTTP_200_OK
+            assert res.json() == jsonable_encoder(EXPERIMENT)
@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+from typing import Tuple
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from app.api.dependencies import crypto
+from app.db.repositories.revocations import RevocationsRepository
+from app.models.experiment import ExperimentPublic
+from app.models.experiment_join import ExperimentJoinInput
+from app.models.revocation import RevocationList
+from tests.conftest import join_payload
+
+
+# decorate all tests with @pytest.mark.asyncio
+pytestmark = [pytest.mark.asyncio, pytest.mark.postgresql]
+
+
+class TestRevocations:
+    async def test_revoked_peer_key_cannot_join(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_of_module: ExperimentPublic,
+        test_experiment_join_input_1_by_user_2: Tuple[ExperimentJoinInput, rsa.RSAPrivateKey],
+    ) -> None:
+        join_input, _ = test_experiment_join_input_1_by_user_2
+        experiment_id = test_experiment_of_module.id
+
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:join-experiment-by-id", id=experiment_id), json=join_payload(join_input)
+        )
+        assert res.status_code == status.HTTP_200_OK, res.content
+
+        res = await client_wt_auth_user_1.post(
+            app.url_path_for("revocations:revoke", id=experiment_id),
+            json={"revocation_update": {"peer_public_keys": [join_input.peer_public_key.decode("utf-8")]}},
+        )
+        assert res.status_code == status.HTTP_200_OK, res.content
+        revocation_list = RevocationList(**res.json())
+        assert revocation_list.peer_key_digests == [crypto.peer_key_digest(join_input.peer_public_key)]
+
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:join-experiment-by-id", id=experiment_id), json=join_payload(join_input)
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED, res.content
+
+        res = await client_wt_auth_user_1.post(
+            app.url_path_for("revocations:lift-revocations", id=experiment_id),
+            json={"revocation_update": {"peer_key_digests": revocation_list.peer_key_digests}},
+        )
+        assert res.status_code == status.HTTP_200_OK, res.content
+        assert RevocationList(**res.json()).peer_key_digests == []
+
+        res = await client_wt_auth_user_1.put(
+            app.url_path_for("experiments:join-experiment-by-id", id=experiment_id), json=join_payload(join_input)
+        )
+        assert res.status_code == status.HTTP_200_OK, res.content
+
+    async def test_revocation_list_versions_deltas_and_etags(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_1: AsyncClient,
+        test_experiment_of_module: ExperimentPublic,
+    ) -> None:
+        path = app.url_path_for("revocations:get-revocation-list", id=test_experiment_of_module.id)
+        res = await client_wt_auth_user_1.get(path)
+        assert res.status_code == status.HTTP_200_OK, res.content
+        initial = RevocationList(**res.json())
+        etag = res.headers["ETag"]
+
+        res = await client_wt_auth_user_1.get(path, headers={"If-None-Match": etag})
+        assert res.status_code == status.HTTP_304_NOT_MODIFIED
+        assert res.content == b""
+
+        res = await client_wt_auth_user_1.post(
+            app.url_path_for("revocations:revoke", id=test_experiment_of_module.id),
+            json={"revocation_update": {"usernames": ["banned_user"]}},
+        )
+        assert res.status_code == status.HTTP_200_OK, res.content
+
+        res = await client_wt_auth_user_1.get(path, headers={"If-None-Match": etag})
+        assert res.status_code == status.HTTP_200_OK
+        assert "banned_user" in RevocationList(**res.json()).usernames
+
+        res = await client_wt_auth_user_1.get(path, params={"since_version": initial.version})
+        delta = RevocationList(**res.json())
+        assert delta.since_version == initial.version
+        assert delta.version > initial.version
+        assert delta.usernames == ["banned_user"]
+        assert delta.peer_key_digests == []
+
+        res = await client_wt_auth_user_1.get(path, params={"since_version": delta.version})
+        empty_delta = RevocationList(**res.json())
+        assert empty_delta.version == delta.version
+        assert empty_delta.usernames == empty_delta.lifted_usernames == []
+
+    async def test_revoked_user_cannot_join(
+        self,
+        app: FastAPI,
+        client_wt_auth_user_2: AsyncClient,
+        test_experiment_of_module: ExperimentPublic,
+        test_experiment_join_input_1_by_user_2: Tuple[ExperimentJoinInput, rsa.RSAPrivateKey],
+    ) -> None:
+        join_input, _ = test_experiment_join_input_1_by_user_2
+        path = app.url_path_for("experiments:join-experiment-by-id", id=test_experiment_of_module.id)
+
+        res = await client_wt_auth_user_2.put(path, json=join_payload(join_input))
+        assert res.status_code == status.HTTP_200_OK, res.content
+
+        revocations_repo = RevocationsRepository(app.state._db)
+        await revocations_repo.revoke(
+            experiment_id=test_experiment_of_module.id, usernames=["User2"], peer_key_digests=[]
+        )
+        res = await client_wt_auth_user_2.put(path, json=join_payload(join_input))
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED, res.content
+
+        # User2 is only a reader of the organization, so it can not lift its own revocation
+        res = await client_wt_auth_user_2.post(
+            app.url_path_for("revocations:lift-revocations", id=test_experiment_of_module.id),
+            json={"revocation_update": {"usernames": ["User2"]}},
+        )
+        assert res.status_code == status.HTTP_401_UNAUTHORIZED
+
+        await revocations_repo.lift_revocations(
+            experiment_id=test_experiment_of_module.id, usernames=["User2"], peer_key_digests=[]
+        )
+        res = await client_wt_auth_user_2.put(path, json=join_payload(join_input))
+        assert res.status_code == status.HTTP_200_OK, res.content
@@ -0,0 +1,56 @@
+#
+# Copyright (c) 2021 the Hugging Face team.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.#
+import pytest
+
+from app.db import sqlite
+from app.db.sqlite import check_sqlite_version, updated_at_trigger
+from app.db.tasks import connect_database
+
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestSQLite:
+    async def test_connections_use_wal_and_foreign_keys(self, tmp_path) -> None:
+        db = await connect_database(f"sqlite:///{tmp_path / 'auth.db'}")
+        try:
+            assert await db.fetch_val(query="PRAGMA journal_mode;") == "wal"
+            assert await db.fetch_val(query="PRAGMA foreign_keys;") == 1
+        finally:
+            await db.disconnect()
+
+    async def test_updated_at_trigger(self, tmp_path) -> None:
+        db = await connect_database(f"sqlite:///{tmp_path / 'auth.db'}")
+        try:
+            await db.execute(
+                query="CREATE TABLE items (name TEXT, updated_at TIMESTAMP NOT NULL DEFAULT '2000-01-01 00:00:00');"
+            )
+            await db.execute(query=updated_at_trigger("items"))
+            await db.execute(query="INSERT INTO items (name) VALUES ('a'), ('b');")
+
+            await db.execute(query="UPDATE items SET name = 'c' WHERE name = 'a';")
+            await db.execute(query="UPDATE items SET updated_at = '2001-01-01 00:00:00' WHERE name = 'b';")
+            updated_at = dict(await db.fetch_all(query="SELECT name, updated_at FROM items;"))
+            assert updated_at["c"] > "2001-01-01 00:00:00"
+            # An update setting updated_at itself keeps it
+            assert updated_at["b"] == "2001-01-01 00:00:00"
+        finally:
+            await db.disconnect()
+
+    async def test_old_sqlite_versions_are_refused(self, monkeypatch) -> None:
+        check_sqlite_version()
+        monkeypatch.setattr(sqlite.sqlite3, "sqlite_version_info", (3, 34, 1))
+        with pytest.raises(RuntimeError, match="3.35.0"):
+            check_sqlite_version()